@@ -0,0 +1,142 @@
+"""Deterministic fake LLM backend for benchmarks."""
+
+import asyncio
+import json
+import random
+import zlib
+from dataclasses import dataclass
+
+from kipbot.core.config import LLMBackendConfig, LLMConfig
+from kipbot.llm.provider import LLMBackend, LLMProvider
+
+# Values used for string parameters when the fake calls a tool
+SAMPLE_ARGUMENTS = {"expression": "12 * 7 + 3", "query": "kipbot", "timezone": "Asia/Seoul"}
+WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit")
+
+
+@dataclass
+class FakeLLMConfig:
+    """Shape of the fake model's answers.
+
+    Args:
+        latency: Seconds before the first token.
+        tokens: Output tokens per answer, one word each.
+        token_rate: Output tokens per second after the first one.
+        tool_rate: Probability that a user message is answered with tool calls.
+        tool_calls: Tool calls per tool round.
+        tool_rounds: Tool rounds before the model gives a text answer.
+        seed: Base seed; each request is seeded from it and the prompt.
+    """
+
+    latency: float = 0.2
+    tokens: int = 100
+    token_rate: float = 500.0
+    tool_rate: float = 0.3
+    tool_calls: int = 1
+    tool_rounds: int = 1
+    seed: int = 0
+
+
+class FakeBackend(LLMBackend):
+    """Backend that answers without a network call.
+
+    Answers depend only on the prompt and the seed, so a run is reproducible
+    regardless of how requests interleave. Responses go through the same
+    provider path (router, admission, stream assembly) as real ones.
+    """
+
+    def __init__(self, fake: FakeLLMConfig, config: LLMBackendConfig | None = None) -> None:
+        super().__init__(config or LLMBackendConfig(provider="openai", model="gpt-4o-mini"))
+        self.fake = fake
+        self.requests = 0
+
+    @property
+    def name(self) -> str:
+        return "fake"
+
+    async def acompletion(self, **kwargs) -> object:
+        self.requests += 1
+        messages = kwargs["messages"]
+        rng = random.Random(self.fake.seed ^ zlib.crc32(json.dumps(messages).encode()))
+        tool_calls = self._tool_calls(messages, kwargs.get("tools"), rng)
+        text = "" if tool_calls else " ".join(rng.choice(WORDS) for _ in range(self.fake.tokens))
+        usage = {
+            "prompt_tokens": len(json.dumps(messages)) // 4,
+            "completion_tokens": self.fake.tokens if text else 10 * len(tool_calls),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if kwargs.get("stream"):
+            return self._stream_chunks(text, tool_calls, usage)
+
+        from litellm import ModelResponse
+
+        await asyncio.sleep(self.fake.latency + self._generation_time(text))
+        message = {"role": "assistant", "content": text or None}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return ModelResponse(
+            choices=[{
+                "message": message,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            usage=usage,
+        )
+
+    def _generation_time(self, text: str) -> float:
+        if not text or self.fake.token_rate <= 0:
+            return 0.0
+        return (self.fake.tokens - 1) / self.fake.token_rate
+
+    def _tool_calls(self, messages: list[dict], tools: list[dict] | None, rng) -> list[dict]:
+        if not tools or self.fake.tool_calls <= 0:
+            return []
+        # Count tool rounds since the last user message
+        rounds = 0
+        for msg in reversed(messages):
+            if msg["role"] == "user":
+                break
+            if msg["role"] == "assistant" and msg.get("tool_calls"):
+                rounds += 1
+        if rounds >= self.fake.tool_rounds:
+            return []
+        if rounds == 0 and rng.random() >= self.fake.tool_rate:
+            return []
+
+        calls = []
+        for i in range(self.fake.tool_calls):
+            function = rng.choice(tools)["function"]
+            properties = function.get("parameters", {}).get("properties", {})
+            arguments = {
+                name: SAMPLE_ARGUMENTS.get(name, "x")
+                for name in function.get("parameters", {}).get("required", [])
+                if properties.get(name, {}).get("type") == "string"
+            }
+            calls.append({
+                "id": f"call_{rounds}_{i}",
+                "type": "function",
+                "function": {"name": function["name"], "arguments": json.dumps(arguments)},
+            })
+        return calls
+
+    async def _stream_chunks(self, text: str, tool_calls: list[dict], usage: dict):
+        from litellm.types.utils import Delta, ModelResponseStream, StreamingChoices, Usage
+
+        await asyncio.sleep(self.fake.latency)
+        delay = 1 / self.fake.token_rate if self.fake.token_rate > 0 else 0.0
+        for i, word in enumerate(text.split(" ") if text else []):
+            if i:
+                await asyncio.sleep(delay)
+            content = word if i == 0 else " " + word
+            yield ModelResponseStream(choices=[StreamingChoices(delta=Delta(content=content))])
+        if tool_calls:
+            deltas = [{"index": i, **call} for i, call in enumerate(tool_calls)]
+            yield ModelResponseStream(choices=[
+                StreamingChoices(delta=Delta(tool_calls=deltas), finish_reason="tool_calls")
+            ])
+        yield ModelResponseStream(choices=[], usage=Usage(**usage))
+
+
+def create_fake_provider(config: LLMConfig, fake: FakeLLMConfig) -> LLMProvider:
+    """Create an :class:`LLMProvider` whose only backend is a :class:`FakeBackend`."""
+    return LLMProvider(config, backends=[FakeBackend(fake)])
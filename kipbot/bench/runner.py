@@ -0,0 +1,427 @@
+"""Load and micro benchmarks for kipbot, driven by a fake LLM backend."""
+
+import asyncio
+import contextlib
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+
+from kipbot.bench.fake import FakeLLMConfig, create_fake_provider
+from kipbot.core.config import Config, DiscordConfig, KakaoConfig, TelegramConfig
+
+PLATFORMS = ("agent", "kakao", "telegram", "discord")
+# Metrics where a larger value is better; all others are latencies or sizes
+HIGHER_IS_BETTER = {"throughput"}
+
+# Sends one synthetic user message and returns once it is answered
+Driver = Callable[[str, str], Awaitable[None]]
+
+
+@dataclass
+class LoadOptions:
+    users: int = 1000
+    messages: int = 3  # sequential messages per user
+    stream: bool = True
+    debounce: float = 0.0  # dispatcher debounce for the platform handlers
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class LoopLagMonitor:
+    """Measure event-loop lag by how late a periodic sleep wakes up."""
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self.lags: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "LoopLagMonitor":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+
+def bench_config(workdir: Path, debounce: float = 0.0) -> Config:
+    """Config for an isolated benchmark run under ``workdir``."""
+    return Config(
+        memory={"enabled": True, "backend": "local", "path": str(workdir / "memory")},
+        session={"store": "memory"},
+        dispatch={"debounce": debounce},
+    )
+
+
+def create_bench_agent(config: Config, fake: FakeLLMConfig):
+    """Create an agent with the offline built-in tools and a fake LLM."""
+    from kipbot.core.agent import Agent
+    from kipbot.tools.calculator import CalculatorTool
+    from kipbot.tools.datetime_tool import DateTimeTool
+
+    agent = Agent(config)
+    agent.llm = create_fake_provider(config.llm, fake)
+    agent.register_tool(DateTimeTool())
+    agent.register_tool(CalculatorTool())
+    return agent
+
+
+async def _noop_delta(delta: str) -> None:
+    pass
+
+
+def _agent_driver(agent, options: LoadOptions) -> Driver:
+    on_delta = _noop_delta if options.stream else None
+
+    async def send(user_id: str, text: str) -> None:
+        await agent.chat(agent.sessions.get(user_id, "bench"), text, on_delta=on_delta)
+
+    return send
+
+
+def _kakao_driver(agent) -> Driver:
+    from kipbot.platforms.kakao import KakaoPlatform
+
+    platform = KakaoPlatform(agent, KakaoConfig())
+
+    async def send(user_id: str, text: str) -> None:
+        await platform.handle({"userRequest": {"user": {"id": user_id}, "utterance": text}})
+
+    return send
+
+
+class _FakeMessage:
+    """Stands in for a sent chat message; edits are accepted and dropped."""
+
+    async def edit_text(self, text: str) -> "_FakeMessage":
+        return self
+
+    async def edit(self, content: str) -> "_FakeMessage":
+        return self
+
+
+async def _fake_send(text: str) -> _FakeMessage:
+    return _FakeMessage()
+
+
+def _telegram_driver(agent) -> Driver:
+    from kipbot.platforms.telegram import TelegramPlatform
+
+    platform = TelegramPlatform(agent, TelegramConfig(token="bench"))
+    answered: dict[str, asyncio.Event] = {}
+    respond = platform._respond
+
+    async def traced(update, user_id: str, text: str) -> None:
+        try:
+            await respond(update, user_id, text)
+        finally:
+            answered[user_id].set()
+
+    platform._respond = traced
+
+    async def send(user_id: str, text: str) -> None:
+        answered[user_id] = asyncio.Event()
+        update = SimpleNamespace(
+            effective_user=SimpleNamespace(id=user_id),
+            message=SimpleNamespace(text=text, reply_text=_fake_send),
+        )
+        await platform._handle_message(update, None)
+        await answered[user_id].wait()
+
+    return send
+
+
+def _discord_driver(agent) -> Driver:
+    from kipbot.platforms.discord_bot import DiscordPlatform
+
+    platform = DiscordPlatform(agent, DiscordConfig(token="bench"))
+
+    async def send(user_id: str, text: str) -> None:
+        # Same path as on_message once a message passed the mention/DM filter
+        message = SimpleNamespace(
+            reply=_fake_send, channel=SimpleNamespace(typing=contextlib.nullcontext)
+        )
+        await platform.dispatcher.submit(
+            user_id, text, lambda merged: platform._respond(message, user_id, merged)
+        )
+
+    return send
+
+
+def _driver(target: str, agent, options: LoadOptions) -> Driver:
+    if target == "agent":
+        return _agent_driver(agent, options)
+    if target == "kakao":
+        return _kakao_driver(agent)
+    if target == "telegram":
+        return _telegram_driver(agent)
+    if target == "discord":
+        return _discord_driver(agent)
+    raise ValueError(f"Unknown benchmark target: {target}")
+
+
+async def run_load(target: str, options: LoadOptions, fake: FakeLLMConfig) -> dict:
+    """Drive ``target`` with ``options.users`` concurrent synthetic users."""
+    latencies: list[float] = []
+    errors = 0
+
+    with tempfile.TemporaryDirectory(prefix="kipbot-bench-") as workdir:
+        agent = create_bench_agent(bench_config(Path(workdir), options.debounce), fake)
+        send = _driver(target, agent, options)
+
+        async def user(index: int) -> None:
+            nonlocal errors
+            user_id = f"user{index}"
+            for turn in range(options.messages):
+                start = time.perf_counter()
+                try:
+                    await send(user_id, f"message {turn} from {user_id}")
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        try:
+            # As the Supervisor does before a platform starts
+            await agent.warm_up()
+            async with LoopLagMonitor() as lag:
+                start = time.perf_counter()
+                async with asyncio.TaskGroup() as tg:
+                    for i in range(options.users):
+                        tg.create_task(user(i))
+                elapsed = time.perf_counter() - start
+        finally:
+            await agent.close()
+
+    return {
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "loop_lag_p99_ms": percentile(lag.lags, 99) * 1000,
+        "loop_lag_max_ms": max(lag.lags, default=0.0) * 1000,
+        "errors": errors,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# Run in a fresh interpreter: the CLI import plus agent creation with the default tools
+STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+from kipbot.cli.commands import _create_agent
+from kipbot.core.config import Config
+_create_agent(Config(memory={"enabled": False}))
+startup_ms = (time.perf_counter() - start) * 1000
+try:
+    # ru_maxrss survives exec, so it would include the parent's peak before the fork
+    with open("/proc/self/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss_kb /= 1024
+print(json.dumps({
+    "startup_ms": startup_ms,
+    "rss_mb": rss_kb / 1024,
+    "litellm_loaded": int("litellm" in sys.modules),
+}))
+"""
+
+
+def bench_startup(top: int = 5) -> tuple[dict, list[tuple[str, float]]]:
+    """Measure cold startup in a subprocess with ``python -X importtime``.
+
+    Returns the metrics and the ``top`` slowest top-level imports in ms.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    results = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            imports.append((name.strip(), int(cumulative) / 1000))
+    results["import_ms"] = sum(ms for _, ms in imports)
+    return results, sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+
+def _write_history(path: Path, turns: int) -> None:
+    line = json.dumps({
+        "user": "How is the weather today? " * 4,
+        "assistant": "It is sunny with a light breeze and no rain expected. " * 4,
+        "ts": 0.0,
+    }, ensure_ascii=False) + "\n"
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(turns):
+            f.write(line)
+
+
+def _write_varied_history(path: Path, turns: int, seed: int = 0) -> list[str]:
+    """Write turns drawn from a Zipf-like vocabulary; returns the user messages."""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    messages = []
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(turns):
+            user = " ".join(rng.choices(vocabulary, weights, k=20))
+            assistant = " ".join(rng.choices(vocabulary, weights, k=40))
+            f.write(json.dumps({"user": user, "assistant": assistant, "ts": 0.0}) + "\n")
+            messages.append(user)
+    return messages
+
+
+async def _time_async(func: Callable[[], Awaitable], repeat: int) -> float:
+    """Mean seconds per call of ``func`` over ``repeat`` calls."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (time.perf_counter() - start) / repeat
+
+
+async def bench_memory_load(sizes: list[int], repeat: int = 50) -> dict:
+    """Cold ``load(limit=10)`` time of both memory backends as the history grows.
+
+    A flat curve across sizes shows loading cost depends on ``limit`` rather
+    than on the length of the history.
+    """
+    from kipbot.core.config import MemoryConfig
+    from kipbot.memory.sqlite_store import SQLiteMemoryStore
+    from kipbot.memory.store import MemoryStore
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="kipbot-bench-") as workdir:
+        config = MemoryConfig(path=workdir)
+        local = MemoryStore(config)
+        sqlite = SQLiteMemoryStore(config)
+        try:
+            for size in sizes:
+                user_id = f"user{size}"
+                path = Path(workdir) / f"{user_id}.jsonl"
+                _write_history(path, size)
+                await sqlite.import_local(path)
+                local_time = await _time_async(lambda: local.load(user_id, limit=10), repeat)
+                sqlite_time = await _time_async(lambda: sqlite.load(user_id, limit=10), repeat)
+                results[f"local_{size}_us"] = local_time * 1e6
+                results[f"sqlite_{size}_us"] = sqlite_time * 1e6
+        finally:
+            await local.close()
+            await sqlite.close()
+    return results
+
+
+async def bench_memory_search(sizes: list[int], queries: int = 100) -> dict:
+    """Index build and query time of memory retrieval as the history grows."""
+    from kipbot.core.config import MemoryConfig
+    from kipbot.memory.store import MemoryStore
+
+    results = {}
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory(prefix="kipbot-bench-") as workdir:
+        config = MemoryConfig(path=workdir)
+        config.retrieval.build_timeout = 600.0
+        store = MemoryStore(config)
+        try:
+            for size in sizes:
+                user_id = f"user{size}"
+                messages = _write_varied_history(Path(workdir) / f"{user_id}.jsonl", size)
+                start = time.perf_counter()
+                await store.search(user_id, "", limit=5)
+                results[f"build_{size}_ms"] = (time.perf_counter() - start) * 1000
+                # Queries share words with a past turn, like a user returning to a topic
+                samples = [" ".join(rng.choice(messages).split()[:8]) for _ in range(queries)]
+                index = store.index.get(user_id)
+                start = time.perf_counter()
+                for query in samples:
+                    index.search(query, 5)
+                results[f"query_{size}_us"] = (time.perf_counter() - start) / queries * 1e6
+        finally:
+            await store.close()
+    return results
+
+
+def bench_build_messages(lengths: list[int], repeat: int = 200) -> dict:
+    """Time ``Agent._build_messages`` for sessions of growing history length."""
+    from kipbot.core.session import Message
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="kipbot-bench-") as workdir:
+        agent = create_bench_agent(bench_config(Path(workdir)), FakeLLMConfig())
+        for length in lengths:
+            context = agent.sessions.get(f"user{length}", "bench")
+            for i in range(length):
+                role = "user" if i % 2 == 0 else "assistant"
+                context.history.append(Message(role=role, content=f"message {i} " * 20))
+            # The first call counts tokens once per message; later calls reuse the counts
+            agent._build_messages(context)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                agent._build_messages(context)
+            results[f"history_{length}_us"] = (time.perf_counter() - start) / repeat * 1e6
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """List metrics present in both runs, flagging changes worse than ``tolerance``."""
+    rows = []
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            base = baseline.get(scenario, {}).get(name)
+            if base is None or name in ("errors", "peak_rss_mb"):
+                continue
+            if base:
+                change = (value - base) / base
+            else:
+                # e.g. a heavy module that was not loaded at startup before
+                change = 0.0 if value == 0 else float("inf") if value > 0 else float("-inf")
+            worse = -change if name in HIGHER_IS_BETTER else change
+            rows.append({
+                "scenario": scenario,
+                "metric": name,
+                "baseline": base,
+                "current": value,
+                "change": change,
+                "regressed": worse > tolerance,
+            })
+    return rows
@@ -5,7 +5,9 @@ from pathlib import Path
 
 import typer
 from rich.console import Console
+from rich.live import Live
 from rich.panel import Panel
+from rich.text import Text
 
 from kipbot import __version__
 
@@ -17,16 +19,32 @@ CONFIG_FILE = CONFIG_DIR / "config.json"
 
 
 def _create_agent(config):
-    """Create an agent with all built-in tools registered."""
+    """Create an agent with the built-in tools enabled in the config registered.
+
+    Tool modules are imported only when the tool is enabled.
+    """
     from kipbot.core.agent import Agent
-    from kipbot.tools.calculator import CalculatorTool
-    from kipbot.tools.datetime_tool import DateTimeTool
-    from kipbot.tools.web_search import WebSearchTool
 
     agent = Agent(config)
-    agent.register_tool(DateTimeTool())
-    agent.register_tool(CalculatorTool())
-    agent.register_tool(WebSearchTool())
+    enabled = config.tools.enabled
+    if "datetime" in enabled:
+        from kipbot.tools.datetime_tool import DateTimeTool
+        agent.register_tool(DateTimeTool())
+    if "calculator" in enabled:
+        from kipbot.tools.calculator import CalculatorTool
+        agent.register_tool(CalculatorTool())
+    search = config.tools.web_search
+    # Without an API key every search would fail, so don't offer the tool at all
+    if "web_search" in enabled and search.api_key:
+        from kipbot.tools.web_search import WebSearchTool
+        agent.register_tool(WebSearchTool(
+            api_key=search.api_key,
+            base_url=search.base_url,
+            max_results=search.max_results,
+            max_connections=search.max_connections,
+            max_keepalive=search.max_keepalive,
+            http2=search.http2,
+        ))
     return agent
 
 
@@ -75,12 +93,73 @@ def init():
     ))
 
 
+PLATFORMS = ("telegram", "discord", "kakao")
+
+
+def _check_worker_memory(config) -> None:
+    """Raise ValueError if workers behind ``kipbot router`` would share local memory.
+
+    A user can reach two workers during a rebalance or failover, and the
+    local memory backend keeps per-process state about each user's files,
+    so turns would be lost; the SQLite backend is safe for several writers.
+    """
+    if config.memory.enabled and config.memory.backend != "sqlite":
+        raise ValueError(
+            "Workers behind kipbot router share one memory directory, which the local "
+            'memory backend can\'t; set "memory": {"backend": "sqlite"}'
+        )
+
+
+def _create_platform(
+    name: str,
+    agent,
+    config,
+    port: int | None,
+    shards: str | None,
+    register_webhook: bool = True,
+):
+    """Create the platform ``name`` with command-line overrides applied.
+
+    Raises ValueError for an invalid platform configuration.
+    """
+    if name == "telegram":
+        from kipbot.platforms.telegram import TelegramPlatform
+        telegram = config.telegram
+        if port:
+            telegram = telegram.model_copy(update={"webhook_port": port})
+        if not register_webhook:
+            telegram = telegram.model_copy(update={"webhook_register": False})
+        return TelegramPlatform(agent, telegram)
+    if name == "discord":
+        from kipbot.platforms.discord_bot import DiscordPlatform, parse_shard_ids
+        discord_config = config.discord
+        if shards:
+            discord_config = discord_config.model_copy(
+                update={"sharded": True, "shard_ids": parse_shard_ids(shards)}
+            )
+        return DiscordPlatform(agent, discord_config)
+    from kipbot.platforms.kakao import KakaoPlatform
+    kakao = config.kakao
+    if port:
+        kakao = kakao.model_copy(update={"port": port})
+    return KakaoPlatform(agent, kakao)
+
+
 @app.command()
-def run(platform: str = typer.Argument("telegram", help="Platform to run: telegram, discord, kakao")):
+def run(
+    platform: str = typer.Argument(
+        "telegram", help="Platform to run: telegram, discord, kakao, or all enabled ones"
+    ),
+    port: int = typer.Option(
+        None, help="Port for the Kakao skill server or Telegram webhook (worker mode)"
+    ),
+    shards: str = typer.Option(None, help="Discord shards served by this process, e.g. 0-3"),
+    register_webhook: bool = typer.Option(
+        True, help="Register the Telegram webhook on start; leave it to one worker"
+    ),
+):
     """Start kipbot on the specified platform."""
-    import asyncio
     from kipbot.core.config import Config
-    from kipbot.core.agent import Agent
 
     raw = load_config()
     if not raw:
@@ -88,24 +167,211 @@ def run(platform: str = typer.Argument("telegram", help="Platform to run: telegr
         raise typer.Exit(1)
 
     config = Config(**raw)
+    if platform == "all":
+        names = [name for name in PLATFORMS if getattr(config, name).enabled]
+        if not names:
+            console.print("[red]No platform is enabled in the config.[/red]")
+            raise typer.Exit(1)
+        if port and "telegram" in names and "kakao" in names:
+            console.print("[red]--port is ambiguous with both Telegram and Kakao enabled.[/red]")
+            raise typer.Exit(1)
+    elif platform in PLATFORMS:
+        names = [platform]
+    else:
+        console.print(f"[red]Unknown platform: {platform}[/red]")
+        raise typer.Exit(1)
+
+    if port and config.cluster.workers:
+        try:
+            _check_worker_memory(config)
+        except ValueError as e:
+            console.print(f"[red]{e}[/red]")
+            raise typer.Exit(1)
+
     agent = _create_agent(config)
+    if config.metrics.enabled:
+        from kipbot.core.metrics import start_metrics_server
+        start_metrics_server(config.metrics)
 
-    if platform == "telegram":
-        from kipbot.platforms.telegram import TelegramPlatform
-        bot = TelegramPlatform(agent, config.telegram.token)
-        bot.run()
-    elif platform == "discord":
-        from kipbot.platforms.discord_bot import DiscordPlatform
-        bot = DiscordPlatform(agent, config.discord.token)
-        bot.run()
-    elif platform == "kakao":
-        from kipbot.platforms.kakao import KakaoPlatform
-        bot = KakaoPlatform(agent, config.kakao.api_key)
-        bot.run()
+    from kipbot.platforms.supervisor import Supervisor
+    try:
+        platforms = [
+            _create_platform(name, agent, config, port, shards, register_webhook)
+            for name in names
+        ]
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    # One event loop and one agent (LLM connections, tools, memory) for all platforms
+    Supervisor(agent, platforms).run()
+
+
+@app.command()
+def router():
+    """Forward webhook updates to the worker that owns each user."""
+    from kipbot.core.config import Config
+    from kipbot.platforms.router import ShardRouter
+
+    config = Config(**load_config())
+    if not config.cluster.workers:
+        console.print('[red]No workers configured. Set "cluster": {"workers": [...]}.[/red]')
+        raise typer.Exit(1)
+    try:
+        _check_worker_memory(config)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    if config.session.store == "memory":
+        console.print(
+            "[yellow]Sessions are not shared between workers; "
+            'set "session": {"store": "sqlite"} to hand users over on rebalancing.[/yellow]'
+        )
+    ShardRouter(config.cluster).run()
+
+
+@app.command()
+def bench(
+    target: str = typer.Option(
+        "all", help="What to load: agent, kakao, telegram, discord, all or none"
+    ),
+    users: int = typer.Option(1000, help="Concurrent synthetic users"),
+    messages: int = typer.Option(3, help="Messages sent by each user, one after another"),
+    latency: float = typer.Option(0.2, help="Fake LLM seconds to first token"),
+    tokens: int = typer.Option(100, help="Fake LLM output tokens per answer"),
+    token_rate: float = typer.Option(500.0, help="Fake LLM output tokens per second"),
+    tool_rate: float = typer.Option(0.3, help="Share of messages answered with tool calls"),
+    stream: bool = typer.Option(True, help="Stream answers in the agent benchmark"),
+    micro: bool = typer.Option(True, help="Run the memory and prompt-building micro benchmarks"),
+    startup: bool = typer.Option(True, help="Measure cold startup time, RSS and imports"),
+    save: Path = typer.Option(None, help="Write the results to this JSON file"),
+    baseline: Path = typer.Option(None, help="Compare against results saved earlier"),
+    tolerance: float = typer.Option(0.2, help="Allowed relative slowdown against the baseline"),
+):
+    """Measure kipbot's own overhead against a fake LLM backend."""
+    import asyncio
+    import sys
+
+    from loguru import logger
+    from rich.table import Table
+
+    from kipbot.bench.fake import FakeLLMConfig
+    from kipbot.bench.runner import (
+        PLATFORMS,
+        LoadOptions,
+        bench_build_messages,
+        bench_memory_load,
+        bench_memory_search,
+        bench_startup,
+        compare,
+        run_load,
+    )
+
+    if target == "all":
+        targets = list(PLATFORMS)
+    elif target == "none":
+        targets = []
+    elif target in PLATFORMS:
+        targets = [target]
     else:
-        console.print(f"[red]Unknown platform: {platform}[/red]")
+        console.print(f"[red]Unknown target: {target}[/red]")
         raise typer.Exit(1)
 
+    # Per-request log lines would measure the terminal rather than kipbot
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    fake = FakeLLMConfig(latency=latency, tokens=tokens, token_rate=token_rate, tool_rate=tool_rate)
+    options = LoadOptions(users=users, messages=messages, stream=stream)
+
+    async def _run() -> dict:
+        results = {}
+        if startup:
+            console.print("Measuring startup...")
+            results["startup"], slowest = bench_startup()
+            for name, ms in slowest:
+                console.print(f"  import {name}: {ms:,.1f} ms")
+        for name in targets:
+            console.print(f"Running {name} with {users} users x {messages} messages...")
+            results[name] = await run_load(name, options, fake)
+        if micro:
+            console.print("Running micro benchmarks...")
+            results["memory_load"] = await bench_memory_load([1_000, 10_000, 100_000])
+            results["memory_search"] = await bench_memory_search([1_000, 10_000, 100_000])
+            results["build_messages"] = bench_build_messages([10, 100, 1_000])
+        return results
+
+    results = asyncio.run(_run())
+
+    table = Table(title="kipbot bench")
+    table.add_column("scenario")
+    table.add_column("metric")
+    table.add_column("value", justify="right")
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            table.add_row(scenario, name, f"{value:,.2f}")
+    console.print(table)
+
+    if save:
+        save.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        console.print(f"[green]Saved results to {save}[/green]")
+
+    if baseline:
+        rows = compare(results, json.loads(baseline.read_text(encoding="utf-8")), tolerance)
+        regressions = [row for row in rows if row["regressed"]]
+        for row in regressions:
+            console.print(
+                f"[red]{row['scenario']}.{row['metric']}: {row['baseline']:,.2f} -> "
+                f"{row['current']:,.2f} ({row['change']:+.0%})[/red]"
+            )
+        if regressions:
+            raise typer.Exit(1)
+        console.print(
+            f"[green]No regressions beyond {tolerance:.0%} in {len(rows)} metrics[/green]"
+        )
+
+
+@app.command("migrate-memory")
+def migrate_memory(
+    source: Path = typer.Option(None, help="Memory directory of the local backend"),
+):
+    """Import local memory into the SQLite backend."""
+    import asyncio
+
+    from kipbot.core.config import Config
+    from kipbot.memory.sqlite_store import SQLiteMemoryStore
+
+    config = Config(**load_config())
+    source = source or Path(config.memory.path)
+    # Per-user segment directories, and flat files from before segments
+    files = sorted(
+        path for path in source.iterdir() if path.is_dir() or path.suffix == ".jsonl"
+    ) if source.is_dir() else []
+    if not files:
+        console.print(f"[yellow]No memory files found in {source}[/yellow]")
+        return
+
+    async def _migrate() -> tuple[int, int]:
+        store = SQLiteMemoryStore(config.memory)
+        imported = 0
+        turns = 0
+        try:
+            for file in files:
+                count = await store.import_local(file)
+                if count:
+                    imported += 1
+                    turns += count
+        finally:
+            await store.close()
+        return imported, turns
+
+    imported, turns = asyncio.run(_migrate())
+    console.print(
+        f"[green]Imported {turns} turns of {imported} of {len(files)} users "
+        f"into {Path(config.memory.path) / 'memory.db'}[/green]"
+    )
+    if config.memory.backend != "sqlite":
+        console.print('Set "memory": {"backend": "sqlite"} in the config to use it.')
+
 
 @app.command()
 def chat():
@@ -125,14 +391,30 @@ def chat():
 
     console.print(Panel("kipbot interactive chat - type 'exit' to quit", title="kipbot"))
 
-    while True:
+    async def respond(user_input: str) -> None:
+        streamed = ""
+        with Live(Text("Kipbot: ", style="bold green"), console=console, transient=True) as live:
+
+            async def on_delta(delta: str) -> None:
+                nonlocal streamed
+                streamed += delta
+                live.update(Text.assemble(("Kipbot: ", "bold green"), streamed))
+
+            response = await agent.chat(context, user_input, on_delta=on_delta)
+        console.print(Text.assemble(("Kipbot: ", "bold green"), response))
+
+    # One loop for the whole session so the memory writer keeps running between turns
+    with asyncio.Runner() as runner:
         try:
-            user_input = console.input("[bold cyan]You:[/bold cyan] ")
-        except (KeyboardInterrupt, EOFError):
-            break
+            while True:
+                try:
+                    user_input = console.input("[bold cyan]You:[/bold cyan] ")
+                except (KeyboardInterrupt, EOFError):
+                    break
 
-        if user_input.strip().lower() in ("exit", "quit", "q"):
-            break
+                if user_input.strip().lower() in ("exit", "quit", "q"):
+                    break
 
-        response = asyncio.run(agent.chat(context, user_input))
-        console.print(f"[bold green]Kipbot:[/bold green] {response}")
+                runner.run(respond(user_input))
+        finally:
+            runner.run(agent.close())
@@ -1,32 +1,40 @@
 """Core agent logic for kipbot."""
 
+import asyncio
 import json
-from dataclasses import dataclass, field
+from contextlib import nullcontext
 
 from loguru import logger
 
 from kipbot.core.config import Config
-from kipbot.llm.provider import LLMProvider
-from kipbot.memory.store import MemoryStore
+from kipbot.core.metrics import (
+    CHAT_SECONDS,
+    MEMORY_SECONDS,
+    REGISTRY,
+    TOOL_ERRORS,
+    TOOL_ROUNDS,
+    TOOL_ROUNDS_EXHAUSTED,
+    TOOL_SECONDS,
+    platform_scope,
+    setup_tracing,
+    span,
+)
+from kipbot.core.session import AgentContext, Message, SessionManager
+from kipbot.core.window import window_start
+from kipbot.llm.provider import DeltaCallback, LLMProvider
+from kipbot.llm.ratelimit import Priority
+from kipbot.memory.store import create_memory_store
 from kipbot.tools.base import BaseTool
+from kipbot.tools.executor import ToolExecutor
 
 MAX_TOOL_ROUNDS = 10
+TOOL_OUTPUT_KEEP = 500  # chars of a tool output kept once the turn is answered
 
-
-@dataclass
-class Message:
-    role: str  # "user", "assistant", "system", "tool"
-    content: str
-    tool_calls: list | None = None
-    tool_call_id: str | None = None
-    name: str | None = None
-
-
-@dataclass
-class AgentContext:
-    user_id: str
-    platform: str
-    history: list[Message] = field(default_factory=list)
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Merge the new messages into the current summary. Keep facts about the user, their "
+    "preferences, decisions made and open questions. Reply with the updated summary only."
+)
 
 
 class Agent:
@@ -35,33 +43,97 @@ class Agent:
     def __init__(self, config: Config) -> None:
         self.config = config
         self.llm = LLMProvider(config.llm)
-        self.memory = MemoryStore(config.memory)
+        self.memory = create_memory_store(config.memory)
+        self.sessions = SessionManager(config.session)
         self.tools: dict[str, BaseTool] = {}
+        self._tools_schema: list[dict] | None = None
+        self._tools_tokens = 0
+        self._system_tokens: int | None = None
+        self._tool_slots = asyncio.Semaphore(config.tools.max_concurrency)
+        self._tool_limits: dict[str, asyncio.Semaphore] = {}
+        self._tools_running = 0
+        self.executor = ToolExecutor(config.tools)
+        setup_tracing(config.metrics)
+        REGISTRY.collector("agent", self._collect_metrics)
 
     def register_tool(self, tool: BaseTool) -> None:
         """Register a tool the agent can use."""
         self.tools[tool.name] = tool
+        self._tools_schema = None
+        if tool.max_concurrency:
+            self._tool_limits[tool.name] = asyncio.Semaphore(tool.max_concurrency)
+        else:
+            self._tool_limits.pop(tool.name, None)
         logger.info(f"Registered tool: {tool.name}")
 
-    async def chat(self, context: AgentContext, user_message: str) -> str:
-        """Process a user message, run tool calls if needed, return final response."""
+    async def warm_up(self) -> None:
+        """Load the LLM library before serving, off the event loop."""
+        await self.llm.warm_up()
+
+    async def close(self) -> None:
+        """Flush pending memory writes and release resources."""
+        await self.memory.close()
+        await self.sessions.close()
+        await self.llm.close()
+        for tool in self.tools.values():
+            await tool.close()
+        await self.executor.close()
+
+    async def chat(
+        self,
+        context: AgentContext,
+        user_message: str,
+        on_delta: DeltaCallback | None = None,
+    ) -> str:
+        """Process a user message, run tool calls if needed, return final response.
+
+        If ``on_delta`` is given, LLM output is streamed to it as it is generated.
+        """
+        with (
+            platform_scope(context.platform),
+            span("kipbot.chat", **{"kipbot.user_id": context.user_id}),
+            CHAT_SECONDS.time(),
+        ):
+            return await self._chat(context, user_message, on_delta)
+
+    async def _chat(
+        self,
+        context: AgentContext,
+        user_message: str,
+        on_delta: DeltaCallback | None,
+    ) -> str:
         logger.info(f"[{context.platform}] {context.user_id}: {user_message}")
 
-        # Load memory on first message
+        # Let a summary still being written for the last turn settle first.
+        # wait() neither raises if that task was cancelled nor cancels it with us.
+        summarizing = context.summarizing
+        if summarizing is not None and not summarizing.done():
+            await asyncio.wait({summarizing})
+
+        # Pick up where another worker left off if it served this user since,
+        # or load memory on first message
+        await self.sessions.restore(context)
         if not context.history and self.config.memory.enabled:
-            prev = await self.memory.load(context.user_id, limit=10)
+            with MEMORY_SECONDS.time(op="load"):
+                prev = await self._recall(context.user_id, user_message)
             for entry in prev:
                 context.history.append(Message(role="user", content=entry["user"]))
                 context.history.append(Message(role="assistant", content=entry["assistant"]))
 
         context.history.append(Message(role="user", content=user_message))
 
-        tools_schema = [t.to_openai_schema() for t in self.tools.values()] or None
+        tools_schema = self._get_tools_schema()
 
         # Agentic loop: keep calling LLM until it produces a text response
-        for _ in range(MAX_TOOL_ROUNDS):
+        for rounds in range(MAX_TOOL_ROUNDS):
             messages = self._build_messages(context)
-            response = await self.llm.complete(messages, tools=tools_schema)
+            response = await self.llm.complete(
+                messages,
+                tools=tools_schema,
+                on_delta=on_delta,
+                priority=context.priority,
+                key=self._queue_key(context),
+            )
             choice = response.choices[0]
             msg = choice.message
 
@@ -69,19 +141,28 @@ class Agent:
             if not msg.tool_calls:
                 text = msg.content or ""
                 context.history.append(Message(role="assistant", content=text))
+                TOOL_ROUNDS.observe(rounds)
                 if self.config.memory.enabled:
+                    # Only queues the turn; the writer times the write itself (op="flush")
                     await self.memory.save(context.user_id, user_message, text)
+                self._compact_history(context)
+                await self.sessions.persist(context)
                 return text
 
-            # Has tool calls — execute each and feed results back
+            # Has tool calls — run them concurrently and feed results back in call order
             context.history.append(Message(
                 role="assistant",
                 content=msg.content or "",
                 tool_calls=[tc.model_dump() for tc in msg.tool_calls],
             ))
 
-            for tc in msg.tool_calls:
-                result = await self._execute_tool(tc.function.name, tc.function.arguments)
+            try:
+                results = await self._execute_tools(msg.tool_calls)
+            except asyncio.CancelledError:
+                # Don't leave tool calls without results behind for the next request
+                context.history.pop()
+                raise
+            for tc, result in zip(msg.tool_calls, results):
                 context.history.append(Message(
                     role="tool",
                     content=result,
@@ -90,43 +171,263 @@ class Agent:
                 ))
 
         # Exhausted rounds, ask LLM for a final answer without tools
+        TOOL_ROUNDS.observe(MAX_TOOL_ROUNDS)
+        TOOL_ROUNDS_EXHAUSTED.inc()
         context.history.append(Message(
             role="user",
             content="Please provide your final answer based on the tool results above.",
         ))
         messages = self._build_messages(context)
-        response = await self.llm.complete(messages, tools=None)
+        response = await self.llm.complete(
+            messages,
+            on_delta=on_delta,
+            priority=context.priority,
+            key=self._queue_key(context),
+        )
         text = response.choices[0].message.content or ""
         context.history.append(Message(role="assistant", content=text))
+        self._compact_history(context)
+        await self.sessions.persist(context)
         return text
 
+    @staticmethod
+    def _queue_key(context: AgentContext) -> str:
+        return f"{context.platform}:{context.user_id}"
+
+    def _get_tools_schema(self) -> list[dict] | None:
+        """Return the tool schemas, rebuilt only after a tool is registered."""
+        if self._tools_schema is None:
+            self._tools_schema = [t.to_openai_schema() for t in self.tools.values()]
+            self._tools_tokens = (
+                self.llm.count_tokens([], tools=self._tools_schema) if self._tools_schema else 0
+            )
+        return self._tools_schema or None
+
+    async def _execute_tools(self, tool_calls: list) -> list[str]:
+        """Execute one round of tool calls concurrently, returning results in call order.
+
+        If the caller is cancelled, every call still running in the round is cancelled too.
+        """
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(self._execute_tool(tc.function.name, tc.function.arguments))
+                for tc in tool_calls
+            ]
+        return [task.result() for task in tasks]
+
     async def _execute_tool(self, name: str, arguments: str) -> str:
         """Execute a tool by name and return the result as a string."""
         tool = self.tools.get(name)
         if not tool:
             return f"Error: unknown tool '{name}'"
 
+        timeout = tool.timeout or self.config.tools.timeout
         try:
             kwargs = json.loads(arguments) if arguments else {}
-            result = await tool.execute(**kwargs)
+            # Wait for the tool's own cap before taking a shared slot, so calls
+            # queued on one capped tool can't hold every slot
+            async with self._tool_limits.get(name) or nullcontext(), self._tool_slots:
+                self._tools_running += 1
+                try:
+                    with span("kipbot.tool", **{"kipbot.tool": name}), TOOL_SECONDS.time(tool=name):
+                        async with asyncio.timeout(timeout):
+                            result = await self.executor.run(tool, kwargs)
+                finally:
+                    self._tools_running -= 1
             logger.info(f"Tool {name} -> success={result.success}")
+            if not result.success:
+                TOOL_ERRORS.inc(tool=name)
             return result.output
+        except TimeoutError:
+            TOOL_ERRORS.inc(tool=name)
+            logger.error(f"Tool {name} timed out after {timeout}s")
+            return f"Error executing {name}: timed out after {timeout}s"
         except Exception as e:
+            TOOL_ERRORS.inc(tool=name)
             logger.error(f"Tool {name} failed: {e}")
             return f"Error executing {name}: {e}"
 
+    def _collect_metrics(self) -> None:
+        """Copy queue depths, cache and pool state into the metrics registry."""
+        sessions = REGISTRY.gauge(
+            "kipbot_active_sessions", "Sessions held in memory.", ("platform",)
+        )
+        sessions.clear()
+        for platform, count in self.sessions.counts().items():
+            sessions.set(count, platform=platform)
+        REGISTRY.gauge(
+            "kipbot_memory_queue_depth", "Turns waiting in the memory write-behind queue."
+        ).set(self.memory.queue_depth)
+        REGISTRY.gauge(
+            "kipbot_memory_indexes", "Per-user memory retrieval indexes held in memory."
+        ).set(len(self.memory.index))
+        REGISTRY.gauge(
+            "kipbot_tools_running", "Tool calls holding an execution slot."
+        ).set(self._tools_running)
+        REGISTRY.gauge(
+            "kipbot_tool_slots", "Tool execution slots (tools.max_concurrency)."
+        ).set(self.config.tools.max_concurrency)
+        self.executor.collect_metrics()
+
+        llm = self.llm
+        REGISTRY.gauge(
+            "kipbot_llm_queue_length", "LLM requests waiting for admission."
+        ).set(llm.admission.queue_length)
+        admitted = REGISTRY.counter(
+            "kipbot_llm_admissions_total", "LLM admission decisions.", ("result",)
+        )
+        admitted.set(llm.admission.stats.admitted, result="admitted")
+        admitted.set(llm.admission.stats.rejected, result="rejected")
+        if llm.cache is not None:
+            lookups = REGISTRY.counter(
+                "kipbot_llm_cache_lookups_total", "Completion cache lookups.", ("result",)
+            )
+            lookups.set(llm.cache.stats.hits, result="hit")
+            lookups.set(llm.cache.stats.misses, result="miss")
+            REGISTRY.counter(
+                "kipbot_llm_cache_saved_seconds_total", "LLM latency avoided by cache hits."
+            ).set(llm.cache.stats.saved_seconds)
+
+    async def _recall(self, user_id: str, query: str) -> list[dict]:
+        """Past turns to replay into a new session, oldest first.
+
+        With retrieval enabled these are the latest ``recent`` turns plus the
+        ``top_k`` turns most relevant to ``query``, as far as ``max_tokens``
+        allows; otherwise just the last 10 turns.
+        """
+        retrieval = self.config.memory.retrieval
+        if not retrieval.enabled:
+            return await self.memory.load(user_id, limit=10)
+
+        recent, relevant = await asyncio.gather(
+            self.memory.load(user_id, limit=retrieval.recent),
+            self.memory.search(user_id, query, limit=retrieval.top_k),
+        )
+        budget = retrieval.max_tokens
+        seen = set()
+        latest: list[dict] = []
+        matches: list[dict] = []
+        # Newest first, then the best matches, until the budget runs out
+        for i, entry in enumerate([*reversed(recent), *relevant]):
+            # Turns saved before timestamps were recorded have no "ts"
+            key = (entry.get("ts", 0.0), entry["user"], entry["assistant"])
+            if key in seen:
+                continue
+            seen.add(key)
+            tokens = self.llm.count_tokens([
+                {"role": "user", "content": entry["user"]},
+                {"role": "assistant", "content": entry["assistant"]},
+            ])
+            if tokens > budget:
+                continue
+            budget -= tokens
+            (latest if i < len(recent) else matches).append(entry)
+        # Sorting is stable, so turns without a timestamp keep this order:
+        # older matches first, then the latest turns oldest first
+        chosen = [*matches, *reversed(latest)]
+        chosen.sort(key=lambda entry: entry.get("ts", 0.0))
+        return chosen
+
+    def _compact_history(self, context: AgentContext) -> None:
+        """Shrink a session once its turn is answered.
+
+        Tool outputs have been consumed by then, so long ones are cut down.
+        Messages that no longer fit the token budget are folded into the rolling
+        summary in batches of at least ``summarize_batch`` messages, on a background task
+        so the reply isn't held up, or simply dropped if summaries are disabled.
+        """
+        for msg in context.history:
+            if msg.role == "tool" and len(msg.content) > TOOL_OUTPUT_KEEP:
+                msg.content = msg.content[:TOOL_OUTPUT_KEEP] + " ...[truncated]"
+                msg.tokens = None
+
+        start = self._window_start(context)
+        if not self.config.context.summarize:
+            del context.history[:start]
+        elif start >= self.config.context.summarize_batch and context.summarizing is None:
+            context.summarizing = asyncio.create_task(self._extend_summary(context, start))
+        self.sessions.update(context)
+
+    async def _extend_summary(self, context: AgentContext, count: int) -> None:
+        """Fold the oldest ``count`` messages into the session summary."""
+        try:
+            await self._fold_history(context, count)
+        finally:
+            # Also when cancelled, so the next turn neither waits on it nor skips summarizing
+            if context.summarizing is asyncio.current_task():
+                context.summarizing = None
+
+    async def _fold_history(self, context: AgentContext, count: int) -> None:
+        folded = context.history[:count]
+        transcript = "\n".join(
+            f"{msg.name or msg.role}: {msg.content}" for msg in folded if msg.content
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {
+                "role": "user",
+                "content": (
+                    f"Current summary:\n{context.summary or '(none)'}\n\n"
+                    f"New messages:\n{transcript}"
+                ),
+            },
+        ]
+        try:
+            response = await self.llm.complete(
+                messages,
+                max_tokens=self.config.context.summary_max_tokens,
+                priority=max(context.priority, Priority.BACKGROUND),
+                key=self._queue_key(context),
+            )
+            summary = response.choices[0].message.content or ""
+        except Exception as e:
+            # Dropping the messages still keeps the session within budget
+            logger.error(f"Failed to summarize history for {context.user_id}: {e}")
+        else:
+            context.summary = summary.strip()
+            context.summary_tokens = self.llm.count_tokens(
+                [{"role": "system", "content": context.summary}]
+            )
+        del context.history[:count]
+        self.sessions.update(context)
+        await self.sessions.persist(context)
+
+    def _count_tokens(self, msg: Message) -> int:
+        if msg.tokens is None:
+            msg.tokens = self.llm.count_tokens([self._to_entry(msg)])
+        return msg.tokens
+
+    def _window_start(self, context: AgentContext) -> int:
+        """Index of the oldest history message that fits the prompt budget."""
+        if self._system_tokens is None:
+            self._system_tokens = self.llm.count_tokens(
+                [{"role": "system", "content": self.config.system_prompt}]
+            )
+        budget = (
+            self.config.context.max_tokens
+            - self._system_tokens
+            - self._tools_tokens
+            - context.summary_tokens
+        )
+        return window_start(context.history, budget, self._count_tokens)
+
+    def _to_entry(self, msg: Message) -> dict:
+        entry: dict = {"role": msg.role, "content": msg.content}
+        if msg.tool_calls:
+            entry["tool_calls"] = msg.tool_calls
+        if msg.tool_call_id:
+            entry["tool_call_id"] = msg.tool_call_id
+        if msg.name:
+            entry["name"] = msg.name
+        return entry
+
     def _build_messages(self, context: AgentContext) -> list[dict]:
-        """Build the message list for the LLM API."""
-        messages = [{"role": "system", "content": self.config.system_prompt}]
-
-        for msg in context.history[-30:]:
-            entry: dict = {"role": msg.role, "content": msg.content}
-            if msg.tool_calls:
-                entry["tool_calls"] = msg.tool_calls
-            if msg.tool_call_id:
-                entry["tool_call_id"] = msg.tool_call_id
-            if msg.name:
-                entry["name"] = msg.name
-            messages.append(entry)
+        """Build the message list for the LLM API, fitted to the token budget."""
+        system = self.config.system_prompt
+        if context.summary:
+            system += f"\n\nSummary of the earlier conversation:\n{context.summary}"
+        messages = [{"role": "system", "content": system}]
 
+        start = self._window_start(context)
+        messages.extend(self._to_entry(msg) for msg in context.history[start:])
         return messages
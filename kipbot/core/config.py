@@ -3,11 +3,46 @@
 from pathlib import Path
 
 from pydantic import Field
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 DEFAULT_CONFIG_DIR = Path.home() / ".kipbot"
 
 
+class CompletionCacheConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="KIPBOT_CACHE_")
+
+    mode: str = "off"  # "off", "auto" (only at low temperature) or "always"
+    max_temperature: float = 0.2  # highest temperature cached in "auto" mode
+    ttl: float = 24 * 3600.0  # seconds
+    max_entries: int = 1000  # kept in memory
+    disk: bool = True
+    max_disk_entries: int = 50_000
+    path: str = str(DEFAULT_CONFIG_DIR / "cache")
+
+
+class LLMBackendConfig(BaseSettings):
+    provider: str = "openai"
+    model: str = "gpt-4o-mini"
+    api_key: str = ""
+    base_url: str | None = None
+
+
+class RoutingConfig(BaseSettings):
+    hedge: bool = True  # send a second request when the first runs past its p95
+    hedge_percentile: float = 0.95
+    hedge_min_delay: float = 1.0  # seconds; also used until enough latencies are known
+    min_samples: int = 20  # latencies needed before the percentile is trusted
+    window: int = 200  # recent requests kept per backend for latency and error rates
+    failure_threshold: int = 5  # consecutive failures that open the circuit breaker
+    cooldown: float = 30.0  # seconds before a tripped backend is tried again
+
+
+class RateLimitConfig(BaseSettings):
+    requests_per_minute: int = 0  # 0 disables the limit
+    tokens_per_minute: int = 0  # 0 disables the limit
+    max_queue: int = 1000  # waiting requests before new ones are rejected
+
+
 class LLMConfig(BaseSettings):
     provider: str = "openai"
     model: str = "gpt-4o-mini"
@@ -15,30 +50,141 @@ class LLMConfig(BaseSettings):
     base_url: str | None = None
     temperature: float = 0.7
     max_tokens: int = 4096
+    prompt_caching: bool = True  # mark cache breakpoints for providers that need them
+    cache: CompletionCacheConfig = Field(default_factory=CompletionCacheConfig)
+    # Ordered fallbacks; when empty the provider/model fields above are the only backend
+    backends: list[LLMBackendConfig] = Field(default_factory=list)
+    routing: RoutingConfig = Field(default_factory=RoutingConfig)
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
 
 
 class TelegramConfig(BaseSettings):
     enabled: bool = False
     token: str = ""
     allowed_users: list[int] = Field(default_factory=list)
+    concurrency: int = 128  # turns answered at once; each user's turns still run in order
+    api_url: str = ""  # Bot API server, e.g. a self-hosted one; empty for api.telegram.org
+    # Webhook mode: set to the public URL Telegram should post updates to
+    webhook_url: str = ""  # empty to use long polling
+    webhook_secret: str = ""  # checked on every update; derived from the token when empty
+    webhook_register: bool = True  # register the webhook on start; one worker is enough
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8443
+    webhook_path: str = "/telegram/webhook"
 
 
 class DiscordConfig(BaseSettings):
     enabled: bool = False
     token: str = ""
     allowed_guilds: list[int] = Field(default_factory=list)
+    # Sharding: one gateway connection per shard, needed by Discord past 2500 guilds
+    sharded: bool = False
+    shard_count: int = 0  # shards over all processes, 0 for Discord's recommendation
+    shard_ids: list[int] = Field(default_factory=list)  # this process's shards, empty for all
+    concurrency: int = 128  # turns answered at once
 
 
 class KakaoConfig(BaseSettings):
     enabled: bool = False
     api_key: str = ""
     bot_id: str = ""
+    host: str = "0.0.0.0"
+    port: int = 5000
+    callback_after: float = 3.5  # seconds before switching to a callback reply
+    concurrency: int = 128  # turns answered at once
+
+
+class RetrievalConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="KIPBOT_RETRIEVAL_")
+
+    enabled: bool = True  # replay relevant past turns, not just the latest ones
+    top_k: int = 5  # relevant turns replayed into a new session
+    recent: int = 3  # latest turns always replayed
+    max_tokens: int = 2000  # prompt budget for replayed turns
+    max_users: int = 200  # per-user indexes kept in memory
+    build_timeout: float = 0.25  # seconds to wait for a cold index before going without
 
 
 class MemoryConfig(BaseSettings):
+    # Without a prefix, ``path`` would be read from the shell's $PATH
+    model_config = SettingsConfigDict(env_prefix="KIPBOT_MEMORY_")
+
     enabled: bool = True
     backend: str = "local"  # "local" or "sqlite"
     path: str = str(DEFAULT_CONFIG_DIR / "memory")
+    batch_size: int = 500  # rows per transaction for the sqlite backend
+    flush_interval: float = 1.0  # seconds between background writes
+    flush_batch_size: int = 100  # pending turns that trigger an early write
+    fsync: str = "never"  # "never", "batch" or "turn"
+    # Local backend: each user's turns are split into segments, compressed once full
+    segment_bytes: int = 1024 * 1024  # size at which the active segment is sealed
+    compression: str = "gzip"  # "gzip", "zstd" (needs zstandard) or "none"
+    max_age_days: float = 0.0  # drop turns older than this, 0 keeps them forever
+    max_turns: int = 0  # turns kept per user, 0 for no limit
+    compact_interval: float = 600.0  # seconds between compactor passes
+    retrieval: RetrievalConfig = Field(default_factory=RetrievalConfig)
+
+
+class SessionConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="KIPBOT_SESSION_")
+
+    max_sessions: int = 10_000
+    idle_ttl: float = 1800.0  # seconds before an idle session is dropped
+    max_bytes: int = 256 * 1024 * 1024  # estimated size budget for all sessions
+    store: str = "memory"  # "memory" (this process only) or "sqlite" (shared by workers)
+    store_path: str = str(DEFAULT_CONFIG_DIR / "sessions.db")
+
+
+class MetricsConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="KIPBOT_METRICS_")
+
+    enabled: bool = False  # serve Prometheus metrics at http://host:port/metrics
+    host: str = "127.0.0.1"
+    port: int = 9100
+    tracing: bool = False  # emit OpenTelemetry spans (needs opentelemetry-api)
+
+
+class ClusterConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="KIPBOT_CLUSTER_")
+
+    workers: list[str] = Field(default_factory=list)  # worker base URLs
+    vnodes: int = 160  # ring positions per worker
+    host: str = "0.0.0.0"
+    port: int = 8080  # port of the front router
+    timeout: float = 30.0  # seconds to wait for a worker's response
+
+
+class WebSearchConfig(BaseSettings):
+    api_key: str = ""  # Tavily API key
+    base_url: str = "https://api.tavily.com"
+    max_results: int = 5
+    max_connections: int = 20
+    max_keepalive: int = 10
+    http2: bool = True
+
+
+class DispatchConfig(BaseSettings):
+    # Seconds to wait for follow-up messages before a turn starts; 0 answers at once
+    debounce: float = 0.0
+    max_delay: float = 3.0  # longest a message waits for its burst to end
+    drain_timeout: float = 30.0  # seconds queued turns get to finish at shutdown
+
+
+class ToolsConfig(BaseSettings):
+    enabled: list[str] = Field(default_factory=lambda: ["datetime", "calculator", "web_search"])
+    max_concurrency: int = 8  # tool calls running at once across all sessions
+    thread_workers: int = 8  # threads shared by all thread-tier tools
+    process_workers: int = 2  # worker processes per process-tier tool
+    process_memory_limit: int = 1024 * 1024 * 1024  # address space per worker, 0 for none
+    timeout: float = 30.0  # seconds, unless the tool sets its own
+    web_search: WebSearchConfig = Field(default_factory=WebSearchConfig)
+
+
+class ContextConfig(BaseSettings):
+    max_tokens: int = 12_000  # prompt budget for system prompt, tools and history
+    summarize: bool = True  # fold turns that no longer fit into a rolling summary
+    summarize_batch: int = 8  # messages to collect before extending the summary
+    summary_max_tokens: int = 512
 
 
 class Config(BaseSettings):
@@ -49,5 +195,11 @@ class Config(BaseSettings):
     discord: DiscordConfig = Field(default_factory=DiscordConfig)
     kakao: KakaoConfig = Field(default_factory=KakaoConfig)
     memory: MemoryConfig = Field(default_factory=MemoryConfig)
+    session: SessionConfig = Field(default_factory=SessionConfig)
+    dispatch: DispatchConfig = Field(default_factory=DispatchConfig)
+    cluster: ClusterConfig = Field(default_factory=ClusterConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+    tools: ToolsConfig = Field(default_factory=ToolsConfig)
+    context: ContextConfig = Field(default_factory=ContextConfig)
     system_prompt: str = "You are Kipbot, a helpful personal AI assistant."
     language: str = "ko"
@@ -0,0 +1,108 @@
+"""Per-user ordering and burst coalescing of incoming messages."""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from loguru import logger
+
+from kipbot.core.config import DispatchConfig
+
+# Runs one agent turn for the (possibly merged) text and returns its result
+TurnHandler = Callable[[str], Awaitable[Any]]
+
+
+@dataclass
+class _UserQueue:
+    texts: list[str] = field(default_factory=list)
+    futures: list[asyncio.Future] = field(default_factory=list)
+    handler: TurnHandler | None = None
+    first_at: float = 0.0
+    last_at: float = 0.0
+    worker: asyncio.Task | None = None
+
+
+def _retrieve(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+class Dispatcher:
+    """Serialize agent turns per user and merge bursts of messages into one turn.
+
+    A message waits ``debounce`` seconds for follow-ups (up to ``max_delay``
+    after the first) before its turn starts. Messages arriving while a turn is
+    running are queued and merged into the next turn. The newest message's
+    handler runs the merged turn; its future gets the handler's result and the
+    futures of earlier merged messages get None.
+    """
+
+    def __init__(self, config: DispatchConfig, debounce: float | None = None) -> None:
+        self.config = config
+        self.debounce = config.debounce if debounce is None else debounce
+        self._queues: dict[str, _UserQueue] = {}
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    def submit(self, key: str, text: str, handler: TurnHandler) -> asyncio.Future:
+        """Queue a message for ``key`` and return a future for its outcome."""
+        now = time.monotonic()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _UserQueue()
+        if not queue.texts:
+            queue.first_at = now
+        queue.texts.append(text)
+        queue.last_at = now
+        queue.handler = handler
+        future = asyncio.get_running_loop().create_future()
+        # _run logs failed turns, so callers may drop the future unread
+        future.add_done_callback(_retrieve)
+        queue.futures.append(future)
+
+        if queue.worker is None:
+            queue.worker = asyncio.create_task(self._run(key, queue))
+        return future
+
+    async def drain(self) -> None:
+        """Wait until every queued and running turn has finished."""
+        while workers := [q.worker for q in self._queues.values() if q.worker is not None]:
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _run(self, key: str, queue: _UserQueue) -> None:
+        try:
+            while queue.texts:
+                await self._settle(queue)
+                texts, futures, handler = queue.texts, queue.futures, queue.handler
+                queue.texts, queue.futures = [], []
+                if len(texts) > 1:
+                    logger.debug(f"Merged {len(texts)} messages from {key} into one turn")
+                try:
+                    result = await handler("\n".join(texts))
+                except Exception as e:
+                    logger.error(f"Turn for {key} failed: {e}")
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for future in futures[:-1]:
+                    if not future.done():
+                        future.set_result(None)
+                if not futures[-1].done():
+                    futures[-1].set_result(result)
+        finally:
+            queue.worker = None
+            if not queue.texts:
+                self._queues.pop(key, None)
+
+    async def _settle(self, queue: _UserQueue) -> None:
+        """Wait until the burst has been quiet for ``debounce`` or ``max_delay`` has passed."""
+        while True:
+            now = time.monotonic()
+            deadline = min(queue.last_at + self.debounce, queue.first_at + self.config.max_delay)
+            if now >= deadline:
+                return
+            await asyncio.sleep(deadline - now)
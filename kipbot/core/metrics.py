@@ -0,0 +1,313 @@
+"""In-process metrics with a Prometheus text endpoint and optional tracing."""
+
+import bisect
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+from kipbot.core.config import MetricsConfig
+
+# Platform of the request being handled; fills the ``platform`` label by default
+current_platform: ContextVar[str] = ContextVar("kipbot_platform", default="none")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric:
+    """A named metric with a fixed set of label names.
+
+    Label values are passed as keyword arguments; a ``platform`` label left
+    out is taken from :data:`current_platform`.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if "platform" in self.labels and "platform" not in labels:
+            labels["platform"] = current_platform.get()
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        """Set the total directly, for counts kept elsewhere (read at collect time)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def clear(self) -> None:
+        """Drop all label sets, e.g. before a collector sets the current ones."""
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # Per label set: bucket counts (non-cumulative, last is +Inf), sum
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the ``with`` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format.
+
+    Collectors are callables run before each render; they copy state kept
+    elsewhere (queue depths, cache statistics) into gauges and counters.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: dict[str, Callable[[], None]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls: type, name: str, help: str, labels: tuple[str, ...], **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def collector(self, name: str, func: Callable[[], None]) -> None:
+        """Register (or replace) a collect-time callback under ``name``."""
+        self._collectors[name] = func
+
+    def render(self) -> str:
+        for name, func in list(self._collectors.items()):
+            try:
+                func()
+            except Exception as e:
+                logger.debug(f"Metrics collector {name} failed: {e}")
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Metrics shared by the agent loop, the LLM provider and the memory stores
+CHAT_SECONDS = REGISTRY.histogram(
+    "kipbot_chat_seconds", "Time to answer one user message.", ("platform",)
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "kipbot_llm_request_seconds", "Latency of one LLM round.", ("platform", "backend")
+)
+LLM_TTFT_SECONDS = REGISTRY.histogram(
+    "kipbot_llm_ttft_seconds", "Time to first streamed token.", ("platform", "backend")
+)
+LLM_ERRORS = REGISTRY.counter(
+    "kipbot_llm_errors_total", "LLM requests that failed on every backend.", ("platform",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "kipbot_llm_tokens_total", "Tokens reported by the LLM provider.", ("platform", "type")
+)
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "kipbot_llm_queue_seconds", "Time spent waiting for LLM admission.", ("platform",)
+)
+TOOL_SECONDS = REGISTRY.histogram(
+    "kipbot_tool_seconds", "Tool execution time.", ("platform", "tool")
+)
+TOOL_ERRORS = REGISTRY.counter(
+    "kipbot_tool_errors_total", "Tool calls that failed or timed out.", ("platform", "tool")
+)
+TOOL_ROUNDS = REGISTRY.histogram(
+    "kipbot_tool_rounds", "Tool rounds used to answer one message.", ("platform",),
+    buckets=(0, 1, 2, 3, 5, 10),
+)
+TOOL_ROUNDS_EXHAUSTED = REGISTRY.counter(
+    "kipbot_tool_rounds_exhausted_total",
+    "Messages that hit MAX_TOOL_ROUNDS before a text answer.",
+    ("platform",),
+)
+MEMORY_SECONDS = REGISTRY.histogram(
+    "kipbot_memory_seconds",
+    "Memory store latency: op=load recalls a user's turns, op=flush writes one batch.",
+    ("platform", "op"),
+)
+
+
+@contextmanager
+def platform_scope(platform: str) -> Iterator[None]:
+    """Label metrics recorded inside the block with ``platform``."""
+    token = current_platform.set(platform)
+    try:
+        yield
+    finally:
+        current_platform.reset(token)
+
+
+_tracer = None
+
+
+def setup_tracing(config: MetricsConfig) -> None:
+    """Enable OpenTelemetry spans if configured and the SDK API is installed."""
+    global _tracer
+    if not config.tracing:
+        _tracer = None
+        return
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.warning(
+            "opentelemetry-api is not installed; tracing is disabled. "
+            "Install with: pip install kipbot[otel]"
+        )
+        return
+    _tracer = trace.get_tracer("kipbot")
+
+
+def span(name: str, **attributes):
+    """Start an OpenTelemetry span, or do nothing when tracing is off."""
+    if _tracer is None:
+        return nullcontext()
+    attributes.setdefault("kipbot.platform", current_platform.get())
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_metrics_server(config: MetricsConfig) -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a daemon thread, independent of the platform's event loop."""
+    server = ThreadingHTTPServer((config.host, config.port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="kipbot-metrics", daemon=True)
+    thread.start()
+    logger.info(f"Metrics available at http://{config.host}:{config.port}/metrics")
+    return server
@@ -0,0 +1,205 @@
+"""Conversation sessions and the bounded in-memory session cache."""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from kipbot.core.config import SessionConfig
+from kipbot.core.session_store import create_session_store
+
+
+@dataclass(slots=True)
+class Message:
+    role: str  # "user", "assistant", "system", "tool"
+    content: str
+    tool_calls: list | None = None
+    tool_call_id: str | None = None
+    name: str | None = None
+    tokens: int | None = None  # cached prompt token count
+
+
+@dataclass(slots=True)
+class AgentContext:
+    user_id: str
+    platform: str
+    history: list[Message] = field(default_factory=list)
+    priority: int = 0  # LLM queue priority, see kipbot.llm.ratelimit.Priority
+    summary: str = ""  # rolling summary of turns folded out of history
+    summary_tokens: int = 0
+    version: int = 0  # of the state last saved to or loaded from the shared store
+    summarizing: asyncio.Task | None = field(default=None, repr=False, compare=False)
+
+
+# Rough per-message overhead of the Message object and its list slot
+MESSAGE_OVERHEAD = 120
+
+
+def estimate_size(context: AgentContext) -> int:
+    """Estimate the memory held by a session's history in bytes."""
+    size = len(context.summary)
+    for msg in context.history:
+        size += MESSAGE_OVERHEAD + len(msg.content)
+        if msg.tool_calls:
+            size += len(json.dumps(msg.tool_calls))
+    return size
+
+
+def dump_state(context: AgentContext) -> dict:
+    """Serialize the part of a session that a shared store keeps."""
+    history = []
+    for msg in context.history:
+        entry: dict = {"role": msg.role, "content": msg.content}
+        if msg.tool_calls:
+            entry["tool_calls"] = msg.tool_calls
+        if msg.tool_call_id:
+            entry["tool_call_id"] = msg.tool_call_id
+        if msg.name:
+            entry["name"] = msg.name
+        history.append(entry)
+    return {
+        "history": history,
+        "summary": context.summary,
+        "summary_tokens": context.summary_tokens,
+        "version": context.version,
+    }
+
+
+def load_state(context: AgentContext, state: dict) -> None:
+    """Restore a session from :func:`dump_state` output."""
+    context.history = [Message(**entry) for entry in state.get("history", [])]
+    context.summary = state.get("summary", "")
+    context.summary_tokens = state.get("summary_tokens", 0)
+    context.version = state.get("version", 0)
+
+
+class SessionManager:
+    """LRU cache of :class:`AgentContext` objects shared by all platforms.
+
+    Sessions are dropped when idle for ``idle_ttl`` seconds, or least recently
+    used first once ``max_sessions`` or ``max_bytes`` is exceeded. A dropped
+    session starts empty on its next message, and the agent rehydrates it from
+    the memory store.
+    """
+
+    def __init__(self, config: SessionConfig) -> None:
+        self.config = config
+        self._sessions: OrderedDict[tuple[str, str], AgentContext] = OrderedDict()
+        self._last_used: dict[tuple[str, str], float] = {}
+        self._sizes: dict[tuple[str, str], int] = {}
+        self._total_bytes = 0
+        self.store = create_session_store(config)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def total_bytes(self) -> int:
+        """Estimated size of all cached sessions."""
+        return self._total_bytes
+
+    def count(self, platform: str) -> int:
+        """Number of cached sessions for a platform."""
+        return sum(1 for key in self._sessions if key[0] == platform)
+
+    def counts(self) -> dict[str, int]:
+        """Number of cached sessions per platform."""
+        counts: dict[str, int] = {}
+        # Copy the keys: the metrics endpoint reads this from another thread
+        for platform, _ in list(self._sessions):
+            counts[platform] = counts.get(platform, 0) + 1
+        return counts
+
+    def get(self, user_id: str, platform: str) -> AgentContext:
+        """Return the session for a user, creating it if needed."""
+        now = time.monotonic()
+        self._evict_idle(now)
+
+        key = (platform, user_id)
+        context = self._sessions.get(key)
+        if context is None:
+            context = AgentContext(user_id=user_id, platform=platform)
+            self._sessions[key] = context
+            self._sizes[key] = 0
+        else:
+            self._sessions.move_to_end(key)
+        self._last_used[key] = now
+        self._enforce_limits()
+        return context
+
+    def update(self, context: AgentContext) -> None:
+        """Re-measure a session after its history changed."""
+        key = (context.platform, context.user_id)
+        if self._sessions.get(key) is not context:
+            return
+        size = estimate_size(context)
+        self._total_bytes += size - self._sizes[key]
+        self._sizes[key] = size
+        self._enforce_limits()
+
+    async def restore(self, context: AgentContext) -> bool:
+        """Replace a session with a newer one from the shared store, if there is one.
+
+        Another worker may have served the user since this one last did, so a
+        cached session is only current while its version matches the store's.
+        Returns whether the session was replaced.
+        """
+        if self.store is None:
+            return False
+        try:
+            state = await self.store.load(context.platform, context.user_id, context.version)
+        except Exception as e:
+            logger.error(f"Failed to restore session {context.platform}:{context.user_id}: {e}")
+            return False
+        if not state:
+            return False
+        load_state(context, state)
+        self.update(context)
+        return True
+
+    async def persist(self, context: AgentContext) -> None:
+        """Write a session to the shared store so another worker can take it over."""
+        if self.store is None:
+            return
+        context.version += 1
+        try:
+            await self.store.save(context.platform, context.user_id, dump_state(context))
+        except Exception as e:
+            logger.error(f"Failed to persist session {context.platform}:{context.user_id}: {e}")
+
+    async def close(self) -> None:
+        """Close the shared session store."""
+        if self.store is not None:
+            await self.store.close()
+
+    def discard(self, user_id: str, platform: str) -> None:
+        """Drop a session from the cache."""
+        self._remove((platform, user_id))
+
+    def _evict_idle(self, now: float) -> None:
+        deadline = now - self.config.idle_ttl
+        # Sessions are kept in LRU order, so idle ones are at the front
+        while self._sessions:
+            key = next(iter(self._sessions))
+            if self._last_used[key] > deadline:
+                break
+            self._remove(key)
+
+    def _enforce_limits(self) -> None:
+        # Never evict the most recently used session, which the caller is holding
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.config.max_sessions
+            or self._total_bytes > self.config.max_bytes
+        ):
+            key = next(iter(self._sessions))
+            logger.debug(f"Evicting session {key[0]}:{key[1]}")
+            self._remove(key)
+
+    def _remove(self, key: tuple[str, str]) -> None:
+        if self._sessions.pop(key, None) is None:
+            return
+        del self._last_used[key]
+        self._total_bytes -= self._sizes.pop(key)
@@ -0,0 +1,127 @@
+"""Shared session stores that let several workers serve the same users."""
+
+import asyncio
+import json
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from kipbot.core.config import SessionConfig
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    platform TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (platform, user_id)
+);
+"""
+
+SELECT_STATE = (
+    "SELECT state FROM sessions WHERE platform = ? AND user_id = ? AND version > ?"
+)
+UPSERT_STATE = (
+    "INSERT INTO sessions (platform, user_id, state, version, updated_at) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (platform, user_id) DO UPDATE SET "
+    "state = excluded.state, version = excluded.version, updated_at = excluded.updated_at"
+)
+DELETE_STATE = "DELETE FROM sessions WHERE platform = ? AND user_id = ?"
+
+
+class SessionStore(ABC):
+    """Base class for shared session stores.
+
+    A store keeps the serialized state of each session (see
+    :meth:`SessionManager.persist`) so that whichever worker owns a user next
+    can pick the conversation up where it stopped. Every saved state carries a
+    ``version`` that grows with each save, which tells a worker whether its
+    cached copy is still current. Implementations for Redis or a database
+    service only need these methods.
+    """
+
+    @abstractmethod
+    async def load(self, platform: str, user_id: str, newer_than: int = 0) -> dict | None:
+        """Return the stored state if its version is above ``newer_than``."""
+        ...
+
+    @abstractmethod
+    async def save(self, platform: str, user_id: str, state: dict) -> None:
+        """Store a state, replacing the previous one."""
+        ...
+
+    @abstractmethod
+    async def delete(self, platform: str, user_id: str) -> None:
+        """Forget a session."""
+        ...
+
+    async def close(self) -> None:
+        """Release connections. Called on agent shutdown."""
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in one SQLite file, for local multi-process setups and tests.
+
+    Workers on the same host share the file through WAL mode. Each worker runs
+    its queries on one dedicated thread, like the SQLite memory store.
+    """
+
+    def __init__(self, config: SessionConfig) -> None:
+        self.db_path = Path(config.store_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kipbot-sessions")
+
+    async def load(self, platform: str, user_id: str, newer_than: int = 0) -> dict | None:
+        row = await self._run(self._execute, SELECT_STATE, (platform, user_id, newer_than))
+        return json.loads(row[0]) if row else None
+
+    async def save(self, platform: str, user_id: str, state: dict) -> None:
+        data = json.dumps(state, ensure_ascii=False)
+        params = (platform, user_id, data, state["version"], time.time())
+        await self._run(self._execute, UPSERT_STATE, params)
+
+    async def delete(self, platform: str, user_id: str) -> None:
+        await self._run(self._execute, DELETE_STATE, (platform, user_id))
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Other workers may hold the write lock for a moment
+            conn = sqlite3.connect(self.db_path, timeout=10.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple) -> tuple | None:
+        conn = self._connect()
+        with conn:
+            return conn.execute(sql, params).fetchone()
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def create_session_store(config: SessionConfig) -> SessionStore | None:
+    """Create the shared session store selected in the config, if any."""
+    if config.store == "sqlite":
+        return SQLiteSessionStore(config)
+    if config.store != "memory":
+        raise ValueError(f"Unknown session store: {config.store}")
+    return None
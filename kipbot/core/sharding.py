@@ -0,0 +1,68 @@
+"""Consistent hashing of users onto workers."""
+
+import bisect
+import hashlib
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    Each node is placed on the ring ``vnodes`` times, so adding or removing a
+    node only moves about ``1/len(nodes)`` of the keys.
+    """
+
+    def __init__(self, nodes: list[str] | None = None, vnodes: int = 160) -> None:
+        self.vnodes = vnodes
+        self._hashes: list[int] = []
+        self._owners: list[str] = []
+        self.nodes: list[str] = []
+        for node in nodes or []:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def add(self, node: str) -> None:
+        """Place a node on the ring."""
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.vnodes):
+            h = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._hashes, h)
+            self._hashes.insert(index, h)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        """Take a node off the ring."""
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(h, owner) for h, owner in zip(self._hashes, self._owners) if owner != node]
+        self._hashes = [h for h, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> str:
+        """Return the node that owns ``key``."""
+        if not self._hashes:
+            raise LookupError("hash ring is empty")
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+    def preference(self, key: str) -> list[str]:
+        """Return all nodes in the order they would take over ``key``."""
+        if not self._hashes:
+            return []
+        start = bisect.bisect(self._hashes, _hash(key))
+        found: list[str] = []
+        for i in range(len(self._hashes)):
+            owner = self._owners[(start + i) % len(self._hashes)]
+            if owner not in found:
+                found.append(owner)
+                if len(found) == len(self.nodes):
+                    break
+        return found
@@ -0,0 +1,56 @@
+"""Token-budgeted selection of conversation history."""
+
+from collections.abc import Callable
+
+from kipbot.core.session import Message
+
+
+def group_units(history: list[Message]) -> list[tuple[int, int]]:
+    """Split history into ``(start, end)`` index ranges that must stay together.
+
+    An assistant message with ``tool_calls`` and the tool results that follow it
+    form one unit; every other message is a unit on its own.
+    """
+    units = []
+    i = 0
+    while i < len(history):
+        end = i + 1
+        if history[i].tool_calls:
+            while end < len(history) and history[end].role == "tool":
+                end += 1
+        units.append((i, end))
+        i = end
+    return units
+
+
+def window_start(
+    history: list[Message],
+    budget: int,
+    count: Callable[[Message], int],
+) -> int:
+    """Return the index of the oldest message that fits in ``budget`` tokens.
+
+    Whole units are taken from the end of the history until the next one would
+    exceed the budget. The newest unit is always included, even if it alone is
+    over budget, and a tool result is never separated from its tool call.
+    """
+    units = group_units(history)
+    if not units:
+        return 0
+
+    used = 0
+    start = len(history)
+    for unit_start, unit_end in reversed(units):
+        cost = sum(count(msg) for msg in history[unit_start:unit_end])
+        if used + cost > budget and start < len(history):
+            break
+        used += cost
+        start = unit_start
+    # Prefer to open on a user message, since some providers reject a leading
+    # assistant turn. Otherwise at least drop tool results whose call was cut.
+    for i in range(start, len(history)):
+        if history[i].role == "user":
+            return i
+    while start < len(history) and history[start].role == "tool":
+        start += 1
+    return start
@@ -0,0 +1,189 @@
+"""Local completion cache for kipbot."""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from kipbot.core.config import CompletionCacheConfig
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    expires REAL NOT NULL,
+    latency REAL NOT NULL,
+    response TEXT NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_completions_accessed ON completions (accessed);
+"""
+
+SELECT_ENTRY = "SELECT expires, latency, response FROM completions WHERE key = ?"
+TOUCH_ENTRY = "UPDATE completions SET accessed = ? WHERE key = ?"
+UPSERT_ENTRY = (
+    "INSERT OR REPLACE INTO completions (key, expires, latency, response, accessed) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+DELETE_EXPIRED = "DELETE FROM completions WHERE expires <= ?"
+DELETE_OLDEST = (
+    "DELETE FROM completions WHERE key IN "
+    "(SELECT key FROM completions ORDER BY accessed LIMIT ?)"
+)
+COUNT_ENTRIES = "SELECT COUNT(*) FROM completions"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(value):
+    """Normalize message content so trivially different inputs share a key."""
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", value)).strip()
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if k != "cache_control"}
+    return value
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    saved_seconds: float = 0.0  # LLM latency avoided by serving hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class CompletionCache:
+    """Two-level (memory LRU + SQLite) cache of LLM responses.
+
+    Entries expire after ``ttl`` seconds. The memory level holds the
+    ``max_entries`` most recently used entries; the disk level is pruned to
+    ``max_disk_entries`` by last access. Disk access runs on a dedicated thread.
+    """
+
+    def __init__(self, config: CompletionCacheConfig) -> None:
+        self.config = config
+        self.path = Path(config.path)
+        self.stats = CacheStats()
+        self._memory: OrderedDict[str, tuple[float, float, dict]] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kipbot-cache")
+        self._writes = 0
+
+    def applies_to(self, temperature: float) -> bool:
+        """Whether responses at this temperature may be served from the cache."""
+        if self.config.mode == "always":
+            return True
+        return self.config.mode == "auto" and temperature <= self.config.max_temperature
+
+    def key(self, params: dict, messages: list[dict], tools: list[dict] | None) -> str:
+        """Hash the model parameters, normalized messages and tool schemas."""
+        payload = json.dumps(
+            {"params": params, "messages": _normalize(messages), "tools": _normalize(tools)},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> dict | None:
+        """Return a cached response payload, or None on a miss."""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._memory[key]
+            entry = None
+        if entry is None and self.config.disk:
+            try:
+                entry = await self._run(self._select, key, now)
+            except Exception as e:
+                logger.warning(f"Completion cache read failed: {e}")
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self._memory.move_to_end(key)
+        self.stats.hits += 1
+        self.stats.saved_seconds += entry[1]
+        logger.debug(
+            f"Completion cache hit (rate {self.stats.hit_rate:.1%}, "
+            f"saved {self.stats.saved_seconds:.1f}s so far)"
+        )
+        return entry[2]
+
+    async def put(self, key: str, response: dict, latency: float) -> None:
+        """Store a response payload along with the latency it took to produce."""
+        entry = (time.time() + self.config.ttl, latency, response)
+        self._remember(key, entry)
+        if self.config.disk:
+            try:
+                await self._run(self._upsert, key, entry)
+            except Exception as e:
+                logger.warning(f"Completion cache write failed: {e}")
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    def _remember(self, key: str, entry: tuple[float, float, dict]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path / "completions.db")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _select(self, key: str, now: float) -> tuple[float, float, dict] | None:
+        conn = self._connect()
+        row = conn.execute(SELECT_ENTRY, (key,)).fetchone()
+        if row is None or row[0] <= now:
+            return None
+        with conn:
+            conn.execute(TOUCH_ENTRY, (now, key))
+        return row[0], row[1], json.loads(row[2])
+
+    def _upsert(self, key: str, entry: tuple[float, float, dict]) -> None:
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute(UPSERT_ENTRY, (key, entry[0], entry[1], json.dumps(entry[2]), now))
+        # Pruning scans the table, so only do it every few hundred writes
+        self._writes += 1
+        if self._writes % 256 == 0:
+            with conn:
+                conn.execute(DELETE_EXPIRED, (now,))
+                (count,) = conn.execute(COUNT_ENTRIES).fetchone()
+                if count > self.config.max_disk_entries:
+                    conn.execute(DELETE_OLDEST, (count - self.config.max_disk_entries,))
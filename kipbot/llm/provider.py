@@ -1,43 +1,299 @@
 """LLM provider abstraction using LiteLLM."""
 
-from litellm import acompletion
+import asyncio
+import importlib
+import json
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
 from loguru import logger
 
-from kipbot.core.config import LLMConfig
+from kipbot.core.config import LLMBackendConfig, LLMConfig
+from kipbot.core.metrics import LLM_ERRORS, LLM_QUEUE_SECONDS, LLM_TOKENS, LLM_TTFT_SECONDS, span
+from kipbot.llm.cache import CompletionCache
+from kipbot.llm.ratelimit import AdmissionController, Priority
+from kipbot.llm.router import Router
+
+# Receives each text fragment as it is generated
+DeltaCallback = Callable[[str], Awaitable[None]]
+
+# Providers that only cache prompts at explicit ``cache_control`` breakpoints.
+# OpenAI, DeepSeek and Gemini cache shared prefixes automatically.
+CACHE_CONTROL_PROVIDERS = ("anthropic", "bedrock", "vertex_ai")
+EPHEMERAL = {"type": "ephemeral"}
+
+
+@dataclass
+class UsageStats:
+    """Running token totals reported by the provider."""
+
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # prompt tokens read from the provider's cache
+    cache_write_tokens: int = 0  # prompt tokens written to the provider's cache
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def record(self, usage) -> dict:
+        """Add one response's usage and return its counts."""
+        details = getattr(usage, "prompt_tokens_details", None)
+        counts = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "cached_tokens": (
+                getattr(usage, "cache_read_input_tokens", 0)
+                or getattr(details, "cached_tokens", 0)
+                or 0
+            ),
+            "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        }
+        self.requests += 1
+        self.prompt_tokens += counts["prompt_tokens"]
+        self.completion_tokens += counts["completion_tokens"]
+        self.cached_tokens += counts["cached_tokens"]
+        self.cache_write_tokens += counts["cache_write_tokens"]
+        return counts
+
+
+def _cached_block(content) -> list:
+    if isinstance(content, list):
+        blocks = [dict(block) for block in content]
+    else:
+        blocks = [{"type": "text", "text": content}]
+    blocks[-1]["cache_control"] = EPHEMERAL
+    return blocks
+
+
+class LLMBackend:
+    """One provider/model endpoint that completions can be sent to.
+
+    Subclasses can override :meth:`acompletion` to stand in for a real
+    provider, e.g. to inject latency or errors in tests.
+    """
+
+    def __init__(self, config: LLMBackendConfig, prompt_caching: bool = True) -> None:
+        self.config = config
+        self.prompt_caching = prompt_caching
+
+    @property
+    def name(self) -> str:
+        return self.model_string()
+
+    def model_string(self) -> str:
+        """Build the LiteLLM model string (e.g., 'anthropic/claude-3-opus')."""
+        provider = self.config.provider
+        model = self.config.model
+        if provider == "openai":
+            return model
+        return f"{provider}/{model}"
+
+    async def acompletion(self, **kwargs) -> object:
+        # litellm takes seconds to import, so it is loaded on first use
+        from litellm import acompletion
+
+        return await acompletion(**kwargs)
+
+    async def complete(self, request: dict, on_delta: DeltaCallback | None = None) -> object:
+        """Send a request (messages, tools and sampling parameters) to this backend."""
+        messages, tools = request["messages"], request.get("tools")
+        if self._uses_cache_control():
+            messages, tools = self._add_cache_breakpoints(messages, tools)
+        kwargs = {
+            **request,
+            "model": self.model_string(),
+            "messages": messages,
+            "api_key": self.config.api_key or None,
+            "api_base": self.config.base_url,
+        }
+        if tools:
+            kwargs["tools"] = tools
+        if on_delta is None:
+            return await self.acompletion(**kwargs)
+        return await self._stream(kwargs, on_delta)
+
+    async def _stream(self, kwargs: dict, on_delta: DeltaCallback) -> object:
+        from litellm import stream_chunk_builder
+
+        start = time.perf_counter()
+        first_token_at = None
+        chunks = []
+        stream = await self.acompletion(
+            stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        async for chunk in stream:
+            chunks.append(chunk)
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    LLM_TTFT_SECONDS.observe(first_token_at - start, backend=self.name)
+                    logger.debug(f"{self.name} first token after {first_token_at - start:.3f}s")
+                await on_delta(text)
+        return stream_chunk_builder(chunks, messages=kwargs["messages"])
+
+    def _uses_cache_control(self) -> bool:
+        if not self.prompt_caching:
+            return False
+        provider = self.config.provider
+        return provider == "anthropic" or (
+            provider in CACHE_CONTROL_PROVIDERS and "claude" in self.config.model
+        )
+
+    def _add_cache_breakpoints(
+        self,
+        messages: list[dict],
+        tools: list[dict] | None,
+    ) -> tuple[list[dict], list[dict] | None]:
+        """Mark the stable prompt prefix as cacheable.
+
+        Breakpoints go on the last tool, the system prompt and the last two user
+        messages: everything up to the newest user message is resent unchanged
+        on every tool round, and the previous one covers the earlier turns.
+        Anthropic allows four breakpoints per request. Inputs are not modified.
+        """
+        if tools:
+            tools = [*tools[:-1], {**tools[-1], "cache_control": EPHEMERAL}]
+
+        messages = list(messages)
+        marked = 0
+        for i in range(len(messages) - 1, -1, -1):
+            msg = messages[i]
+            if msg["role"] == "system" or (msg["role"] == "user" and marked < 2 and msg["content"]):
+                messages[i] = {**msg, "content": _cached_block(msg["content"])}
+                if msg["role"] == "user":
+                    marked += 1
+        return messages, tools
 
 
 class LLMProvider:
-    """Multi-provider LLM abstraction powered by LiteLLM."""
+    """Multi-provider LLM abstraction powered by LiteLLM.
+
+    Requests go to the backends in ``config.backends`` (or the single
+    provider/model at the top level of the config) through a :class:`Router`
+    that hedges slow requests and trips failing backends out.
+    """
 
-    def __init__(self, config: LLMConfig) -> None:
+    def __init__(self, config: LLMConfig, backends: list[LLMBackend] | None = None) -> None:
         self.config = config
+        self.usage = UsageStats()
+        self.cache = CompletionCache(config.cache) if config.cache.mode != "off" else None
+        if backends is None:
+            backend_configs = config.backends or [LLMBackendConfig(
+                provider=config.provider,
+                model=config.model,
+                api_key=config.api_key,
+                base_url=config.base_url,
+            )]
+            backends = [LLMBackend(b, config.prompt_caching) for b in backend_configs]
+        self.router = Router(backends, config.routing)
+        self.admission = AdmissionController(config.rate_limit)
+
+    async def close(self) -> None:
+        """Release resources held by the provider."""
+        if self.cache is not None:
+            await self.cache.close()
 
     async def complete(
         self,
         messages: list[dict],
         tools: list[dict] | None = None,
+        on_delta: DeltaCallback | None = None,
+        max_tokens: int | None = None,
+        priority: int = Priority.INTERACTIVE,
+        key: str = "",
     ) -> object:
-        """Send messages to the LLM and return the raw response."""
-        try:
-            kwargs = {
+        """Send messages to the LLM and return the raw response.
+
+        With ``on_delta`` the completion is streamed: text fragments are passed to
+        the callback as they arrive, and the chunks (including partial tool calls)
+        are assembled into a regular response at the end. When the completion
+        cache applies, identical requests are answered from it instead.
+
+        Under a configured rate limit, requests wait for admission by
+        ``priority``, with ``key`` (usually the user) used to share the queue fairly.
+        """
+        max_tokens = max_tokens or self.config.max_tokens
+        cache_key = None
+        if self.cache is not None and self.cache.applies_to(self.config.temperature):
+            params = {
                 "model": self._get_model_string(),
-                "messages": messages,
                 "temperature": self.config.temperature,
-                "max_tokens": self.config.max_tokens,
-                "api_key": self.config.api_key or None,
-                "api_base": self.config.base_url,
+                "max_tokens": max_tokens,
             }
-            if tools:
-                kwargs["tools"] = tools
-            return await acompletion(**kwargs)
+            cache_key = self.cache.key(params, messages, tools)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                from litellm import ModelResponse
+
+                response = ModelResponse(**cached)
+                if on_delta is not None and response.choices[0].message.content:
+                    await on_delta(response.choices[0].message.content)
+                return response
+
+        request = {
+            "messages": messages,
+            "temperature": self.config.temperature,
+            "max_tokens": max_tokens,
+        }
+        if tools:
+            request["tools"] = tools
+
+        # Reserve the prompt estimate plus the full output budget, then settle on real usage
+        estimate = len(json.dumps(request, ensure_ascii=False)) / 4 + max_tokens
+        waited = await self.admission.acquire(estimate, key=key, priority=priority)
+        if self.admission.enabled:
+            LLM_QUEUE_SECONDS.observe(waited)
+
+        start = time.perf_counter()
+        try:
+            with span("kipbot.llm", **{"kipbot.stream": on_delta is not None}):
+                response = await self.router.complete(request, on_delta)
         except Exception as e:
+            LLM_ERRORS.inc()
             logger.error(f"LLM completion failed: {e}")
             raise
 
+        if cache_key is not None:
+            await self.cache.put(cache_key, response.model_dump(), time.perf_counter() - start)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            counts = self.usage.record(usage)
+            for kind in ("prompt", "completion", "cached", "cache_write"):
+                LLM_TOKENS.inc(counts[f"{kind}_tokens"], type=kind)
+            self.admission.settle(
+                estimate, counts["prompt_tokens"] + counts["completion_tokens"]
+            )
+            logger.debug(
+                "LLM usage: prompt={prompt_tokens} cached={cached_tokens} "
+                "cache_write={cache_write_tokens} completion={completion_tokens}".format(**counts)
+            )
+        return response
+
+    async def warm_up(self) -> None:
+        """Import litellm and load the tokenizer on a thread.
+
+        Both otherwise happen on the first request, on the event loop, holding
+        up every other turn for seconds.
+        """
+        await asyncio.to_thread(importlib.import_module, "litellm")
+        try:
+            await asyncio.to_thread(self.count_tokens, [{"role": "user", "content": "warm up"}])
+        except Exception as e:
+            logger.warning(f"Failed to load the tokenizer: {e}")
+
+    def count_tokens(self, messages: list[dict], tools: list[dict] | None = None) -> int:
+        """Count prompt tokens with the primary model's tokenizer."""
+        from litellm import token_counter
+
+        return token_counter(model=self._get_model_string(), messages=messages, tools=tools)
+
     def _get_model_string(self) -> str:
-        """Build the LiteLLM model string (e.g., 'anthropic/claude-3-opus')."""
-        provider = self.config.provider
-        model = self.config.model
-        if provider == "openai":
-            return model
-        return f"{provider}/{model}"
+        """LiteLLM model string of the primary backend."""
+        return self.router.backends[0].model_string()
@@ -0,0 +1,186 @@
+"""Client-side admission control for LLM requests."""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+from kipbot.core.config import RateLimitConfig
+
+
+class Priority(IntEnum):
+    """Lower values are admitted first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 5  # e.g. history summaries
+    BATCH = 10
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute`` tokens per minute."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until ``cost`` tokens are available (0 if they are now)."""
+        self._refill()
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+    def consume(self, cost: float) -> None:
+        self._refill()
+        self.tokens -= cost
+
+    def refund(self, amount: float) -> None:
+        """Return (or, if negative, charge) tokens after the real cost is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass
+class QueueStats:
+    admitted: int = 0
+    rejected: int = 0
+    total_wait: float = 0.0
+    recent_waits: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    round: int
+    seq: int
+    cost: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionController:
+    """Admit LLM requests under requests-per-minute and tokens-per-minute budgets.
+
+    Requests that don't fit wait in a queue ordered by priority, then by a
+    per-key round number: a key with many queued requests gets consecutive
+    rounds, so other keys' requests interleave with it instead of waiting
+    behind all of them.
+    """
+
+    def __init__(self, config: RateLimitConfig) -> None:
+        self.config = config
+        rpm, tpm = config.requests_per_minute, config.tokens_per_minute
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.stats = QueueStats()
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._round = 0
+        self._next_round: dict[str, int] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    @property
+    def queue_length(self) -> int:
+        return sum(1 for w in self._queue if not w.future.done())
+
+    async def acquire(
+        self,
+        cost: float,
+        key: str = "",
+        priority: int = Priority.INTERACTIVE,
+    ) -> float:
+        """Wait until a request of ``cost`` tokens may be sent; return the seconds waited."""
+        if not self.enabled:
+            return 0.0
+        if self.tokens is not None:
+            # A request larger than the whole bucket would otherwise never fit
+            cost = min(cost, self.tokens.capacity)
+
+        if not self._queue and self._fits(cost) == 0.0:
+            self._admit(cost)
+            return 0.0
+
+        if self.queue_length >= self.config.max_queue:
+            self.stats.rejected += 1
+            raise RuntimeError("LLM request queue is full")
+
+        start = time.monotonic()
+        round_ = max(self._round, self._next_round.get(key, 0))
+        self._next_round[key] = round_ + 1
+        if len(self._next_round) > 10_000:
+            # Keys at or behind the current round carry no information
+            self._next_round = {k: r for k, r in self._next_round.items() if r > self._round}
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(priority, round_, next(self._seq), cost, future)
+        heapq.heappush(self._queue, waiter)
+        self._ensure_running()
+        self._wakeup.set()
+        await waiter.future
+        waited = time.monotonic() - start
+        self.stats.total_wait += waited
+        self.stats.recent_waits.append(waited)
+        return waited
+
+    def settle(self, estimated: float, actual: float) -> None:
+        """Correct the token bucket once the real token usage is known."""
+        if self.tokens is not None and actual:
+            self.tokens.refund(estimated - actual)
+
+    def _fits(self, cost: float) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(cost))
+        return wait
+
+    def _admit(self, cost: float) -> None:
+        if self.requests is not None:
+            self.requests.consume(1)
+        if self.tokens is not None:
+            self.tokens.consume(cost)
+        self.stats.admitted += 1
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run(), name="kipbot-llm-admission")
+
+    async def _run(self) -> None:
+        while True:
+            # Drop waiters whose callers gave up
+            while self._queue and self._queue[0].future.done():
+                heapq.heappop(self._queue)
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            head = self._queue[0]
+            wait = self._fits(head.cost)
+            if wait > 0:
+                # Wake early if a higher-priority request arrives meanwhile
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._queue)
+            self._round = head.round
+            self._admit(head.cost)
+            head.future.set_result(None)
@@ -0,0 +1,237 @@
+"""Routing across LLM backends with hedged requests and circuit breakers."""
+
+import asyncio
+import math
+import time
+from collections import deque
+
+from loguru import logger
+
+from kipbot.core.config import RoutingConfig
+from kipbot.core.metrics import LLM_SECONDS
+
+
+class BackendStats:
+    """Rolling latency, time to first streamed chunk and error rate of one backend."""
+
+    def __init__(self, window: int) -> None:
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.first_chunks: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def record(self, latency: float | None, ok: bool) -> None:
+        if latency is not None:
+            self.latencies.append(latency)
+        self.outcomes.append(ok)
+
+    def percentile(self, q: float, streaming: bool = False) -> float | None:
+        """Latency percentile, or time-to-first-chunk percentile if ``streaming``."""
+        samples = self.first_chunks if streaming else self.latencies
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open probe after a cooldown."""
+
+    def __init__(self, threshold: int, cooldown: float) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def available(self) -> bool:
+        """Whether a request may be sent now, without changing state."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return False  # half-open: a probe is already in flight
+
+    def begin(self) -> None:
+        if self.state == "open":
+            self.state = "half_open"
+
+    def abort(self) -> None:
+        """A request ended without an outcome (e.g. it was cancelled)."""
+        if self.state == "half_open":
+            self.state = "open"
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self) -> bool:
+        """Count a failure and return True if the breaker just opened."""
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            tripped = self.state != "open"
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            return tripped
+        return False
+
+
+class Router:
+    """Send each request to the first healthy backend, hedging when it is slow.
+
+    If the primary hasn't answered within its recent ``hedge_percentile``
+    latency, the same request goes to the next backend as well; whichever
+    succeeds first wins and the other is cancelled. Streamed requests hedge
+    on the time to the first chunk instead, and commit to the backend that
+    emits first, since output already shown can't be taken back. Failures
+    fall through to the next backend, and backends that keep failing are
+    skipped until their circuit breaker's cooldown has passed.
+    """
+
+    def __init__(self, backends: list, config: RoutingConfig) -> None:
+        if not backends:
+            raise ValueError("At least one LLM backend is required")
+        self.backends = backends
+        self.config = config
+        self.stats = [BackendStats(config.window) for _ in backends]
+        self.breakers = [
+            CircuitBreaker(config.failure_threshold, config.cooldown) for _ in backends
+        ]
+
+    async def complete(self, request: dict, on_delta=None) -> object:
+        # With every breaker open, still try them in order rather than fail outright
+        order = [i for i, b in enumerate(self.breakers) if b.available()]
+        order = order or list(range(len(self.backends)))
+        if not self.config.hedge or len(order) == 1:
+            return await self._failover(order, request, on_delta)
+        return await self._hedged(order, request, on_delta)
+
+    def hedge_delay(self, index: int, streaming: bool = False) -> float:
+        """Seconds to wait on a backend before hedging to the next one.
+
+        For a streamed request this is the wait for its first chunk.
+        """
+        stats = self.stats[index]
+        samples = stats.first_chunks if streaming else stats.latencies
+        if len(samples) < self.config.min_samples:
+            return self.config.hedge_min_delay
+        return max(
+            stats.percentile(self.config.hedge_percentile, streaming),
+            self.config.hedge_min_delay,
+        )
+
+    async def _failover(self, order: list[int], request: dict, on_delta) -> object:
+        # Streamed output can't be taken back, so only fail over before the first delta
+        emitted = False
+
+        async def forward(delta: str) -> None:
+            nonlocal emitted
+            emitted = True
+            await on_delta(delta)
+
+        last_error: Exception | None = None
+        for i in order:
+            try:
+                return await self._call(i, request, forward if on_delta else None)
+            except Exception as e:
+                if emitted:
+                    raise
+                last_error = e
+        raise last_error
+
+    async def _hedged(self, order: list[int], request: dict, on_delta=None) -> object:
+        remaining = list(order)
+        running: dict[asyncio.Task, int] = {}
+        committed: int | None = None  # the backend whose deltas reach the caller
+        last_error: Exception | None = None
+
+        def forward_from(i: int):
+            async def forward(delta: str) -> None:
+                nonlocal committed
+                if committed is None:
+                    committed = i
+                    for task, j in running.items():
+                        if j != i:
+                            task.cancel()
+                if committed == i:
+                    await on_delta(delta)
+
+            return forward
+
+        def launch() -> None:
+            i = remaining.pop(0)
+            call = self._call(i, request, forward_from(i) if on_delta else None)
+            running[asyncio.create_task(call)] = i
+
+        launch()
+        try:
+            while running:
+                timeout = None
+                if remaining and len(running) == 1 and committed is None:
+                    index = next(iter(running.values()))
+                    timeout = self.hedge_delay(index, streaming=on_delta is not None)
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if committed is not None:
+                        continue  # the first chunk came in while waiting
+                    logger.info(f"LLM request slow after {timeout:.2f}s, hedging to next backend")
+                    launch()
+                    continue
+                for task in done:
+                    i = running.pop(task)
+                    if task.cancelled():
+                        continue  # lost the race to stream first
+                    if task.exception() is None:
+                        return task.result()
+                    if i == committed:
+                        raise task.exception()
+                    last_error = task.exception()
+                if not running and remaining and committed is None:
+                    launch()
+            raise last_error
+        finally:
+            # Cancel the loser of a hedge, or everything if the caller gave up
+            for task in running:
+                task.cancel()
+
+    async def _call(self, index: int, request: dict, on_delta=None) -> object:
+        backend = self.backends[index]
+        breaker = self.breakers[index]
+        breaker.begin()
+        start = time.perf_counter()
+        forward = on_delta
+        if on_delta is not None:
+            first_chunk = True
+
+            async def forward(delta: str) -> None:
+                nonlocal first_chunk
+                if first_chunk:
+                    first_chunk = False
+                    self.stats[index].first_chunks.append(time.perf_counter() - start)
+                await on_delta(delta)
+
+        try:
+            response = await backend.complete(request, forward)
+        except asyncio.CancelledError:
+            # A cancelled request was at least this slow, which still informs the p95
+            self.stats[index].record(time.perf_counter() - start, True)
+            breaker.abort()
+            raise
+        except Exception as e:
+            self.stats[index].record(None, False)
+            if breaker.record_failure():
+                logger.warning(f"LLM backend {backend.name} tripped after repeated failures")
+            logger.warning(f"LLM backend {backend.name} failed: {e}")
+            raise
+        elapsed = time.perf_counter() - start
+        self.stats[index].record(elapsed, True)
+        LLM_SECONDS.observe(elapsed, backend=backend.name)
+        breaker.record_success()
+        return response
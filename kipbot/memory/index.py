@@ -0,0 +1,211 @@
+"""Per-user BM25 retrieval over memory turns."""
+
+import asyncio
+import heapq
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from collections.abc import Awaitable, Callable
+
+from loguru import logger
+
+from kipbot.core.config import RetrievalConfig
+
+WORD_RE = re.compile(r"\w+")
+K1 = 1.2
+B = 0.75
+# In large histories, terms found in more than this share of turns carry almost
+# no signal but have the longest posting lists, so queries skip them
+MAX_DF_RATIO = 0.5
+MIN_DOCS_FOR_PRUNING = 1000
+# Posting lists up to this length are scanned; longer ones only score candidates
+SCAN_LIMIT = 1024
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase words, plus character bigrams of longer non-ASCII words.
+
+    Bigrams let Korean words match across particles and endings ("날씨가" and
+    "날씨는" share "날씨") without a morphological analyzer.
+    """
+    tokens = WORD_RE.findall(text.lower())
+    if text.isascii():
+        return tokens
+    for word in tokens[:]:
+        if len(word) > 2 and not word.isascii():
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+class UserIndex:
+    """Inverted index over one user's turns, scored with BM25.
+
+    Each turn is identified by a store-specific ``ref`` (a file offset or a
+    row id) that grows with every write, so turns are added in write order
+    and a turn seen twice is ignored. Postings are kept in compact arrays,
+    about 6 bytes per distinct term of a turn.
+    """
+
+    def __init__(self) -> None:
+        self.refs = array("q")
+        self.lengths = array("I")
+        self.total_length = 0
+        self.postings: dict[str, tuple[array, array]] = {}  # term -> (docs, term counts)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    @property
+    def last_ref(self) -> int:
+        return self.refs[-1] if self.refs else -1
+
+    def add(self, ref: int, entry: dict) -> None:
+        """Index a turn stored at ``ref``."""
+        counts = Counter(tokenize(f"{entry['user']}\n{entry['assistant']}"))
+        with self._lock:
+            if ref <= self.last_ref:
+                return
+            doc = len(self.refs)
+            length = sum(counts.values())
+            self.refs.append(ref)
+            self.lengths.append(length)
+            self.total_length += length
+            for term, count in counts.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array("I"), array("H"))
+                posting[0].append(doc)
+                posting[1].append(min(count, 0xFFFF))
+
+    def search(self, query: str, limit: int) -> list[int]:
+        """Refs of the ``limit`` turns that best match ``query``, best first.
+
+        Terms are evaluated rarest first. Rare terms are scanned in full and
+        yield the candidate turns; common terms, whose posting lists are
+        long, only add to the scores of those candidates through a binary
+        search. While there are fewer candidates than ``limit``, the latest
+        ``SCAN_LIMIT`` turns holding a common term are scanned as well. This
+        keeps a query to a few milliseconds however long the history is.
+        """
+        with self._lock:
+            total = len(self.refs)
+            if not total or limit <= 0:
+                return []
+            postings = [
+                self.postings[term] for term in set(tokenize(query)) if term in self.postings
+            ]
+            postings.sort(key=lambda posting: len(posting[0]))
+            lengths = self.lengths
+            # BM25 length normalization split into a constant and a per-turn part
+            base = K1 * (1 - B)
+            scale = K1 * B * total / self.total_length if self.total_length else 0.0
+            scores: dict[int, float] = {}
+            get = scores.get
+            for docs, counts in postings:
+                df = len(docs)
+                if total >= MIN_DOCS_FOR_PRUNING and df > total * MAX_DF_RATIO:
+                    break
+                weight = math.log(1 + (total - df + 0.5) / (df + 0.5)) * (K1 + 1)
+                if df <= SCAN_LIMIT or len(scores) < limit:
+                    # Scan the postings, most recent ones only if the list is long
+                    for doc, count in zip(docs[-SCAN_LIMIT:], counts[-SCAN_LIMIT:]):
+                        scores[doc] = get(doc, 0.0) + weight * count / (
+                            count + base + scale * lengths[doc]
+                        )
+                    continue
+                for doc in list(scores):
+                    i = bisect_left(docs, doc)
+                    if i < df and docs[i] == doc:
+                        count = counts[i]
+                        scores[doc] += weight * count / (count + base + scale * lengths[doc])
+            # Newer turns win ties
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+            return [self.refs[doc] for doc, _ in best]
+
+
+class MemoryIndex:
+    """The :class:`UserIndex` of each recently active user.
+
+    An index is built from the store on first use and kept current by the
+    store's writer through :meth:`add`. The least recently used ones are
+    dropped beyond ``max_users`` and rebuilt when needed again.
+    """
+
+    def __init__(self, config: RetrievalConfig) -> None:
+        self.config = config
+        self._indexes: OrderedDict[str, UserIndex] = OrderedDict()
+        self._building: dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()  # writers add from worker threads
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def get(self, user_id: str) -> UserIndex | None:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+            return index
+
+    def install(self, user_id: str, index: UserIndex) -> None:
+        """Make a freshly built index current.
+
+        Stores call this in step with their writes, after catching the index
+        up with turns written while it was being built.
+        """
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.config.max_users:
+                self._indexes.popitem(last=False)
+
+    def discard(self, user_id: str) -> None:
+        """Drop a user's index, e.g. after turns were written around :meth:`add`."""
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+    def add(self, user_id: str, ref: int, entry: dict) -> None:
+        """Index a turn that was just written, if the user's index is loaded."""
+        with self._lock:
+            index = self._indexes.get(user_id)
+        if index is not None:
+            index.add(ref, entry)
+
+    async def load(
+        self, user_id: str, build: Callable[[str], Awaitable[None]]
+    ) -> UserIndex | None:
+        """Return the user's index, building it with ``build`` first if needed.
+
+        Returns None when a cold build takes longer than ``build_timeout``;
+        the build carries on in the background for later calls.
+        """
+        index = self.get(user_id)
+        if index is not None:
+            return index
+        task = self._building.get(user_id)
+        if task is None:
+            task = asyncio.create_task(build(user_id), name=f"kipbot-index-{user_id}")
+            self._building[user_id] = task
+            task.add_done_callback(lambda t: self._built(user_id, t))
+        try:
+            await asyncio.wait_for(asyncio.shield(task), self.config.build_timeout)
+        except TimeoutError:
+            logger.info(f"Memory index for {user_id} is still building")
+            return None
+        return self.get(user_id)
+
+    async def close(self) -> None:
+        """Cancel builds still in progress."""
+        tasks = list(self._building.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _built(self, user_id: str, task: asyncio.Task) -> None:
+        self._building.pop(user_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to build memory index for {user_id}: {task.exception()}")
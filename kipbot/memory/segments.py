@@ -0,0 +1,292 @@
+"""Segmented, compressed turn logs for the local memory store.
+
+A user's turns live in ``{path}/{user_id}/`` as a series of segments, each
+named after the number of its first turn. Only the newest one, the active
+segment, is appended to; it is plain JSONL. Older segments are sealed by the
+compactor: their turns are compressed in blocks of about ``BLOCK_BYTES``,
+followed by a footer that lists the blocks, so reading a turn costs one
+small block rather than the whole segment::
+
+    block 0 | block 1 | ... | footer (JSON) | footer length (4 bytes) | MAGIC
+
+A turn's number is its line position in the user's log and never changes,
+which makes it a stable reference for the retrieval index.
+"""
+
+import gzip
+import json
+import os
+from bisect import bisect_right
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import accumulate
+from pathlib import Path
+
+MAGIC = b"KSG1"
+TRAILER_SIZE = 4 + len(MAGIC)
+BLOCK_BYTES = 64 * 1024  # uncompressed bytes of turns per block
+READ_BLOCK_SIZE = 64 * 1024
+NAME_DIGITS = 12
+ACTIVE = ".jsonl"
+SEALED = ".seg"
+
+
+@dataclass
+class Segment:
+    path: Path
+    first: int  # number of the segment's first turn
+    end: int | None  # first turn of the next segment, None for the active one
+
+    @property
+    def sealed(self) -> bool:
+        return self.path.suffix == SEALED
+
+
+@dataclass(frozen=True)
+class Footer:
+    codec: str
+    blocks: tuple[tuple[int, int, int], ...]  # (offset, length, turns) of each block
+    turns: int
+    last_ts: float  # time of the newest turn
+
+
+def segment_name(first: int, suffix: str = ACTIVE) -> str:
+    return f"{first:0{NAME_DIGITS}d}{suffix}"
+
+
+def list_segments(directory: Path) -> list[Segment]:
+    """A user's segments, oldest first.
+
+    A sealed segment wins over an unsealed one with the same first turn, and
+    each segment ends where the next one begins, so a compaction stopped
+    halfway never shows a turn twice or loses one.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    found: dict[int, Path] = {}
+    for name in names:
+        stem, _, suffix = name.partition(".")
+        if not stem.isdigit() or f".{suffix}" not in (ACTIVE, SEALED):
+            continue  # e.g. a sealed segment still being written
+        first = int(stem)
+        if first not in found or name.endswith(SEALED):
+            found[first] = directory / name
+    firsts = sorted(found)
+    return [
+        Segment(found[first], first, end)
+        for first, end in zip(firsts, [*firsts[1:], None])
+    ]
+
+
+def find_segment(segments: list[Segment], number: int) -> Segment | None:
+    """The segment holding turn ``number``, if it still exists."""
+    i = bisect_right([segment.first for segment in segments], number) - 1
+    return segments[i] if i >= 0 else None
+
+
+@lru_cache(maxsize=8)
+def _codec(name: str) -> tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    if name == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=6, mtime=0), gzip.decompress
+    if name == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(
+                "zstd compression needs the zstandard package (pip install kipbot[zstd])"
+            ) from None
+        return zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress
+    if name == "none":
+        return bytes, bytes
+    raise ValueError(f"Unknown compression: {name}")
+
+
+def check_codec(name: str) -> None:
+    """Raise ValueError unless segments can be written with ``name``."""
+    _codec(name)
+
+
+def _last_ts(lines: list[bytes]) -> float:
+    for line in reversed(lines):
+        try:
+            return float(json.loads(line)["ts"])
+        except (ValueError, KeyError, TypeError):
+            continue
+    return 0.0
+
+
+def write_sealed(path: Path, lines: list[bytes], codec: str) -> None:
+    """Write turn ``lines`` (without newlines) as a sealed segment, atomically."""
+    compress, _ = _codec(codec)
+    # Compactors of several workers may seal the same segment at once
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    blocks = []
+    with open(tmp, "wb") as f:
+        start = size = 0
+        for i, line in enumerate(lines):
+            size += len(line) + 1
+            if size >= BLOCK_BYTES or i == len(lines) - 1:
+                data = compress(b"\n".join(lines[start:i + 1]) + b"\n")
+                blocks.append((f.tell(), len(data), i + 1 - start))
+                f.write(data)
+                start, size = i + 1, 0
+        footer = json.dumps({
+            "codec": codec,
+            "blocks": blocks,
+            "turns": len(lines),
+            "last_ts": _last_ts(lines),
+        }).encode()
+        f.write(footer + len(footer).to_bytes(4, "little") + MAGIC)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+@lru_cache(maxsize=1024)
+def read_footer(path: Path) -> Footer:
+    """The footer of a sealed segment; sealed segments never change, so it is cached."""
+    with open(path, "rb") as f:
+        f.seek(-TRAILER_SIZE, os.SEEK_END)
+        trailer = f.read(TRAILER_SIZE)
+        if trailer[4:] != MAGIC:
+            raise ValueError(f"{path.name} is not a sealed memory segment")
+        length = int.from_bytes(trailer[:4], "little")
+        f.seek(-TRAILER_SIZE - length, os.SEEK_END)
+        data = json.loads(f.read(length))
+    return Footer(
+        codec=data["codec"],
+        blocks=tuple(tuple(block) for block in data["blocks"]),
+        turns=data["turns"],
+        last_ts=data["last_ts"],
+    )
+
+
+def count_lines(path: Path) -> tuple[int, int]:
+    """Complete lines of an unsealed segment and the byte offset where they end."""
+    lines = end = pos = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            newlines = chunk.count(b"\n")
+            if newlines:
+                lines += newlines
+                end = pos + chunk.rindex(b"\n") + 1
+            pos += len(chunk)
+    return lines, end
+
+
+def count_turns(segment: Segment) -> int:
+    if segment.sealed:
+        turns = read_footer(segment.path).turns
+    else:
+        turns, _ = count_lines(segment.path)
+    return turns if segment.end is None else min(turns, segment.end - segment.first)
+
+
+def read_tail_lines(path: Path, limit: int, block_size: int = READ_BLOCK_SIZE) -> list[bytes]:
+    """Return the last ``limit`` non-empty lines of a file.
+
+    Reads backwards from the end in fixed-size blocks, so the cost depends on
+    how much data the last ``limit`` lines hold rather than on the file size.
+    """
+    if limit <= 0:
+        return []
+
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        buf = b""
+        # One extra newline is needed to know the first kept line is complete
+        while pos > 0 and buf.count(b"\n") <= limit:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+
+    lines = [line for line in buf.split(b"\n") if line.strip()]
+    return lines[-limit:]
+
+
+def _read_unsealed(path: Path) -> list[bytes]:
+    with open(path, "rb") as f:
+        data = f.read()
+    # A line without its newline is still being written
+    return data.split(b"\n")[:-1]
+
+
+def _read_blocks(
+    path: Path, footer: Footer, wanted: Callable[[int, int], bool]
+) -> dict[int, bytes]:
+    """Lines by position in the segment, from the blocks ``wanted(first, turns)`` selects."""
+    _, decompress = _codec(footer.codec)
+    lines = {}
+    firsts = [0, *accumulate(turns for _, _, turns in footer.blocks)]
+    with open(path, "rb") as f:
+        for (offset, length, turns), first in zip(footer.blocks, firsts):
+            if not wanted(first, turns):
+                continue
+            f.seek(offset)
+            block = decompress(f.read(length)).split(b"\n")[:-1]
+            lines.update(enumerate(block, first))
+    return lines
+
+
+def read_range(segment: Segment, start: int, stop: int | None = None) -> list[bytes]:
+    """Lines of turns ``start`` up to ``stop`` (turn numbers) held by ``segment``."""
+    if segment.end is not None:
+        stop = segment.end if stop is None else min(stop, segment.end)
+    lo = max(start, segment.first) - segment.first
+    hi = None if stop is None else stop - segment.first
+    if hi is not None and hi <= lo:
+        return []
+    if not segment.sealed:
+        return _read_unsealed(segment.path)[lo:hi]
+    footer = read_footer(segment.path)
+    hi = footer.turns if hi is None else min(hi, footer.turns)
+    lines = _read_blocks(
+        segment.path, footer, lambda first, turns: first < hi and first + turns > lo
+    )
+    return [lines[i] for i in range(lo, hi)]
+
+
+def iter_lines(directory: Path) -> Iterator[bytes]:
+    """Every turn line of a user's log, oldest first."""
+    for segment in list_segments(directory):
+        yield from read_range(segment, segment.first, segment.end)
+
+
+def read_tail(segment: Segment, limit: int) -> list[bytes]:
+    """The last ``limit`` turn lines of ``segment``."""
+    if limit <= 0:
+        return []
+    if segment.end is None and not segment.sealed:
+        return read_tail_lines(segment.path, limit)
+    if segment.sealed:
+        turns = read_footer(segment.path).turns
+    else:
+        turns = len(_read_unsealed(segment.path))
+    stop = segment.first + turns
+    if segment.end is not None:
+        stop = min(stop, segment.end)
+    return read_range(segment, max(segment.first, stop - limit), stop)
+
+
+def read_turns(segment: Segment, numbers: Iterable[int]) -> dict[int, bytes]:
+    """Lines of the given turns held by ``segment``, by turn number."""
+    wanted = {
+        number - segment.first
+        for number in numbers
+        if number >= segment.first and (segment.end is None or number < segment.end)
+    }
+    if not wanted:
+        return {}
+    if segment.sealed:
+        lines = _read_blocks(
+            segment.path,
+            read_footer(segment.path),
+            lambda first, turns: any(first <= i < first + turns for i in wanted),
+        )
+    else:
+        lines = dict(enumerate(_read_unsealed(segment.path)))
+    return {segment.first + i: lines[i] for i in wanted if i in lines}
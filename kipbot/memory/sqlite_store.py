@@ -0,0 +1,294 @@
+"""SQLite-backed memory store for kipbot."""
+
+import asyncio
+import json
+import sqlite3
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+
+from kipbot.core.config import MemoryConfig
+from kipbot.memory.index import MemoryIndex, UserIndex
+from kipbot.memory.segments import iter_lines
+from kipbot.memory.writer import MemoryWriter, PartialWriteError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    user TEXT NOT NULL,
+    assistant TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_turns_user_id ON turns (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_turns_user_ts ON turns (user_id, ts);
+CREATE TABLE IF NOT EXISTS imports (
+    source TEXT PRIMARY KEY,
+    turns INTEGER NOT NULL,
+    imported_at REAL NOT NULL
+);
+"""
+
+# Statements are kept as constants so sqlite3's statement cache reuses them
+INSERT_TURN = "INSERT INTO turns (user_id, ts, user, assistant) VALUES (?, ?, ?, ?)"
+SELECT_RECENT = (
+    "SELECT ts, user, assistant FROM turns WHERE user_id = ? ORDER BY id DESC LIMIT ?"
+)
+SELECT_AFTER = "SELECT id, user, assistant FROM turns WHERE user_id = ? AND id > ? ORDER BY id"
+SELECT_TURN = "SELECT ts, user, assistant FROM turns WHERE id = ?"
+SELECT_LAST_ID = "SELECT last_insert_rowid()"
+SELECT_IMPORT = "SELECT 1 FROM imports WHERE source = ?"
+INSERT_IMPORT = "INSERT INTO imports (source, turns, imported_at) VALUES (?, ?, ?)"
+
+
+def _rows_to_batch(rows: list[tuple]) -> dict[str, list[dict]]:
+    batch: dict[str, list[dict]] = {}
+    for user_id, ts, user, assistant in rows:
+        batch.setdefault(user_id, []).append({"user": user, "assistant": assistant, "ts": ts})
+    return batch
+
+
+def _source_lines(source: Path) -> Iterator[bytes]:
+    if source.is_dir():
+        yield from iter_lines(source)
+        return
+    with open(source, "rb") as f:
+        yield from f
+
+
+class SQLiteMemoryStore:
+    """Memory store keeping every user's turns in a single SQLite database.
+
+    All database work runs on one dedicated thread that owns the connection,
+    so the event loop never blocks on disk I/O. Saves go through a
+    :class:`MemoryWriter` and land as one multi-row transaction per batch.
+    """
+
+    def __init__(self, config: MemoryConfig) -> None:
+        self.config = config
+        self.path = Path(config.path)
+        self.db_path = self.path / "memory.db"
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kipbot-sqlite")
+        self.writer = MemoryWriter(self._write_batch, config)
+        self.index = MemoryIndex(config.retrieval)
+        if config.enabled:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of turns waiting in the write-behind queue."""
+        return self.writer.queue_depth
+
+    async def save(self, user_id: str, user_message: str, assistant_message: str) -> None:
+        """Queue a conversation turn to be written to memory."""
+        if not self.config.enabled:
+            return
+
+        entry = {
+            "user": user_message,
+            "assistant": assistant_message,
+            "ts": time.time(),
+        }
+        await self.writer.submit(user_id, entry)
+
+    async def load(self, user_id: str, limit: int = 10) -> list[dict]:
+        """Load recent conversation history for a user."""
+        if not self.config.enabled:
+            return []
+
+        queued = self.writer.pending(user_id)
+        try:
+            entries = await self._run(self._select_recent, user_id, limit)
+        except Exception as e:
+            logger.error(f"Failed to load memory: {e}")
+            entries = []
+        entries = self.writer.merge_pending(user_id, entries, queued)
+        return entries[-limit:] if limit > 0 else []
+
+    async def search(self, user_id: str, query: str, limit: int = 5) -> list[dict]:
+        """Load the ``limit`` past turns most relevant to ``query``, best first.
+
+        Turns still waiting in the write-behind queue are not searched; they
+        are the latest ones and come back from :meth:`load`.
+        """
+        if not self.config.enabled or not self.config.retrieval.enabled:
+            return []
+
+        try:
+            index = await self.index.load(user_id, self._build_index)
+            if index is None:
+                return []
+            refs = await asyncio.to_thread(index.search, query, limit)
+            return await self._run(self._select_turns, refs)
+        except Exception as e:
+            logger.error(f"Failed to search memory: {e}")
+            return []
+
+    async def flush(self) -> None:
+        """Write all queued turns to the database."""
+        await self.writer.flush()
+
+    async def import_local(self, source: Path) -> int:
+        """Import a user's local memory, returning the number of turns.
+
+        ``source`` is a ``{user_id}/`` segment directory of the local backend
+        or a legacy ``{user_id}.jsonl`` file. Sources that were already
+        imported are skipped, so the migration can be re-run.
+        """
+        return await self._run(self._import_file, source)
+
+    async def close(self) -> None:
+        """Flush queued turns, close the connection and stop the worker thread."""
+        await self.index.close()
+        await self.writer.close()
+        if self._conn is not None:
+            await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _build_index(self, user_id: str) -> None:
+        # Read and tokenize on a connection of its own, so the worker thread stays free
+        index = await asyncio.to_thread(self._read_index, user_id)
+        await self._run(self._install_index, user_id, index)
+
+    async def _write_batch(self, batch: dict[str, list[dict]], fsync: str) -> None:
+        rows = [
+            (user_id, e["ts"], e["user"], e["assistant"])
+            for user_id, entries in batch.items()
+            for e in entries
+        ]
+        if fsync == "turn":
+            await self._run(self._insert_each, rows)
+        else:
+            await self._run(self._insert_many, rows)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # NORMAL skips the fsync on WAL commits; FULL makes every commit durable
+            sync = "NORMAL" if self.config.fsync == "never" else "FULL"
+            conn.execute(f"PRAGMA synchronous={sync}")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _insert_many(self, rows: list[tuple]) -> None:
+        """Insert rows in transactions of at most ``batch_size`` rows each."""
+        conn = self._connect()
+        size = self.config.batch_size
+        for start in range(0, len(rows), size):
+            chunk = rows[start:start + size]
+            try:
+                with conn:
+                    conn.executemany(INSERT_TURN, chunk)
+                    # This connection holds the write lock, so the chunk got consecutive ids
+                    (last,) = conn.execute(SELECT_LAST_ID).fetchone()
+            except sqlite3.Error as e:
+                # Earlier chunks are committed; only the rest may be retried
+                raise PartialWriteError(_rows_to_batch(rows[start:]), e) from e
+            for ref, row in enumerate(chunk, last - len(chunk) + 1):
+                self._index_row(ref, row)
+
+    def _insert_each(self, rows: list[tuple]) -> None:
+        """Insert rows in one transaction each, so every turn is synced on its own."""
+        conn = self._connect()
+        for i, row in enumerate(rows):
+            try:
+                with conn:
+                    ref = conn.execute(INSERT_TURN, row).lastrowid
+            except sqlite3.Error as e:
+                raise PartialWriteError(_rows_to_batch(rows[i:]), e) from e
+            self._index_row(ref, row)
+
+    def _index_row(self, ref: int, row: tuple) -> None:
+        user_id, _, user, assistant = row
+        self.index.add(user_id, ref, {"user": user, "assistant": assistant})
+
+    def _select_recent(self, user_id: str, limit: int) -> list[dict]:
+        if limit <= 0:
+            return []
+        cursor = self._connect().execute(SELECT_RECENT, (user_id, limit))
+        rows = cursor.fetchall()
+        rows.reverse()
+        return [{"user": user, "assistant": assistant, "ts": ts} for ts, user, assistant in rows]
+
+    def _read_index(self, user_id: str) -> UserIndex:
+        index = UserIndex()
+        if not self.db_path.exists():
+            return index
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self._add_rows(conn, index, user_id)
+        finally:
+            conn.close()
+        return index
+
+    def _install_index(self, user_id: str, index: UserIndex) -> None:
+        # Runs on the worker thread, so no write can slip in between
+        self._add_rows(self._connect(), index, user_id)
+        self.index.install(user_id, index)
+
+    def _add_rows(self, conn: sqlite3.Connection, index: UserIndex, user_id: str) -> None:
+        for ref, user, assistant in conn.execute(SELECT_AFTER, (user_id, index.last_ref)):
+            index.add(ref, {"user": user, "assistant": assistant})
+
+    def _select_turns(self, refs: list[int]) -> list[dict]:
+        conn = self._connect()
+        entries = []
+        for ref in refs:
+            row = conn.execute(SELECT_TURN, (ref,)).fetchone()
+            if row is not None:
+                ts, user, assistant = row
+                entries.append({"user": user, "assistant": assistant, "ts": ts})
+        return entries
+
+    def _import_file(self, source: Path) -> int:
+        conn = self._connect()
+        key = str(source.resolve())
+        if conn.execute(SELECT_IMPORT, (key,)).fetchone():
+            return 0
+
+        user_id = source.name.removesuffix(".jsonl")
+        fallback_ts = source.stat().st_mtime
+        size = self.config.batch_size
+        count = 0
+        batch: list[tuple] = []
+        # One transaction per source keeps the import atomic, so a re-run never duplicates turns
+        with conn:
+            for line in _source_lines(source):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    batch.append((
+                        user_id,
+                        entry.get("ts", fallback_ts),
+                        entry["user"],
+                        entry["assistant"],
+                    ))
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Skipping bad line in {source.name}: {e}")
+                    continue
+                if len(batch) >= size:
+                    conn.executemany(INSERT_TURN, batch)
+                    count += len(batch)
+                    batch.clear()
+            if batch:
+                conn.executemany(INSERT_TURN, batch)
+                count += len(batch)
+            conn.execute(INSERT_IMPORT, (key, count, time.time()))
+        self.index.discard(user_id)
+        return count
@@ -1,51 +1,518 @@
 """Persistent memory store for kipbot."""
 
+import asyncio
+import contextlib
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
 
 from loguru import logger
 
 from kipbot.core.config import MemoryConfig
+from kipbot.memory.index import MemoryIndex, UserIndex
+from kipbot.memory.segments import (
+    SEALED,
+    Segment,
+    check_codec,
+    count_lines,
+    count_turns,
+    find_segment,
+    list_segments,
+    read_footer,
+    read_range,
+    read_tail,
+    read_turns,
+    segment_name,
+    write_sealed,
+)
+from kipbot.memory.writer import MemoryWriter, PartialWriteError
+
+LOCK_STRIPES = 64
+MAX_OPEN_USERS = 4096  # users whose active segment position is kept in memory
+# Seconds before a kept position is checked against the disk again, in case
+# another worker's compactor retired the segment
+RECHECK_AFTER = 60.0
+
+
+def create_memory_store(config: MemoryConfig):
+    """Create the memory store selected by ``config.backend``."""
+    if config.backend == "sqlite":
+        from kipbot.memory.sqlite_store import SQLiteMemoryStore
+        return SQLiteMemoryStore(config)
+    if config.backend != "local":
+        raise ValueError(f"Unknown memory backend: {config.backend}")
+    return MemoryStore(config)
+
+
+@dataclass
+class _Active:
+    """Where a user's next turn goes."""
+
+    path: Path
+    first: int
+    turns: int
+    size: int
+    opened: float  # time.monotonic() when read from disk
+
+
+def _parse(lines: list[bytes], user_id: str) -> list[dict]:
+    entries = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except ValueError as e:
+            # Losing one damaged turn beats losing the user's whole history
+            logger.warning(f"Skipping bad memory line of {user_id}: {e}")
+    return entries
 
 
 class MemoryStore:
-    """Simple local file-based memory store."""
+    """Local file-based memory store.
+
+    Each user's turns are a log of segments under ``{path}/{user_id}/`` (see
+    :mod:`kipbot.memory.segments`). Turns are appended to the active
+    segment only, so loading recent turns rarely reads anything else. A
+    background compactor seals and compresses segments once they are full
+    and enforces the retention limits. A legacy ``{user_id}.jsonl`` file
+    becomes the user's first segment when it is next used.
+    """
 
     def __init__(self, config: MemoryConfig) -> None:
+        check_codec(config.compression)
         self.config = config
         self.path = Path(config.path)
+        self.writer = MemoryWriter(self._write_batch, config)
+        self.index = MemoryIndex(config.retrieval)
+        # Serialize appends, segment rotation and the last step of an index build per user
+        self._locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+        self._active: OrderedDict[str, _Active] = OrderedDict()
+        self._rotated: set[str] = set()  # users with a segment waiting to be sealed
+        self._rotated_lock = threading.Lock()
+        self._compact_lock = threading.Lock()  # one compaction pass at a time
+        self._closing = False
+        self._swept = False
+        self._compactor: asyncio.Task | None = None
         if config.enabled:
             self.path.mkdir(parents=True, exist_ok=True)
 
+    @property
+    def queue_depth(self) -> int:
+        """Number of turns waiting in the write-behind queue."""
+        return self.writer.queue_depth
+
     async def save(self, user_id: str, user_message: str, assistant_message: str) -> None:
-        """Save a conversation turn to memory."""
+        """Queue a conversation turn to be written to memory."""
         if not self.config.enabled:
             return
 
-        user_file = self.path / f"{user_id}.jsonl"
         entry = {
             "user": user_message,
             "assistant": assistant_message,
+            "ts": time.time(),
         }
-        try:
-            with open(user_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-        except Exception as e:
-            logger.error(f"Failed to save memory: {e}")
+        await self.writer.submit(user_id, entry)
+        self._ensure_compactor()
 
     async def load(self, user_id: str, limit: int = 10) -> list[dict]:
         """Load recent conversation history for a user."""
         if not self.config.enabled:
             return []
 
-        user_file = self.path / f"{user_id}.jsonl"
-        if not user_file.exists():
+        queued = self.writer.pending(user_id)
+        try:
+            entries = await asyncio.to_thread(self._read_recent, user_id, limit)
+        except Exception as e:
+            logger.error(f"Failed to load memory: {e}")
+            entries = []
+        entries = self.writer.merge_pending(user_id, entries, queued)
+        return entries[-limit:] if limit > 0 else []
+
+    async def search(self, user_id: str, query: str, limit: int = 5) -> list[dict]:
+        """Load the ``limit`` past turns most relevant to ``query``, best first.
+
+        Turns still waiting in the write-behind queue are not searched; they
+        are the latest ones and come back from :meth:`load`.
+        """
+        if not self.config.enabled or not self.config.retrieval.enabled:
             return []
 
         try:
-            lines = user_file.read_text(encoding="utf-8").strip().split("\n")
-            entries = [json.loads(line) for line in lines[-limit:]]
-            return entries
+            index = await self.index.load(
+                user_id, lambda u: asyncio.to_thread(self._build_index, u)
+            )
+            if index is None:
+                return []
+            return await asyncio.to_thread(self._search, index, user_id, query, limit)
         except Exception as e:
-            logger.error(f"Failed to load memory: {e}")
+            logger.error(f"Failed to search memory: {e}")
             return []
+
+    async def flush(self) -> None:
+        """Write all queued turns to disk."""
+        await self.writer.flush()
+
+    async def close(self) -> None:
+        """Flush queued turns and stop the background writer and compactor."""
+        if self._compactor is not None and self._compactor.get_loop() is asyncio.get_running_loop():
+            self._compactor.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._compactor
+            # Cancelling doesn't stop a pass already running on its thread
+            self._closing = True
+            await asyncio.to_thread(self._compact_lock.acquire)
+            self._compact_lock.release()
+            self._closing = False
+        self._compactor = None
+        await self.index.close()
+        await self.writer.close()
+
+    def compact(self, full: bool = False) -> dict[str, int]:
+        """Seal full segments and enforce retention; returns what was done.
+
+        Only users with a newly filled segment are visited, unless ``full`` is
+        set, retention limits are configured or this is the first pass.
+        """
+        retention = self.config.max_age_days > 0 or self.config.max_turns > 0
+        with self._compact_lock:
+            with self._rotated_lock:
+                users, self._rotated = self._rotated, set()
+            if full or retention or not self._swept:
+                users |= self._all_users()
+                self._swept = True
+
+            stats = {"users": len(users), "sealed": 0, "dropped": 0}
+            for user_id in users:
+                if self._closing:
+                    break
+                try:
+                    self._compact_user(user_id, stats)
+                except Exception as e:
+                    logger.error(f"Failed to compact memory of {user_id}: {e}")
+        if stats["sealed"] or stats["dropped"]:
+            logger.info(
+                f"Memory compaction: sealed {stats['sealed']} and dropped "
+                f"{stats['dropped']} segments of {stats['users']} users"
+            )
+        return stats
+
+    def _ensure_compactor(self) -> None:
+        loop = asyncio.get_running_loop()
+        task = self._compactor
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._compactor = loop.create_task(
+                self._compact_loop(), name="kipbot-memory-compactor"
+            )
+
+    async def _compact_loop(self) -> None:
+        # The first pass visits every user, picking up legacy files and leftovers
+        while True:
+            try:
+                await asyncio.to_thread(self.compact)
+            except Exception as e:
+                logger.error(f"Memory compaction failed: {e}")
+            await asyncio.sleep(self.config.compact_interval)
+
+    def _lock(self, user_id: str) -> threading.RLock:
+        return self._locks[hash(user_id) % LOCK_STRIPES]
+
+    def _user_dir(self, user_id: str) -> Path:
+        """The user's segment directory, adopting a legacy JSONL file first."""
+        directory = self.path / user_id
+        if not directory.is_dir():
+            legacy = self.path / f"{user_id}.jsonl"
+            with self._lock(user_id):
+                if legacy.exists() and not directory.is_dir():
+                    self._adopt_legacy(legacy, directory)
+        return directory
+
+    @staticmethod
+    def _adopt_legacy(legacy: Path, directory: Path) -> None:
+        """Turn a legacy JSONL file into segment 0 of ``directory``.
+
+        Turns written before timestamps were recorded get the file's mtime,
+        like the SQLite import gives them, so retention and ordering work.
+        """
+        stat = legacy.stat()
+        fallback_ts = stat.st_mtime
+        tmp = legacy.with_name(f"{legacy.name}.{os.getpid()}.tmp")
+        with open(legacy, "rb") as src, open(tmp, "wb") as dst:
+            for line in src:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    dst.write(line)  # skipped with a warning when read
+                    continue
+                if isinstance(entry, dict) and "ts" not in entry:
+                    entry["ts"] = fallback_ts
+                    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode()
+                dst.write(line)
+        # The compactor tells idle segments from ones being written by their mtime
+        os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        directory.mkdir()
+        os.replace(tmp, directory / segment_name(0))
+        legacy.unlink()
+
+    def _all_users(self) -> set[str]:
+        users = set()
+        for entry in os.scandir(self.path):
+            if entry.is_dir():
+                users.add(entry.name)
+            elif entry.name.endswith(".jsonl"):
+                users.add(entry.name.removesuffix(".jsonl"))
+        return users
+
+    def _segments(self, user_id: str) -> list[Segment]:
+        return list_segments(self._user_dir(user_id))
+
+    def _read_recent(self, user_id: str, limit: int) -> list[dict]:
+        # A segment can be sealed or dropped between listing and reading it
+        for attempt in range(2):
+            try:
+                lines: list[bytes] = []
+                for segment in reversed(self._segments(user_id)):
+                    if len(lines) >= limit:
+                        break
+                    lines[:0] = read_tail(segment, limit - len(lines))
+                return _parse(lines, user_id)
+            except FileNotFoundError:
+                if attempt:
+                    raise
+        return []
+
+    def _build_index(self, user_id: str) -> None:
+        index = UserIndex()
+        end = self._index_turns(index, user_id, 0)
+        with self._lock(user_id):
+            # Pick up turns appended during the scan, then let appends update the index
+            self._index_turns(index, user_id, end)
+            self.index.install(user_id, index)
+
+    def _index_turns(self, index: UserIndex, user_id: str, start: int) -> int:
+        """Index turns from number ``start`` on; returns the number after the last one."""
+        pos = start
+        for segment in self._segments(user_id):
+            if segment.end is not None and segment.end <= pos:
+                continue
+            pos = max(pos, segment.first)
+            try:
+                lines = read_range(segment, pos, segment.end)
+            except FileNotFoundError:
+                continue  # dropped by retention meanwhile
+            for number, line in enumerate(lines, pos):
+                if not line.strip():
+                    continue
+                try:
+                    index.add(number, json.loads(line))
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Skipping bad memory line of {user_id}: {e}")
+            pos += len(lines)
+        return pos
+
+    def _search(self, index: UserIndex, user_id: str, query: str, limit: int) -> list[dict]:
+        refs = index.search(query, limit)
+        segments = self._segments(user_id)
+        by_segment: dict[int, list[int]] = {}
+        for ref in refs:
+            segment = find_segment(segments, ref)
+            if segment is not None:
+                by_segment.setdefault(segment.first, []).append(ref)
+        lines: dict[int, bytes] = {}
+        for segment in segments:
+            if segment.first in by_segment:
+                with contextlib.suppress(FileNotFoundError):
+                    lines.update(read_turns(segment, by_segment[segment.first]))
+        # Turns dropped by retention since the index was built are skipped
+        return _parse([lines[ref] for ref in refs if ref in lines], user_id)
+
+    async def _write_batch(self, batch: dict[str, list[dict]], fsync: str) -> None:
+        await asyncio.to_thread(self._append, batch, fsync)
+
+    def _append(self, batch: dict[str, list[dict]], fsync: str) -> None:
+        """Append each user's turns with a single open/write per file."""
+        unwritten = {}
+        error = None
+        for user_id, entries in batch.items():
+            try:
+                self._append_user(user_id, entries, fsync)
+            except Exception as e:
+                logger.error(f"Failed to save memory for {user_id}: {e}")
+                unwritten[user_id] = (
+                    e.unwritten[user_id] if isinstance(e, PartialWriteError) else entries
+                )
+                error = e
+        if unwritten:
+            raise PartialWriteError(unwritten, error)
+
+    def _append_user(self, user_id: str, entries: list[dict], fsync: str) -> None:
+        lines = [(json.dumps(e, ensure_ascii=False) + "\n").encode() for e in entries]
+        with self._lock(user_id):
+            active = self._open_active(user_id)
+            done = 0
+            while done < len(lines):
+                if active.turns and active.size >= self.config.segment_bytes:
+                    self._rotate(user_id, active)
+                # Fill the active segment up to segment_bytes, like _seal would
+                stop, size = done, active.size
+                while stop < len(lines) and (stop == done or size < self.config.segment_bytes):
+                    size += len(lines[stop])
+                    stop += 1
+                try:
+                    self._write_lines(active.path, lines[done:stop], fsync)
+                except Exception as e:
+                    # The file may not match what we think; look again next time
+                    self._active.pop(user_id, None)
+                    if done:
+                        # Earlier segments of the batch are written; don't repeat them
+                        raise PartialWriteError({user_id: entries[done:]}, e) from e
+                    raise
+                for entry, line in zip(entries[done:stop], lines[done:stop]):
+                    self.index.add(user_id, active.first + active.turns, entry)
+                    active.turns += 1
+                    active.size += len(line)
+                done = stop
+
+    @staticmethod
+    def _write_lines(path: Path, lines: list[bytes], fsync: str) -> None:
+        with open(path, "ab") as f:
+            if fsync == "turn":
+                for line in lines:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+            else:
+                f.write(b"".join(lines))
+                if fsync == "batch":
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def _open_active(self, user_id: str) -> _Active:
+        """Position of the user's active segment; call with the user's lock held."""
+        active = self._active.get(user_id)
+        if active is not None and time.monotonic() - active.opened < RECHECK_AFTER:
+            self._active.move_to_end(user_id)
+            return active
+
+        directory = self._user_dir(user_id)
+        directory.mkdir(exist_ok=True)
+        segments = list_segments(directory)
+        now = time.monotonic()
+        if not segments:
+            active = _Active(directory / segment_name(0), 0, 0, 0, now)
+        elif segments[-1].sealed:
+            last = segments[-1]
+            first = last.first + read_footer(last.path).turns
+            active = _Active(directory / segment_name(first), first, 0, 0, now)
+        else:
+            last = segments[-1]
+            turns, end = count_lines(last.path)
+            if end < last.path.stat().st_size:
+                # Left over from a crash in the middle of a write
+                logger.warning(f"Truncating a partly written turn in {last.path}")
+                os.truncate(last.path, end)
+            active = _Active(last.path, last.first, turns, end, now)
+
+        self._active[user_id] = active
+        self._active.move_to_end(user_id)
+        if len(self._active) > MAX_OPEN_USERS:
+            self._active.popitem(last=False)
+        return active
+
+    def _rotate(self, user_id: str, active: _Active) -> None:
+        """Start a new active segment; the compactor seals the old one."""
+        active.first += active.turns
+        active.path = active.path.with_name(segment_name(active.first))
+        active.turns = active.size = 0
+        with self._rotated_lock:
+            self._rotated.add(user_id)
+
+    def _compact_user(self, user_id: str, stats: dict[str, int]) -> None:
+        directory = self._user_dir(user_id)
+        cutoff = None
+        if self.config.max_age_days > 0:
+            cutoff = time.time() - self.config.max_age_days * 86400
+        self._retire_active(user_id, directory, cutoff)
+
+        for segment in list_segments(directory):
+            if segment.end is not None and not segment.sealed:
+                self._seal(segment)
+                stats["sealed"] += 1
+
+        dropped = self._apply_retention(directory, cutoff)
+        if dropped:
+            stats["dropped"] += dropped
+            # Rebuilt without the dropped turns when next needed
+            self.index.discard(user_id)
+
+    def _retire_active(self, user_id: str, directory: Path, cutoff: float | None) -> None:
+        """Rotate an idle active segment that is full or aged out.
+
+        Writers rotate full segments themselves; this covers users who went
+        quiet, such as adopted legacy files, so their turns get sealed or
+        dropped. Segments written recently are left alone, as another
+        worker may be appending to them.
+        """
+        with self._lock(user_id):
+            segments = list_segments(directory)
+            if not segments or segments[-1].sealed:
+                return
+            last = segments[-1]
+            stat = last.path.stat()
+            if stat.st_mtime > time.time() - 2 * RECHECK_AFTER:
+                return
+            full = stat.st_size >= self.config.segment_bytes
+            if not full and (cutoff is None or stat.st_mtime >= cutoff):
+                return
+            turns, _ = count_lines(last.path)
+            if turns:
+                (directory / segment_name(last.first + turns)).touch()
+                self._active.pop(user_id, None)
+
+    def _seal(self, segment: Segment) -> None:
+        """Compress a full segment into sealed segments of at most ``segment_bytes``."""
+        lines = read_range(segment, segment.first, segment.end)
+        chunks: list[tuple[int, int]] = []  # (start, stop) positions in lines
+        start = size = 0
+        for i, line in enumerate(lines):
+            size += len(line) + 1
+            if size >= self.config.segment_bytes or i == len(lines) - 1:
+                chunks.append((start, i + 1))
+                start, size = i + 1, 0
+        # The chunk sharing the source's name goes last: until it exists the
+        # source stays visible and the chunks after it simply cut it short
+        for start, stop in reversed(chunks):
+            path = segment.path.with_name(segment_name(segment.first + start, SEALED))
+            write_sealed(path, lines[start:stop], self.config.compression)
+        if not chunks:
+            write_sealed(
+                segment.path.with_name(segment_name(segment.first, SEALED)),
+                [],
+                self.config.compression,
+            )
+        segment.path.unlink(missing_ok=True)
+
+    def _apply_retention(self, directory: Path, cutoff: float | None) -> int:
+        """Drop the oldest sealed segments past the age or turn limits."""
+        segments = list_segments(directory)
+        if len(segments) < 2:
+            return 0
+        max_turns = self.config.max_turns
+        total = segments[-1].first + count_turns(segments[-1]) - segments[0].first
+        dropped = 0
+        for segment in segments[:-1]:
+            if not segment.sealed:
+                break
+            turns = segment.end - segment.first
+            too_old = cutoff is not None and read_footer(segment.path).last_ts < cutoff
+            too_many = max_turns > 0 and total - turns >= max_turns
+            if not (too_old or too_many):
+                break
+            segment.path.unlink(missing_ok=True)
+            total -= turns
+            dropped += 1
+        return dropped
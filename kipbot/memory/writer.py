@@ -0,0 +1,162 @@
+"""Write-behind queue for memory stores."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from loguru import logger
+
+from kipbot.core.config import MemoryConfig
+from kipbot.core.metrics import MEMORY_SECONDS
+
+FSYNC_POLICIES = ("never", "batch", "turn")
+MAX_WRITE_ATTEMPTS = 5  # failed writes of a turn before it is dropped
+
+# Writes {user_id: [entry, ...]} using the given fsync policy, off the event loop
+BatchSink = Callable[[dict[str, list[dict]], str], Awaitable[None]]
+
+
+class PartialWriteError(Exception):
+    """Raised by a sink that wrote only part of a batch; ``unwritten`` is the rest."""
+
+    def __init__(self, unwritten: dict[str, list[dict]], cause: Exception) -> None:
+        super().__init__(str(cause))
+        self.unwritten = unwritten
+
+
+class MemoryWriter:
+    """Buffer conversation turns and group-commit them from a background task.
+
+    Turns are collected per user and handed to ``sink`` in one batch once
+    ``flush_batch_size`` turns are pending or ``flush_interval`` seconds have
+    passed, so callers only pay for an in-memory append. Turns the sink failed
+    to write go back to the queue and are retried with the next batch, up to
+    ``MAX_WRITE_ATTEMPTS`` failed writes in a row.
+    """
+
+    def __init__(self, sink: BatchSink, config: MemoryConfig) -> None:
+        if config.fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {config.fsync}")
+        self.sink = sink
+        self.config = config
+        self._pending: dict[str, list[dict]] = {}
+        self._inflight: dict[str, list[dict]] = {}
+        self._depth = 0
+        self._failures = 0  # failed writes in a row
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._lock: asyncio.Lock | None = None
+        self._closing = False
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of turns accepted but not yet written."""
+        return self._depth
+
+    def pending(self, user_id: str) -> list[dict]:
+        """Turns for ``user_id`` that are still waiting to be written."""
+        return [*self._inflight.get(user_id, ()), *self._pending.get(user_id, ())]
+
+    def merge_pending(self, user_id: str, entries: list[dict], queued: list[dict]) -> list[dict]:
+        """Add turns not yet written to ``entries``, which were just read from the store.
+
+        ``queued`` is :meth:`pending` as taken before the read. A turn written
+        while the store was being read shows up in both, so turns are matched
+        by ``ts`` and kept once.
+        """
+        seen = {entry.get("ts") for entry in entries}
+        for entry in [*queued, *self.pending(user_id)]:
+            if entry["ts"] not in seen:
+                seen.add(entry["ts"])
+                entries.append(entry)
+        return entries
+
+    async def submit(self, user_id: str, entry: dict) -> None:
+        """Queue a turn for writing.
+
+        Returns immediately unless the fsync policy is ``"turn"``, in which case
+        the turn is written and synced before returning.
+        """
+        self._ensure_started()
+        self._pending.setdefault(user_id, []).append(entry)
+        self._depth += 1
+
+        if self.config.fsync == "turn":
+            await self.flush()
+        elif self._depth >= self.config.flush_batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Write every pending turn now."""
+        if not self._pending and not self._inflight:
+            return
+        self._bind()
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            self._inflight = batch
+            count = sum(len(entries) for entries in batch.values())
+            try:
+                # Batches mix users of every platform
+                with MEMORY_SECONDS.time(platform="all", op="flush"):
+                    await self.sink(batch, self.config.fsync)
+                self._failures = 0
+            except Exception as e:
+                unwritten = e.unwritten if isinstance(e, PartialWriteError) else batch
+                count -= self._requeue(unwritten, e)
+            finally:
+                self._inflight = {}
+                self._depth -= count
+
+    def _requeue(self, unwritten: dict[str, list[dict]], error: Exception) -> int:
+        """Put turns that failed to write back in front of the queue; return how many."""
+        count = sum(len(entries) for entries in unwritten.values())
+        self._failures += 1
+        if self._failures >= MAX_WRITE_ATTEMPTS:
+            logger.error(f"Failed to save memory, dropping {count} turns: {error}")
+            self._failures = 0
+            return 0
+        logger.warning(f"Failed to save memory, will retry {count} turns: {error}")
+        for user_id, entries in unwritten.items():
+            self._pending[user_id] = [*entries, *self._pending.get(user_id, ())]
+        return count
+
+    async def close(self) -> None:
+        """Stop the background task and write whatever is still pending."""
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            # Let the task finish its current batch instead of cancelling mid-write
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._closing = False
+        self._task = None
+        await self.flush()
+        while self._pending:
+            # A write failed; retry until it succeeds or the turns are dropped
+            await asyncio.sleep(self.config.flush_interval)
+            await self.flush()
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Events and locks belong to one loop, so recreate them when the loop changes
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def _ensure_started(self) -> None:
+        self._bind()
+        if self._task is None or self._task.done():
+            self._task = self._loop.create_task(self._run(), name="kipbot-memory-writer")
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.config.flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
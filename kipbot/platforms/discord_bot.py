@@ -1,33 +1,84 @@
 """Discord platform integration."""
 
+import asyncio
+
 import discord
 from loguru import logger
 
 from kipbot.core.agent import Agent, AgentContext
+from kipbot.core.config import DiscordConfig
+from kipbot.core.dispatcher import Dispatcher
+from kipbot.platforms.streaming import ProgressiveReply
+from kipbot.platforms.supervisor import Supervisor
+
+EDIT_INTERVAL = 1.0  # Discord allows 5 edits per 5 seconds per channel
+MAX_MESSAGE_LENGTH = 2000
+
+
+def parse_shard_ids(spec: str) -> list[int]:
+    """Parse shard ids such as ``"0-3,8"``."""
+    ids = []
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        ids.extend(range(int(first), int(last or first) + 1))
+    return ids
 
 
 class DiscordPlatform:
-    """Discord bot platform."""
+    """Discord bot platform.
 
-    def __init__(self, agent: Agent, token: str) -> None:
+    With ``sharded`` set, the gateway is split over several connections
+    handled by one :class:`discord.AutoShardedClient`. To spread a large bot
+    over processes, give every process the same ``shard_count`` and its own
+    ``shard_ids``; a user can then be active in two processes at once, so
+    memory must use the SQLite backend. At most ``concurrency`` turns run at
+    once.
+    """
+
+    name = "discord"
+
+    def __init__(self, agent: Agent, config: DiscordConfig) -> None:
         self.agent = agent
-        self.token = token
-        self.contexts: dict[str, AgentContext] = {}
+        self.config = config
+        self._turns = asyncio.Semaphore(config.concurrency)
+        self.client = self._create_client()
+        self.dispatcher = Dispatcher(agent.config.dispatch)
+        self._setup_events()
+
+    def _create_client(self) -> discord.Client:
         intents = discord.Intents.default()
         intents.message_content = True
-        self.client = discord.Client(intents=intents)
-        self._setup_events()
+        if not (self.config.sharded or self.config.shard_ids):
+            return discord.Client(intents=intents)
+        if self.config.shard_ids and not self.config.shard_count:
+            raise ValueError("discord.shard_ids needs discord.shard_count")
+        memory = self.agent.config.memory
+        partial = set(self.config.shard_ids) != set(range(self.config.shard_count))
+        if self.config.shard_ids and partial and memory.enabled and memory.backend != "sqlite":
+            # Each process caches the position of a user's active segment; two
+            # processes appending to the same files would overwrite each other
+            raise ValueError(
+                "discord.shard_ids spreads users over processes, which the local "
+                'memory backend can\'t share; set "memory": {"backend": "sqlite"}'
+            )
+        return discord.AutoShardedClient(
+            intents=intents,
+            shard_count=self.config.shard_count or None,
+            shard_ids=self.config.shard_ids or None,
+        )
 
     def _get_context(self, user_id: str) -> AgentContext:
-        if user_id not in self.contexts:
-            self.contexts[user_id] = AgentContext(user_id=user_id, platform="discord")
-        return self.contexts[user_id]
+        return self.agent.sessions.get(user_id, "discord")
 
     def _setup_events(self) -> None:
         @self.client.event
         async def on_ready():
             logger.info(f"Discord bot connected as {self.client.user}")
 
+        @self.client.event
+        async def on_shard_ready(shard_id: int):
+            logger.info(f"Discord shard {shard_id} ready")
+
         @self.client.event
         async def on_message(message: discord.Message):
             if message.author == self.client.user:
@@ -46,12 +97,39 @@ class DiscordPlatform:
             if not text:
                 return
 
-            context = self._get_context(user_id)
-            response = await self.agent.chat(context, text)
+            # The newest message of a burst answers for the whole merged turn
+            self.dispatcher.submit(
+                user_id, text, lambda merged: self._respond(message, user_id, merged)
+            )
 
-            await message.reply(response)
+    async def _respond(self, message: discord.Message, user_id: str, text: str) -> None:
+        try:
+            async with self._turns:
+                context = self._get_context(user_id)
+                reply = ProgressiveReply(
+                    send=message.reply,
+                    edit=lambda sent, new_text: sent.edit(content=new_text),
+                    interval=EDIT_INTERVAL,
+                    max_length=MAX_MESSAGE_LENGTH,
+                )
+                # discord.py refreshes the indicator every few seconds, not per token
+                async with message.channel.typing():
+                    response = await self.agent.chat(context, text, on_delta=reply.push)
+                await reply.finish(response)
+        except Exception as e:
+            logger.error(f"[discord] error for {user_id}: {e}")
+            await message.reply(f"Error: {e}"[:MAX_MESSAGE_LENGTH])
+
+    async def start(self) -> None:
+        """Connect to Discord and serve until cancelled, then finish queued turns."""
+        logger.info("Discord bot starting...")
+        async with self.client:
+            try:
+                await self.client.start(self.config.token)
+            finally:
+                # The client can still send until it is closed
+                await self.dispatcher.drain()
 
     def run(self) -> None:
         """Start the Discord bot."""
-        logger.info("Discord bot starting...")
-        self.client.run(self.token)
+        Supervisor(self.agent, [self]).run()
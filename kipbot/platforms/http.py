@@ -0,0 +1,68 @@
+"""Minimal ASGI helpers shared by the webhook-style platforms."""
+
+import asyncio
+import json
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+async def read_body(receive, limit: int = MAX_BODY_SIZE) -> bytes:
+    """Read the full request body from an ASGI ``receive`` channel."""
+    body = b""
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionError("client disconnected")
+        body += message.get("body", b"")
+        if len(body) > limit:
+            raise ValueError("request body too large")
+        more = message.get("more_body", False)
+    return body
+
+
+async def send_json(send, status: int, data: dict) -> None:
+    """Send a JSON response on an ASGI ``send`` channel."""
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def serve(app, host: str, port: int) -> None:
+    """Serve an ASGI app with uvicorn until interrupted or cancelled.
+
+    On cancellation the server stops accepting connections and lets requests
+    in flight finish before returning. Raises ImportError if uvicorn is not
+    installed.
+    """
+    try:
+        import uvicorn
+    except ImportError:
+        raise ImportError(
+            "uvicorn is required for webhook servers. Install with: pip install kipbot[kakao]"
+        ) from None
+
+    config = uvicorn.Config(app, host=host, port=port, lifespan="off", log_level="warning")
+    server = uvicorn.Server(config)
+
+    async def run() -> None:
+        try:
+            await server.serve()
+        except SystemExit:
+            # uvicorn exits the process when it can't listen, e.g. the port is taken
+            raise OSError(f"Can't serve on {host}:{port}") from None
+
+    task = asyncio.ensure_future(run())
+    try:
+        await asyncio.shield(task)
+    except asyncio.CancelledError:
+        server.should_exit = True
+        await task
+        raise
@@ -1,53 +1,146 @@
 """Kakao i Open Builder integration (Skill Server)."""
 
 import asyncio
+import json
 
 from loguru import logger
 
 from kipbot.core.agent import Agent, AgentContext
+from kipbot.core.config import KakaoConfig
+from kipbot.core.dispatcher import Dispatcher
+from kipbot.platforms.http import read_body, send_json, serve
+from kipbot.platforms.supervisor import Supervisor
+
+CHAT_PATH = "/kakao/chat"
+CALLBACK_WAIT_TEXT = "답변을 준비하고 있어요. 잠시만 기다려 주세요."
+MERGED_TEXT = "이어서 보내주신 메시지와 함께 답변할게요."
+
+
+def _object(data: dict, key: str) -> dict:
+    """``data[key]`` if it is a JSON object, else an empty one."""
+    value = data.get(key)
+    return value if isinstance(value, dict) else {}
+
+
+def _text_response(text: str) -> dict:
+    return {
+        "version": "2.0",
+        "template": {
+            "outputs": [
+                {"simpleText": {"text": text}}
+            ]
+        }
+    }
 
 
 class KakaoPlatform:
-    """Kakao i Open Builder skill server using Flask."""
+    """Kakao i Open Builder skill server running as an ASGI app.
+
+    Requests are handled concurrently on one event loop. When a request carries
+    a ``callbackUrl`` and the answer takes longer than ``callback_after`` seconds,
+    the skill replies with ``useCallback`` right away and POSTs the final answer
+    to the callback URL once it is ready.
+
+    Turns are serialized per user, and at most ``config.concurrency`` run at
+    once. Every request needs its own reply, so there is no debounce; messages
+    sent while a turn is running are merged into the next turn and answered by
+    the newest request.
+    """
 
-    def __init__(self, agent: Agent, api_key: str = "", port: int = 5000) -> None:
+    name = "kakao"
+
+    def __init__(self, agent: Agent, config: KakaoConfig) -> None:
         self.agent = agent
-        self.api_key = api_key
-        self.port = port
-        self.contexts: dict[str, AgentContext] = {}
+        self.config = config
+        self.callback_after = config.callback_after
+        self.http = None  # httpx client for callbacks, created on first use
+        self._callbacks: set[asyncio.Task] = set()
+        self._turns = asyncio.Semaphore(config.concurrency)
+        self.dispatcher = Dispatcher(agent.config.dispatch, debounce=0.0)
 
     def _get_context(self, user_id: str) -> AgentContext:
-        if user_id not in self.contexts:
-            self.contexts[user_id] = AgentContext(user_id=user_id, platform="kakao")
-        return self.contexts[user_id]
+        return self.agent.sessions.get(user_id, "kakao")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        if scope["method"] != "POST" or scope["path"] != CHAT_PATH:
+            await send_json(send, 404, {"error": "not found"})
+            return
 
-    def run(self) -> None:
-        """Start the Kakao skill server."""
         try:
-            from flask import Flask, request, jsonify
-        except ImportError:
-            logger.error("Flask is required for Kakao platform. Install with: pip install kipbot[kakao]")
+            body = json.loads(await read_body(receive))
+        except ConnectionError:
+            return
+        except ValueError:
+            await send_json(send, 400, {"error": "invalid request body"})
             return
+        if not isinstance(body, dict):
+            await send_json(send, 400, {"error": "invalid request body"})
+            return
+
+        await send_json(send, 200, await self.handle(body))
 
-        app = Flask(__name__)
+    async def handle(self, body: dict) -> dict:
+        """Answer one skill request and return the skill response payload."""
+        user_request = _object(body, "userRequest")
+        user_id = _object(user_request, "user").get("id", "unknown")
+        utterance = user_request.get("utterance", "")
+        callback_url = user_request.get("callbackUrl")
 
-        @app.route("/kakao/chat", methods=["POST"])
-        def chat():
-            body = request.get_json()
-            user_id = body.get("userRequest", {}).get("user", {}).get("id", "unknown")
-            utterance = body.get("userRequest", {}).get("utterance", "")
+        task = self.dispatcher.submit(user_id, utterance, lambda text: self._chat(user_id, text))
 
-            context = self._get_context(user_id)
-            response = asyncio.run(self.agent.chat(context, utterance))
+        if callback_url:
+            done, _ = await asyncio.wait({task}, timeout=self.callback_after)
+            if not done:
+                callback = asyncio.create_task(self._send_callback(callback_url, task, user_id))
+                self._callbacks.add(callback)
+                callback.add_done_callback(self._callbacks.discard)
+                return {"version": "2.0", "useCallback": True, "data": {"text": CALLBACK_WAIT_TEXT}}
 
-            return jsonify({
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        {"simpleText": {"text": response}}
-                    ]
-                }
-            })
+        return _text_response(await self._result(task, user_id))
 
-        logger.info(f"Kakao skill server starting on port {self.port}...")
-        app.run(host="0.0.0.0", port=self.port)
+    async def _chat(self, user_id: str, text: str) -> str:
+        async with self._turns:
+            return await self.agent.chat(self._get_context(user_id), text)
+
+    async def _result(self, task: asyncio.Future, user_id: str) -> str:
+        try:
+            text = await task
+        except Exception as e:
+            logger.error(f"[kakao] error for {user_id}: {e}")
+            return f"Error: {e}"
+        return MERGED_TEXT if text is None else text
+
+    async def _send_callback(self, url: str, task: asyncio.Future, user_id: str) -> None:
+        text = await self._result(task, user_id)
+        if self.http is None:
+            import httpx
+
+            self.http = httpx.AsyncClient(timeout=10.0)
+        try:
+            resp = await self.http.post(url, json=_text_response(text))
+            resp.raise_for_status()
+        except Exception as e:
+            logger.error(f"[kakao] callback for {user_id} failed: {e}")
+
+    async def start(self) -> None:
+        """Serve skill requests until cancelled, then drain pending turns and callbacks."""
+        logger.info(f"Kakao skill server starting on port {self.config.port}...")
+        try:
+            await serve(self, self.config.host, self.config.port)
+        finally:
+            await self.stop()
+
+    async def stop(self) -> None:
+        """Wait for pending turns and callbacks and release resources."""
+        await self.dispatcher.drain()
+        if self._callbacks:
+            await asyncio.gather(*self._callbacks, return_exceptions=True)
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+    def run(self) -> None:
+        """Start the Kakao skill server."""
+        Supervisor(self.agent, [self]).run()
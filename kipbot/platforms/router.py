@@ -0,0 +1,151 @@
+"""Front router that forwards webhook updates to the worker owning each user."""
+
+import asyncio
+import json
+from collections.abc import Callable
+
+import httpx
+from loguru import logger
+
+from kipbot.core.config import ClusterConfig
+from kipbot.core.sharding import HashRing
+from kipbot.platforms.http import read_body, send_json, serve
+
+# Request headers passed through to the worker
+FORWARD_HEADERS = {"content-type", "x-telegram-bot-api-secret-token"}
+
+
+def _kakao_user(body: dict) -> str | None:
+    return body.get("userRequest", {}).get("user", {}).get("id")
+
+
+def _telegram_user(body: dict) -> str | None:
+    for kind in ("message", "edited_message", "callback_query", "inline_query"):
+        update = body.get(kind)
+        if update and "from" in update:
+            return str(update["from"]["id"])
+    return None
+
+
+# Path prefix -> (platform, user id extractor)
+EXTRACTORS: dict[str, tuple[str, Callable[[dict], str | None]]] = {
+    "/kakao/": ("kakao", _kakao_user),
+    "/telegram/": ("telegram", _telegram_user),
+}
+
+
+class ShardRouter:
+    """ASGI app that shards users across workers by consistent hashing.
+
+    Every update for a user goes to the same worker, so its session and
+    per-user ordering stay on one process. When the owner can't be reached the
+    update goes to the next worker on the ring, which rehydrates the session
+    from the shared session store.
+    """
+
+    def __init__(self, config: ClusterConfig) -> None:
+        if not config.workers:
+            raise ValueError("cluster.workers is empty")
+        self.config = config
+        self.ring = HashRing(config.workers, vnodes=config.vnodes)
+        self.http: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self.http is None:
+            self.http = httpx.AsyncClient(timeout=self.config.timeout)
+        return self.http
+
+    def route(self, path: str, body: dict) -> list[str]:
+        """Return the workers to try for an update, owner first."""
+        for prefix, (platform, extract) in EXTRACTORS.items():
+            if path.startswith(prefix):
+                user_id = extract(body)
+                if user_id is None:
+                    # Updates without a user carry no session, any worker will do
+                    return self.ring.preference(platform)
+                return self.ring.preference(f"{platform}:{user_id}")
+        return []
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        if scope["method"] != "POST":
+            await send_json(send, 405, {"error": "method not allowed"})
+            return
+
+        try:
+            raw = await read_body(receive)
+            body = json.loads(raw)
+        except ConnectionError:
+            return
+        except ValueError:
+            await send_json(send, 400, {"error": "invalid request body"})
+            return
+
+        workers = self.route(scope["path"], body)
+        if not workers:
+            await send_json(send, 404, {"error": "not found"})
+            return
+
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"]
+            if key.decode("latin-1").lower() in FORWARD_HEADERS
+        }
+        resp = await self._forward(workers, scope["path"], raw, headers)
+        if resp is None:
+            await send_json(send, 502, {"error": "worker unavailable"})
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": resp.status_code,
+            "headers": [
+                (b"content-type", resp.headers.get("content-type", "application/json").encode()),
+                (b"content-length", str(len(resp.content)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": resp.content})
+
+    async def _forward(
+        self, workers: list[str], path: str, body: bytes, headers: dict
+    ) -> httpx.Response | None:
+        client = self._get_client()
+        for worker in workers:
+            try:
+                return await client.post(worker.rstrip("/") + path, content=body, headers=headers)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                # The worker never saw the update, so the next one on the ring can take it
+                logger.warning(f"[router] worker {worker} unreachable: {e}")
+            except httpx.HTTPError as e:
+                logger.error(f"[router] worker {worker} failed: {e}")
+                return None
+        return None
+
+    async def start(self) -> None:
+        """Serve until interrupted."""
+        logger.info(
+            f"Shard router starting on port {self.config.port} "
+            f"for {len(self.ring)} workers..."
+        )
+        try:
+            await serve(self, self.config.host, self.config.port)
+        finally:
+            await self.stop()
+
+    async def stop(self) -> None:
+        """Release the worker connection pool."""
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+    def run(self) -> None:
+        """Start the shard router."""
+        try:
+            asyncio.run(self.start())
+        except ImportError:
+            logger.error(
+                "uvicorn is required for the router. Install with: pip install kipbot[kakao]"
+            )
+        except KeyboardInterrupt:
+            pass
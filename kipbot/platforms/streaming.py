@@ -0,0 +1,132 @@
+"""Progressive message editing for streamed replies."""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from loguru import logger
+
+FENCE = "```"
+# Separators a message may be split at, most preferred first
+SEPARATORS = ("\n\n", "\n", " ")
+
+
+def _cut(text: str, start: int, limit: int) -> tuple[int, int]:
+    """Where the chunk starting at ``start`` ends and where the next one resumes."""
+    window = text[start:start + limit + 1]
+    for sep in SEPARATORS:
+        i = window.rfind(sep)
+        # Don't trade a hard cut for a tiny chunk
+        if i > limit // 2:
+            return start + i, start + i + len(sep)
+    return start + limit, start + limit
+
+
+def _open_fence(text: str, opening: str | None) -> str | None:
+    """The opening line of the code block still open after ``text``, if any."""
+    for line in text.split("\n"):
+        line = line.strip()
+        if line.startswith(FENCE):
+            # Keep the language tag so the reopened block is highlighted the same
+            opening = None if opening is not None else line[:20]
+    return opening
+
+
+def split_message(text: str, max_length: int) -> list[str]:
+    """Split ``text`` into messages of at most ``max_length`` characters.
+
+    Messages end at a paragraph break, a line break or a space where one is
+    close enough to the limit. A code block that is cut is closed at the end
+    of one message and reopened at the start of the next, so both render.
+    """
+    chunks = []
+    opening: str | None = None
+    start = 0
+    while True:
+        prefix = "" if opening is None else opening + "\n"
+        if len(prefix) + len(text) - start <= max_length:
+            break
+        # Leave room to close a code block at the end
+        end, start_next = _cut(text, start, max_length - len(prefix) - len(FENCE) - 1)
+        body = text[start:end]
+        opening = _open_fence(body, opening)
+        chunks.append(prefix + body + ("" if opening is None else "\n" + FENCE))
+        start = start_next
+    rest = prefix + text[start:]
+    if rest.strip():
+        chunks.append(rest)
+    return chunks
+
+
+class ProgressiveReply:
+    """Show a streamed answer by sending one message and editing it as text arrives.
+
+    Edits are rate-limited to one per ``interval`` seconds and never wait on the
+    network inside :meth:`push`, so a slow edit can't hold back the stream.
+
+    Args:
+        send: Sends a new message with the given text and returns it.
+        edit: Replaces the text of a message returned by ``send``.
+        interval: Minimum seconds between edits of the same message.
+        max_length: Platform limit on the length of one message.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[Any]],
+        edit: Callable[[Any, str], Awaitable[Any]],
+        interval: float,
+        max_length: int,
+    ) -> None:
+        self.send = send
+        self.edit = edit
+        self.interval = interval
+        self.max_length = max_length
+        self.message = None
+        self._text = ""
+        self._shown = ""
+        self._last_edit = 0.0
+        self._pending: asyncio.Task | None = None
+
+    async def push(self, delta: str) -> None:
+        """Add streamed text, updating the message if the rate limit allows."""
+        self._text += delta
+        if self._pending is not None and not self._pending.done():
+            return
+        if time.monotonic() - self._last_edit < self.interval:
+            return
+        self._pending = asyncio.create_task(self._show_preview())
+
+    async def finish(self, text: str) -> None:
+        """Replace the streamed preview with the final answer."""
+        if self._pending is not None:
+            await self._pending
+        if not text:
+            return
+        chunks = split_message(text, self.max_length)
+        if not chunks:
+            return
+        await self._show(chunks[0])
+        for chunk in chunks[1:]:
+            await self.send(chunk)
+
+    async def _show_preview(self) -> None:
+        text = self._text
+        if len(text) > self.max_length:
+            text = text[:self.max_length - 3] + "..."
+        try:
+            await self._show(text)
+        except Exception as e:
+            # A dropped preview edit is harmless, the final answer replaces it
+            logger.warning(f"Failed to update streamed reply: {e}")
+
+    async def _show(self, text: str) -> None:
+        if not text.strip() or text == self._shown:
+            return
+        self._last_edit = time.monotonic()
+        if self.message is None:
+            self.message = await self.send(text)
+        else:
+            await self.edit(self.message, text)
+        self._shown = text
@@ -0,0 +1,85 @@
+"""Serve several chat platforms from one event loop and one agent."""
+
+import asyncio
+import signal
+from typing import Protocol
+
+from loguru import logger
+
+from kipbot.core.agent import Agent
+
+
+class Platform(Protocol):
+    name: str
+
+    async def start(self) -> None:
+        """Serve until cancelled, then finish queued turns and release resources."""
+
+
+class Supervisor:
+    """Run platforms side by side, sharing one agent.
+
+    The platforms share the agent's LLM connections, tools, sessions and
+    memory writer, and each caps its own concurrent turns. On SIGINT or
+    SIGTERM, or when any platform stops, every platform is cancelled: it
+    stops taking messages and finishes the turns it has queued. Turns still
+    running after ``dispatch.drain_timeout`` seconds are abandoned. The agent
+    is closed last, so memory writes are flushed.
+    """
+
+    def __init__(self, agent: Agent, platforms: list[Platform]) -> None:
+        if not platforms:
+            raise ValueError("No platform to run")
+        self.agent = agent
+        self.platforms = platforms
+
+    async def start(self) -> None:
+        """Serve until signalled or until a platform stops."""
+        await self.agent.warm_up()
+        loop = asyncio.get_running_loop()
+        stopping = asyncio.Event()
+        signals = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stopping.set)
+                signals.append(sig)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows, or not the main thread
+
+        tasks = {
+            asyncio.create_task(platform.start(), name=f"kipbot-{platform.name}"): platform
+            for platform in self.platforms
+        }
+        waiter = asyncio.create_task(stopping.wait())
+        try:
+            done, _ = await asyncio.wait([*tasks, waiter], return_when=asyncio.FIRST_COMPLETED)
+            for task in done - {waiter}:
+                name = tasks[task].name
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error(f"[{name}] stopped: {task.exception()}")
+                else:
+                    logger.info(f"[{name}] stopped")
+        finally:
+            logger.info("Shutting down, finishing queued turns...")
+            waiter.cancel()
+            for task in tasks:
+                task.cancel()
+            _, pending = await asyncio.wait(
+                tasks, timeout=self.agent.config.dispatch.drain_timeout
+            )
+            for task in pending:
+                logger.warning(f"[{tasks[task].name}] abandoning turns still running")
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+            await self.agent.close()
+
+    def run(self) -> None:
+        """Start the platforms."""
+        names = ", ".join(platform.name for platform in self.platforms)
+        logger.info(f"Serving {names}...")
+        try:
+            asyncio.run(self.start())
+        except KeyboardInterrupt:
+            pass
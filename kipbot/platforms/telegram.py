@@ -1,47 +1,167 @@
 """Telegram platform integration."""
 
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters
+import asyncio
+import hashlib
+import hmac
+import json
 
 from loguru import logger
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, filters
 
 from kipbot.core.agent import Agent, AgentContext
+from kipbot.core.config import TelegramConfig
+from kipbot.core.dispatcher import Dispatcher
+from kipbot.platforms.http import read_body, send_json, serve
+from kipbot.platforms.streaming import ProgressiveReply
+from kipbot.platforms.supervisor import Supervisor
+
+EDIT_INTERVAL = 1.0  # Telegram allows roughly one edit per second per chat
+MAX_MESSAGE_LENGTH = 4096
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+
+
+def derive_secret(token: str) -> str:
+    """Webhook secret derived from the bot token.
+
+    Every worker of the same bot derives the same one, so any of them can
+    check updates registered by another.
+    """
+    return hmac.new(token.encode(), b"kipbot-telegram-webhook", hashlib.sha256).hexdigest()
 
 
 class TelegramPlatform:
-    """Telegram bot platform."""
+    """Telegram bot platform.
+
+    Updates are handed to the dispatcher as they arrive, so a slow answer
+    only holds up later messages of the same user; at most
+    ``config.concurrency`` turns run at once. Updates come from long polling,
+    or, when ``webhook_url`` is set, from Telegram posting them to this
+    object, which is an ASGI app. Behind ``kipbot router``, only one worker
+    needs to register the webhook (``webhook_register``).
+    """
 
-    def __init__(self, agent: Agent, token: str) -> None:
+    name = "telegram"
+
+    def __init__(self, agent: Agent, config: TelegramConfig) -> None:
         self.agent = agent
-        self.token = token
-        self.contexts: dict[str, AgentContext] = {}
+        self.config = config
+        self.dispatcher = Dispatcher(agent.config.dispatch)
+        self._turns = asyncio.Semaphore(config.concurrency)
+        self.secret = config.webhook_secret or derive_secret(config.token)
+        self.app = self._build_app()
+
+    def _build_app(self) -> Application:
+        builder = Application.builder().token(self.config.token)
+        # Replies of concurrent turns shouldn't wait for a free connection
+        builder.connection_pool_size(self.config.concurrency)
+        if self.config.api_url:
+            api_url = self.config.api_url.rstrip("/")
+            builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot")
+        if self.config.webhook_url:
+            builder.updater(None)  # updates arrive through __call__
+        app = builder.build()
+        app.add_handler(CommandHandler("start", self._handle_start))
+        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self._handle_message))
+        return app
 
     def _get_context(self, user_id: str) -> AgentContext:
-        if user_id not in self.contexts:
-            self.contexts[user_id] = AgentContext(user_id=user_id, platform="telegram")
-        return self.contexts[user_id]
+        return self.agent.sessions.get(user_id, "telegram")
 
     async def _handle_start(self, update: Update, context) -> None:
         await update.message.reply_text("Hello! I'm Kipbot, your personal AI assistant.")
 
     async def _handle_message(self, update: Update, context) -> None:
         user_id = str(update.effective_user.id)
-        text = update.message.text
+        # Submitting before any await keeps a user's messages in arrival order.
+        # The newest message of a burst answers for the whole merged turn.
+        self.dispatcher.submit(
+            user_id, update.message.text, lambda text: self._respond(update, user_id, text)
+        )
 
+    async def _respond(self, update: Update, user_id: str, text: str) -> None:
         try:
-            agent_context = self._get_context(user_id)
-            response = await self.agent.chat(agent_context, text)
-            await update.message.reply_text(response)
+            async with self._turns:
+                agent_context = self._get_context(user_id)
+                reply = ProgressiveReply(
+                    send=update.message.reply_text,
+                    edit=lambda message, new_text: message.edit_text(new_text),
+                    interval=EDIT_INTERVAL,
+                    max_length=MAX_MESSAGE_LENGTH,
+                )
+                response = await self.agent.chat(agent_context, text, on_delta=reply.push)
+                await reply.finish(response)
             logger.info(f"[telegram] replied to {user_id}")
         except Exception as e:
             logger.error(f"[telegram] error for {user_id}: {e}")
             await update.message.reply_text(f"Error: {e}")
 
-    def run(self) -> None:
-        """Start the Telegram bot."""
-        app = Application.builder().token(self.token).build()
-        app.add_handler(CommandHandler("start", self._handle_start))
-        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self._handle_message))
+    async def __call__(self, scope, receive, send) -> None:
+        """Accept an update posted by Telegram to the webhook."""
+        if scope["type"] != "http":
+            return
+        if scope["path"] != self.config.webhook_path:
+            await send_json(send, 404, {"error": "not found"})
+            return
+        if scope["method"] != "POST":
+            await send_json(send, 405, {"error": "method not allowed"})
+            return
+
+        token = dict(scope["headers"]).get(SECRET_HEADER, b"")
+        if not hmac.compare_digest(token, self.secret.encode()):
+            logger.warning("[telegram] rejected webhook request with a bad secret token")
+            await send_json(send, 403, {"error": "forbidden"})
+            return
+
+        try:
+            update = Update.de_json(json.loads(await read_body(receive)), self.app.bot)
+        except ConnectionError:
+            return
+        except Exception:
+            await send_json(send, 400, {"error": "invalid update"})
+            return
+
+        # Answer right away; Telegram holds back further updates until it gets a reply
+        await self.app.update_queue.put(update)
+        await send_json(send, 200, {"ok": True})
 
+    async def start(self) -> None:
+        """Receive updates until cancelled, then finish queued turns."""
+        async with self.app:
+            if self.config.webhook_url:
+                await self._serve_webhook()
+            else:
+                await self._poll()
+
+    async def _serve_webhook(self) -> None:
+        if self.config.webhook_register:
+            url = self.config.webhook_url.rstrip("/") + self.config.webhook_path
+            await self.app.bot.set_webhook(
+                url,
+                secret_token=self.secret,
+                # Telegram's cap on parallel deliveries to one webhook
+                max_connections=min(self.config.concurrency, 100),
+            )
+        await self.app.start()
+        logger.info(f"Telegram webhook server starting on port {self.config.webhook_port}...")
+        try:
+            await serve(self, self.config.webhook_host, self.config.webhook_port)
+        finally:
+            await self.app.stop()
+            # Finish turns in progress while the bot can still send
+            await self.dispatcher.drain()
+
+    async def _poll(self) -> None:
+        await self.app.updater.start_polling()
+        await self.app.start()
         logger.info("Telegram bot starting...")
-        app.run_polling()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.app.updater.stop()
+            await self.app.stop()
+            await self.dispatcher.drain()
+
+    def run(self) -> None:
+        """Start the Telegram bot."""
+        Supervisor(self.agent, [self]).run()
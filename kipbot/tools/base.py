@@ -1,5 +1,6 @@
 """Base tool interface for kipbot agent tools."""
 
+import asyncio
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 
@@ -10,6 +11,7 @@ class ToolParam:
     type: str  # "string", "integer", "number", "boolean"
     description: str
     required: bool = True
+    items: str | None = None  # element type when type is "array"
 
 
 @dataclass
@@ -24,12 +26,17 @@ class BaseTool(ABC):
     name: str = ""
     description: str = ""
     parameters: list[ToolParam] = []
+    timeout: float | None = None  # seconds; None uses the agent-wide default
+    max_concurrency: int | None = None  # concurrent calls allowed; None means no per-tool cap
 
     @abstractmethod
     async def execute(self, **kwargs) -> ToolResult:
         """Execute the tool and return a result."""
         ...
 
+    async def close(self) -> None:
+        """Release resources such as HTTP clients. Called on agent shutdown."""
+
     def to_openai_schema(self) -> dict:
         """Convert tool definition to OpenAI function calling schema."""
         properties = {}
@@ -39,6 +46,8 @@ class BaseTool(ABC):
                 "type": param.type,
                 "description": param.description,
             }
+            if param.items:
+                properties[param.name]["items"] = {"type": param.items}
             if param.required:
                 required.append(param.name)
 
@@ -54,3 +63,26 @@ class BaseTool(ABC):
                 },
             },
         }
+
+
+class SyncTool(BaseTool):
+    """Base class for tools with blocking or CPU-bound work.
+
+    Subclasses implement :meth:`run` as a plain function. The agent runs it on
+    its tool thread pool (``execution = "thread"``) or, for CPU-heavy or
+    untrusted work, in a crash-isolated worker process with a memory limit
+    (``execution = "process"``; the tool must then be picklable).
+    """
+
+    execution: str = "thread"  # "thread" or "process"
+    max_workers: int | None = None  # process pool size; None uses tools.process_workers
+    memory_limit: int | None = None  # bytes per worker process; None uses the config
+
+    @abstractmethod
+    def run(self, **kwargs) -> ToolResult:
+        """Execute the tool synchronously and return a result."""
+        ...
+
+    async def execute(self, **kwargs) -> ToolResult:
+        """Run the tool on a worker thread, for use outside the agent."""
+        return await asyncio.to_thread(self.run, **kwargs)
@@ -1,26 +1,38 @@
 """Calculator tool for kipbot."""
 
-from kipbot.tools.base import BaseTool, ToolParam, ToolResult
+from kipbot.tools.base import SyncTool, ToolParam, ToolResult
+from kipbot.tools.mathexpr import evaluate, format_result
 
 
-class CalculatorTool(BaseTool):
+class CalculatorTool(SyncTool):
     name = "calculator"
-    description = "Evaluate a mathematical expression. Supports basic arithmetic, powers, etc."
+    description = (
+        "Evaluate a mathematical expression. Supports + - * / // % **, math functions "
+        "(sqrt, log, sin, factorial, comb, ...) and statistics (mean, median, stdev, ...). "
+        "Lists and range(...) are vectors: arithmetic and math functions apply to each "
+        "element and sum/mean/max/... reduce them, e.g. 'mean(range(1, 101) ** 2)'."
+    )
     parameters = [
-        ToolParam(name="expression", type="string", description="Math expression to evaluate (e.g., '2 + 3 * 4')"),
+        ToolParam(
+            name="expression",
+            type="string",
+            description="Math expression to evaluate (e.g., '2 + 3 * 4', 'sqrt([4, 9, 16])')",
+        ),
     ]
 
-    ALLOWED_NAMES = {
-        "abs": abs, "round": round, "min": min, "max": max,
-        "pow": pow, "int": int, "float": float,
-    }
+    # Worker processes keep runaway or memory-hungry expressions away from the bot
+    execution = "process"
+    timeout = 10.0
 
-    async def execute(self, expression: str = "", **kwargs) -> ToolResult:
+    def __init__(self, cpu_budget: float = 1.0) -> None:
+        self.cpu_budget = cpu_budget
+
+    def run(self, expression: str = "", **kwargs) -> ToolResult:
         if not expression:
             return ToolResult(success=False, output="No expression provided.")
 
         try:
-            result = eval(expression, {"__builtins__": {}}, self.ALLOWED_NAMES)  # noqa: S307
-            return ToolResult(success=True, output=str(result))
+            result = evaluate(expression, self.cpu_budget)
+            return ToolResult(success=True, output=format_result(result))
         except Exception as e:
             return ToolResult(success=False, output=f"Calculation error: {e}")
@@ -0,0 +1,203 @@
+"""Execution tiers for agent tools: event loop, thread pool and process pools."""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from loguru import logger
+
+from kipbot.core.config import ToolsConfig
+from kipbot.core.metrics import REGISTRY
+from kipbot.tools.base import BaseTool, SyncTool, ToolResult
+
+POOL_RESTARTS = REGISTRY.counter(
+    "kipbot_tool_pool_restarts_total",
+    "Tool worker pools restarted after a crash or a timed out call.",
+    ("pool",),
+)
+
+
+def _init_worker(pids, limit: int | None) -> None:
+    """Process pool initializer: report the worker's PID and cap its address space."""
+    pids.put(os.getpid())
+    if not limit:
+        return
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _run_tool(tool: SyncTool, kwargs: dict) -> ToolResult:
+    return tool.run(**kwargs)
+
+
+@dataclass
+class PoolStats:
+    size: int
+    busy: int = 0  # calls running in the pool
+    queued: int = 0  # calls waiting for a free worker
+    restarts: int = 0
+
+
+class ToolExecutor:
+    """Run tools on the tier they declare.
+
+    Async tools run on the event loop. :class:`SyncTool` subclasses run on a
+    shared thread pool, or on a process pool of their own so that a crash, a
+    runaway computation or a memory blow-up only takes down that tool's
+    workers. A process pool is restarted after a worker dies and after a call
+    is cancelled or times out, since a running process can't be interrupted
+    any other way.
+    """
+
+    def __init__(self, config: ToolsConfig) -> None:
+        self.config = config
+        self._threads: ThreadPoolExecutor | None = None
+        self._processes: dict[str, ProcessPoolExecutor] = {}
+        # Workers of each process pool report their PIDs here when they start
+        self._worker_pids: dict[str, multiprocessing.SimpleQueue] = {}
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self.stats: dict[str, PoolStats] = {}
+
+    def pool_name(self, tool: BaseTool) -> str:
+        if not isinstance(tool, SyncTool):
+            return "async"
+        if tool.execution == "process":
+            return f"process:{tool.name}"
+        return "thread"
+
+    async def run(self, tool: BaseTool, kwargs: dict) -> ToolResult:
+        """Execute ``tool`` with ``kwargs`` on its tier."""
+        if not isinstance(tool, SyncTool):
+            return await tool.execute(**kwargs)
+        if tool.execution == "process":
+            return await self._run_process(tool, kwargs)
+        if tool.execution != "thread":
+            raise ValueError(f"Unknown execution tier for {tool.name}: {tool.execution}")
+        return await self._run_thread(tool, kwargs)
+
+    async def _run_thread(self, tool: SyncTool, kwargs: dict) -> ToolResult:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                max_workers=self.config.thread_workers, thread_name_prefix="kipbot-tool"
+            )
+        loop = asyncio.get_running_loop()
+        # A thread can't be interrupted; on timeout it finishes in the background
+        return await self._acquire(
+            "thread",
+            self.config.thread_workers,
+            lambda: loop.run_in_executor(self._threads, _run_tool, tool, kwargs),
+        )
+
+    async def _run_process(self, tool: SyncTool, kwargs: dict) -> ToolResult:
+        name = self.pool_name(tool)
+        workers = tool.max_workers or self.config.process_workers
+        loop = asyncio.get_running_loop()
+        used: ProcessPoolExecutor | None = None
+
+        def submit():
+            nonlocal used
+            used = self._process_pool(tool, workers)
+            return loop.run_in_executor(used, _run_tool, tool, kwargs)
+
+        def abort() -> None:
+            # Timed out or abandoned: stop the worker instead of letting it run on
+            self._restart(name, used)
+
+        # A pool restarted for another call breaks this one too, so retry once
+        for _ in range(2):
+            try:
+                return await self._acquire(name, workers, submit, on_cancel=abort)
+            except MemoryError:
+                # Raised inside the worker by the address-space limit
+                return ToolResult(success=False, output="Tool exceeded its memory limit")
+            except BrokenProcessPool:
+                logger.error(f"Worker process of {tool.name} died, restarting its pool")
+                self._restart(name, used)
+        return ToolResult(success=False, output="Tool worker crashed (out of memory?)")
+
+    async def _acquire(self, name: str, size: int, submit, on_cancel=None) -> ToolResult:
+        slots = self._slots.get(name)
+        if slots is None:
+            slots = self._slots[name] = asyncio.Semaphore(size)
+            self.stats[name] = PoolStats(size=size)
+        stats = self.stats[name]
+        stats.queued += 1
+        try:
+            await slots.acquire()
+        finally:
+            stats.queued -= 1
+        stats.busy += 1
+        try:
+            return await submit()
+        except asyncio.CancelledError:
+            if on_cancel is not None:
+                on_cancel()
+            raise
+        finally:
+            stats.busy -= 1
+            slots.release()
+
+    def _process_pool(self, tool: SyncTool, workers: int) -> ProcessPoolExecutor:
+        name = self.pool_name(tool)
+        pool = self._processes.get(name)
+        if pool is None:
+            # Forking a process that runs an event loop and threads is unsafe
+            context = multiprocessing.get_context("spawn")
+            pids = context.SimpleQueue()
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(pids, tool.memory_limit or self.config.process_memory_limit),
+            )
+            self._processes[name] = pool
+            self._worker_pids[name] = pids
+        return pool
+
+    def _restart(self, name: str, pool: ProcessPoolExecutor | None) -> None:
+        """Stop ``pool``; the next call for ``name`` starts a fresh one."""
+        if pool is None or self._processes.get(name) is not pool:
+            return  # already replaced after an earlier failure
+        del self._processes[name]
+        pids = self._worker_pids.pop(name)
+        # ProcessPoolExecutor has no public way to stop a busy worker
+        while not pids.empty():
+            try:
+                os.kill(pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass  # exited already
+        pids.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+        self.stats[name].restarts += 1
+        POOL_RESTARTS.inc(pool=name)
+
+    def collect_metrics(self) -> None:
+        """Copy pool saturation into the metrics registry."""
+        size = REGISTRY.gauge("kipbot_tool_pool_size", "Workers in a tool pool.", ("pool",))
+        busy = REGISTRY.gauge("kipbot_tool_pool_busy", "Busy workers in a tool pool.", ("pool",))
+        queued = REGISTRY.gauge(
+            "kipbot_tool_pool_queued", "Tool calls waiting for a pool worker.", ("pool",)
+        )
+        for name, stats in list(self.stats.items()):
+            size.set(stats.size, pool=name)
+            busy.set(stats.busy, pool=name)
+            queued.set(stats.queued, pool=name)
+
+    async def close(self) -> None:
+        """Shut down all pools."""
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        for pool in self._processes.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._processes.clear()
+        for pids in self._worker_pids.values():
+            pids.close()
+        self._worker_pids.clear()
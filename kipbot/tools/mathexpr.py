@@ -0,0 +1,348 @@
+"""Safe, bounded evaluation of math expressions for the calculator tool.
+
+Expressions are parsed with :mod:`ast`, checked against a whitelist of node
+types, names and functions, and compiled into a tree of closures that is
+cached per expression. Evaluation enforces limits on integer size, sequence
+length and CPU time, so no expression can pin the process.
+
+Lists and ranges are vectors: arithmetic and single-value functions apply
+element-wise (``range(1, 6) ** 2``, ``sqrt([4, 9])``), and aggregate
+functions reduce them (``mean(range(1, 101))``). NumPy is used for vector
+arithmetic when it is installed.
+"""
+
+import ast
+import math
+import statistics
+import time
+from collections.abc import Callable
+from functools import lru_cache
+from typing import Any
+
+try:
+    import numpy as np
+except ImportError:  # optional, vectors fall back to plain lists
+    np = None
+
+MAX_EXPRESSION_LENGTH = 2000
+MAX_NODES = 500
+MAX_INT_BITS = 4096  # about 1233 decimal digits
+MAX_ITEMS = 100_000  # elements of one vector
+MAX_FACTORIAL = 1000
+MAX_OUTPUT_ITEMS = 100
+CHECK_EVERY = 1024  # elements between CPU budget checks in vector loops
+
+
+class MathError(ValueError):
+    """The expression is not allowed or exceeds a limit."""
+
+
+class _Budget:
+    def __init__(self, seconds: float) -> None:
+        self.deadline = time.thread_time() + seconds
+
+    def check(self) -> None:
+        if time.thread_time() > self.deadline:
+            raise MathError("CPU time budget exceeded")
+
+
+Compiled = Callable[[_Budget], Any]
+
+
+def _is_vector(value) -> bool:
+    return isinstance(value, list) or (np is not None and isinstance(value, np.ndarray))
+
+
+def _to_list(value) -> list:
+    if np is not None and isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+def _check_int(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise MathError(f"integer result exceeds {MAX_INT_BITS} bits")
+    return value
+
+
+def _check_length(length: int) -> None:
+    if length > MAX_ITEMS:
+        raise MathError(f"sequences are limited to {MAX_ITEMS} elements")
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        if np is not None and isinstance(value, np.generic):
+            return value.item()
+        raise MathError(f"expected a number, got {type(value).__name__}")
+    return value
+
+
+# Scalar operators with magnitude checks done before the work, not after
+
+
+def _mul(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        if a.bit_length() + b.bit_length() > MAX_INT_BITS + 1:
+            raise MathError(f"integer result exceeds {MAX_INT_BITS} bits")
+    return a * b
+
+
+def _pow(a, b):
+    if isinstance(a, int) and isinstance(b, int) and b > 0 and abs(a) > 1:
+        if (b - 1) * (a.bit_length() - 1) > MAX_INT_BITS:
+            raise MathError(f"integer result exceeds {MAX_INT_BITS} bits")
+    result = a ** b
+    if isinstance(result, complex):
+        raise MathError("result is a complex number")
+    return _check_int(result)
+
+
+SCALAR_OPS: dict[type, Callable] = {
+    ast.Add: lambda a, b: _check_int(a + b),
+    ast.Sub: lambda a, b: _check_int(a - b),
+    ast.Mult: _mul,
+    ast.Div: lambda a, b: a / b,
+    ast.FloorDiv: lambda a, b: a // b,
+    ast.Mod: lambda a, b: a % b,
+    ast.Pow: _pow,
+}
+
+VECTOR_OPS: dict[type, Callable] = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+    ast.FloorDiv: lambda a, b: a // b,
+    ast.Mod: lambda a, b: a % b,
+    ast.Pow: lambda a, b: a ** b,
+}
+
+
+def _binary(op: type, a, b, budget: _Budget):
+    if not (_is_vector(a) or _is_vector(b)):
+        return SCALAR_OPS[op](_number(a), _number(b))
+
+    if np is not None:
+        # float64 keeps results finite and bounded; ints can't silently wrap around
+        with np.errstate(all="ignore"):
+            return VECTOR_OPS[op](np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+
+    func = SCALAR_OPS[op]
+    if _is_vector(a) and _is_vector(b):
+        if len(a) != len(b):
+            raise MathError(f"vector lengths differ ({len(a)} and {len(b)})")
+        pairs = zip(a, b)
+    elif _is_vector(a):
+        pairs = ((x, b) for x in a)
+    else:
+        pairs = ((a, y) for y in b)
+    result = []
+    for i, (x, y) in enumerate(pairs):
+        if i % CHECK_EVERY == 0:
+            budget.check()
+        result.append(func(_number(x), _number(y)))
+    return result
+
+
+# Functions ------------------------------------------------------------------
+
+
+def _factorial(n):
+    if not isinstance(n, int) or n > MAX_FACTORIAL:
+        raise MathError(f"factorial is limited to integers up to {MAX_FACTORIAL}")
+    return math.factorial(n)
+
+
+def _comb(n, k):
+    if n > MAX_FACTORIAL:
+        raise MathError(f"comb is limited to n <= {MAX_FACTORIAL}")
+    return math.comb(n, k)
+
+
+def _perm(n, k=None):
+    if n > MAX_FACTORIAL:
+        raise MathError(f"perm is limited to n <= {MAX_FACTORIAL}")
+    return math.perm(n, k)
+
+
+def _round(x, digits=None):
+    return round(x, digits) if digits is not None else round(x)
+
+
+def _prod(values):
+    result = 1
+    for value in values:
+        result = _mul(result, _number(value))
+    return result
+
+
+def _range(*args):
+    if not all(isinstance(_number(a), int) for a in args):
+        raise MathError("range() takes integers")
+    values = range(*args)
+    _check_length(len(values))
+    return list(values)
+
+
+def _linspace(start, stop, num=50):
+    if not isinstance(num, int) or num < 1:
+        raise MathError("linspace() needs a positive integer count")
+    _check_length(num)
+    if num == 1:
+        return [float(start)]
+    step = (stop - start) / (num - 1)
+    return [start + i * step for i in range(num)]
+
+
+# Applied to each element of a vector; extra arguments stay scalar
+ELEMENTWISE: dict[str, Callable] = {
+    "abs": abs, "round": _round, "int": int, "float": float,
+    "sqrt": math.sqrt, "exp": math.exp, "log": math.log, "log10": math.log10,
+    "log2": math.log2, "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "asin": math.asin, "acos": math.acos, "atan": math.atan, "sinh": math.sinh,
+    "cosh": math.cosh, "tanh": math.tanh, "floor": math.floor, "ceil": math.ceil,
+    "trunc": math.trunc, "degrees": math.degrees, "radians": math.radians,
+    "isqrt": math.isqrt, "factorial": _factorial,
+}
+
+# Take scalars only
+SCALAR: dict[str, Callable] = {
+    "pow": _pow, "atan2": math.atan2, "hypot": math.hypot, "gcd": math.gcd,
+    "lcm": math.lcm, "comb": _comb, "perm": _perm,
+}
+
+# Reduce a vector, or their arguments when given several
+AGGREGATE: dict[str, Callable] = {
+    "sum": math.fsum, "min": min, "max": max, "len": len, "prod": _prod,
+    "mean": statistics.fmean, "median": statistics.median, "mode": statistics.mode,
+    "stdev": statistics.stdev, "pstdev": statistics.pstdev,
+    "variance": statistics.variance, "pvariance": statistics.pvariance,
+}
+
+# Build vectors
+VECTOR: dict[str, Callable] = {
+    "range": _range, "linspace": _linspace, "sorted": lambda v: sorted(_to_list(v)),
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau, "inf": math.inf}
+
+
+def _call(name: str, args: list, budget: _Budget):
+    if name in ELEMENTWISE:
+        func = ELEMENTWISE[name]
+        if args and _is_vector(args[0]):
+            rest = [_number(a) for a in args[1:]]
+            result = []
+            for i, x in enumerate(_to_list(args[0])):
+                if i % CHECK_EVERY == 0:
+                    budget.check()
+                result.append(_check_int(func(_number(x), *rest)))
+            return result
+        return _check_int(func(*(_number(a) for a in args)))
+    if name in SCALAR:
+        return _check_int(SCALAR[name](*(_number(a) for a in args)))
+    if name in AGGREGATE:
+        values = _to_list(args[0]) if len(args) == 1 and _is_vector(args[0]) else args
+        if name == "sum" and all(isinstance(v, int) for v in values):
+            return _check_int(sum(values))
+        return _check_int(AGGREGATE[name]([_number(v) for v in values]))
+    return VECTOR[name](*args)
+
+
+# Compilation ------------------------------------------------------------------
+
+
+FUNCTIONS = ELEMENTWISE.keys() | SCALAR.keys() | AGGREGATE.keys() | VECTOR.keys()
+
+
+def _compile(node: ast.AST) -> Compiled:
+    if isinstance(node, ast.Expression):
+        return _compile(node.body)
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, int | float):
+            raise MathError(f"unsupported literal: {value!r}")
+        _check_int(value)
+        return lambda budget: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in CONSTANTS:
+            raise MathError(f"unknown name: {node.id}")
+        value = CONSTANTS[node.id]
+        return lambda budget: value
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.UAdd | ast.USub):
+        operand = _compile(node.operand)
+        sign = -1 if isinstance(node.op, ast.USub) else 1
+        return lambda budget: _binary(ast.Mult, operand(budget), sign, budget)
+
+    if isinstance(node, ast.BinOp) and type(node.op) in SCALAR_OPS:
+        op = type(node.op)
+        left, right = _compile(node.left), _compile(node.right)
+
+        def binary(budget: _Budget):
+            budget.check()
+            return _binary(op, left(budget), right(budget), budget)
+
+        return binary
+
+    if isinstance(node, ast.List | ast.Tuple):
+        _check_length(len(node.elts))
+        elements = [_compile(elt) for elt in node.elts]
+        return lambda budget: [_number(element(budget)) for element in elements]
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            name = node.func.id if isinstance(node.func, ast.Name) else ast.unparse(node.func)
+            raise MathError(f"unknown function: {name}")
+        if node.keywords or any(isinstance(arg, ast.Starred) for arg in node.args):
+            raise MathError("functions take positional arguments only")
+        name = node.func.id
+        args = [_compile(arg) for arg in node.args]
+
+        def call(budget: _Budget):
+            budget.check()
+            return _call(name, [arg(budget) for arg in args], budget)
+
+        return call
+
+    raise MathError(f"unsupported syntax: {type(node).__name__}")
+
+
+@lru_cache(maxsize=512)
+def compile_expression(expression: str) -> Compiled:
+    """Parse, validate and compile an expression; results are cached."""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise MathError(f"expressions are limited to {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise MathError(f"invalid syntax: {e.msg}") from None
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise MathError("expression is too complex")
+    return _compile(tree)
+
+
+def evaluate(expression: str, cpu_budget: float = 1.0):
+    """Evaluate an expression within ``cpu_budget`` seconds of CPU time.
+
+    Raises MathError for disallowed syntax or exceeded limits, and the usual
+    arithmetic errors such as ZeroDivisionError or ValueError.
+    """
+    try:
+        result = compile_expression(expression)(_Budget(cpu_budget))
+    except OverflowError:
+        raise MathError("result is too large") from None
+    return _to_list(result) if _is_vector(result) else _number(result)
+
+
+def format_result(value) -> str:
+    """Render a result, shortening long vectors."""
+    if isinstance(value, list):
+        shown = ", ".join(format_result(v) for v in value[:MAX_OUTPUT_ITEMS])
+        if len(value) > MAX_OUTPUT_ITEMS:
+            shown += f", ... ({len(value)} values)"
+        return f"[{shown}]"
+    return str(value)
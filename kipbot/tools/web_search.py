@@ -1,42 +1,106 @@
 """Web search tool for kipbot."""
 
-import httpx
+import asyncio
 
 from kipbot.tools.base import BaseTool, ToolParam, ToolResult
 
 
 class WebSearchTool(BaseTool):
     name = "web_search"
-    description = "Search the web for current information on any topic."
+    description = (
+        "Search the web for current information on any topic. "
+        "Pass several queries at once to search them in parallel."
+    )
     parameters = [
-        ToolParam(name="query", type="string", description="The search query"),
+        ToolParam(name="query", type="string", description="The search query", required=False),
+        ToolParam(
+            name="queries",
+            type="array",
+            items="string",
+            description="Several search queries to run in parallel",
+            required=False,
+        ),
     ]
 
-    def __init__(self, api_key: str = "", engine: str = "google") -> None:
+    def __init__(
+        self,
+        api_key: str = "",
+        engine: str = "google",
+        base_url: str = "https://api.tavily.com",
+        max_results: int = 5,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        http2: bool = True,
+        request_timeout: float = 10.0,
+    ) -> None:
         self.api_key = api_key
         self.engine = engine
+        self.base_url = base_url
+        self.max_results = max_results
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.http2 = http2
+        self.request_timeout = request_timeout
+        self._client = None
 
-    async def execute(self, query: str = "", **kwargs) -> ToolResult:
+    def _get_client(self):
+        """Return the shared keep-alive client, creating it on first use."""
+        if self._client is None or self._client.is_closed:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,  # needs h2, installed by the httpx[http2] dependency
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                ),
+                timeout=self.request_timeout,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def execute(self, query: str = "", queries: list | None = None, **kwargs) -> ToolResult:
         if not self.api_key:
             return ToolResult(success=False, output="Web search API key not configured.")
 
+        if isinstance(queries, str):
+            queries = [queries]
+        all_queries = list(dict.fromkeys(q for q in [query, *(queries or [])] if q))
+        if not all_queries:
+            return ToolResult(success=False, output="No query provided.")
+
         # Tavily search API integration
-        try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(
-                    "https://api.tavily.com/search",
-                    json={"api_key": self.api_key, "query": query, "max_results": 5},
-                    timeout=10.0,
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                results = data.get("results", [])
-                if not results:
-                    return ToolResult(success=True, output="No results found.")
-                output = "\n\n".join(
-                    f"**{r['title']}**\n{r['url']}\n{r.get('content', '')[:300]}"
-                    for r in results
-                )
-                return ToolResult(success=True, output=output)
-        except Exception as e:
-            return ToolResult(success=False, output=f"Search failed: {e}")
+        outcomes = await asyncio.gather(
+            *(self._search(q) for q in all_queries), return_exceptions=True
+        )
+
+        seen_urls: set[str] = set()
+        sections = []
+        failures = 0
+        for q, outcome in zip(all_queries, outcomes):
+            if isinstance(outcome, Exception):
+                failures += 1
+                body = f"Search failed: {outcome}"
+            else:
+                fresh = [r for r in outcome if not r.get("url") or r["url"] not in seen_urls]
+                seen_urls.update(r["url"] for r in fresh if r.get("url"))
+                body = "\n\n".join(
+                    f"**{r.get('title', '')}**\n{r.get('url', '')}\n{r.get('content', '')[:300]}"
+                    for r in fresh
+                ) or "No results found."
+            sections.append(body if len(all_queries) == 1 else f"### {q}\n{body}")
+
+        return ToolResult(success=failures < len(all_queries), output="\n\n".join(sections))
+
+    async def _search(self, query: str) -> list[dict]:
+        resp = await self._get_client().post(
+            "/search",
+            json={"api_key": self.api_key, "query": query, "max_results": self.max_results},
+        )
+        resp.raise_for_status()
+        return resp.json().get("results", [])
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import os
+import socket
+from pathlib import Path
+
+import pytest
+
+# litellm otherwise fetches its model cost map over the network on import
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+BENCH_BASELINE = Path(__file__).parent / "bench_baseline.json"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench-save",
+        action="store_true",
+        help="Rewrite tests/bench_baseline.json with the results of the bench tests",
+    )
+    parser.addoption(
+        "--bench-tolerance",
+        type=float,
+        default=1.0,
+        help="Allowed relative slowdown of a bench metric against the baseline",
+    )
+
+
+@pytest.fixture(scope="session")
+def bench_baseline(request):
+    """The checked-in bench results; updated on teardown with ``--bench-save``."""
+    baseline = json.loads(BENCH_BASELINE.read_text(encoding="utf-8"))
+    results: dict = {}
+    yield baseline, results
+    if request.config.getoption("--bench-save") and results:
+        baseline.update(results)
+        BENCH_BASELINE.write_text(json.dumps(baseline, indent=2) + "\n", encoding="utf-8")
+
+
+@pytest.fixture
+async def serve():
+    """Start an ASGI app on a free local port and return its base URL."""
+    import uvicorn
+
+    servers = []
+
+    async def start(app) -> str:
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        config = uvicorn.Config(app, lifespan="off", log_level="warning")
+        server = uvicorn.Server(config)
+        task = asyncio.create_task(server.serve(sockets=[sock]))
+        servers.append((server, task))
+        while not server.started:
+            await asyncio.sleep(0.01)
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    yield start
+    for server, task in servers:
+        server.should_exit = True
+        await task
@@ -0,0 +1,74 @@
+"""Benchmarks of kipbot's own overhead, checked against tests/bench_baseline.json.
+
+They are deselected by default; run them with ``pytest -m bench`` and refresh
+the baseline on a quiet machine with ``pytest -m bench --bench-save``. The
+scenarios are small versions of ``kipbot bench``, and the baseline uses the
+same format as ``kipbot bench --save``.
+"""
+
+import pytest
+
+from kipbot.bench.fake import FakeLLMConfig
+from kipbot.bench.runner import (
+    HIGHER_IS_BETTER,
+    LoadOptions,
+    bench_build_messages,
+    bench_memory_load,
+    bench_memory_search,
+    bench_startup,
+    compare,
+    run_load,
+)
+
+pytestmark = pytest.mark.bench
+
+
+async def _startup() -> dict:
+    return bench_startup()[0]
+
+
+async def _agent() -> dict:
+    fake = FakeLLMConfig(latency=0.05, tokens=50, token_rate=2000.0)
+    return await run_load("agent", LoadOptions(users=200, messages=2), fake)
+
+
+async def _build_messages() -> dict:
+    return bench_build_messages([10, 100])
+
+
+# Scenario -> (benchmark, rounds); the best value of each metric over the rounds counts
+SCENARIOS = {
+    "startup": (_startup, 3),
+    "agent_small": (_agent, 1),
+    "memory_load": (lambda: bench_memory_load([1_000, 10_000]), 5),
+    "memory_search": (lambda: bench_memory_search([1_000]), 3),
+    "build_messages": (_build_messages, 5),
+}
+
+
+def _best(runs: list[dict]) -> dict:
+    return {
+        name: (max if name in HIGHER_IS_BETTER else min)(run[name] for run in runs)
+        for name in runs[0]
+    }
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+async def test_no_regression(scenario, bench_baseline, request):
+    baseline, results = bench_baseline
+    bench, rounds = SCENARIOS[scenario]
+    metrics = _best([await bench() for _ in range(rounds)])
+    results[scenario] = metrics
+    if request.config.getoption("--bench-save"):
+        return
+
+    assert metrics.get("errors", 0) == 0
+    assert scenario in baseline, "no baseline yet, run with --bench-save"
+    tolerance = request.config.getoption("--bench-tolerance")
+    rows = compare({scenario: metrics}, baseline, tolerance)
+    regressions = [
+        f"{row['metric']}: {row['baseline']:,.2f} -> {row['current']:,.2f} ({row['change']:+.0%})"
+        for row in rows
+        if row["regressed"]
+    ]
+    assert not regressions, "; ".join(regressions)
@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+import pytest
+
+from kipbot.core.config import Config, DiscordConfig
+from kipbot.platforms.discord_bot import DiscordPlatform
+
+
+def _agent(backend: str):
+    return SimpleNamespace(config=Config(memory={"backend": backend}))
+
+
+def test_shards_over_processes_need_shared_memory():
+    config = DiscordConfig(shard_count=4, shard_ids=[0, 1])
+    with pytest.raises(ValueError, match="sqlite"):
+        DiscordPlatform(_agent("local"), config)
+    DiscordPlatform(_agent("sqlite"), config)
+
+
+def test_all_shards_in_one_process_may_use_local_memory():
+    DiscordPlatform(_agent("local"), DiscordConfig(shard_count=2, shard_ids=[0, 1]))
+    DiscordPlatform(_agent("local"), DiscordConfig(sharded=True))
@@ -0,0 +1,125 @@
+import asyncio
+import gc
+import time
+
+import pytest
+
+from kipbot.core.config import DispatchConfig
+from kipbot.core.dispatcher import Dispatcher
+
+
+class Recorder:
+    """Turn handler factory that records each turn and can be slowed down."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.turns: list[tuple[str, str]] = []
+        self.active: set[str] = set()
+        self.overlaps = 0
+        self.peak = 0
+
+    def handler(self, key: str):
+        async def handle(text: str) -> str:
+            if key in self.active:
+                self.overlaps += 1
+            self.active.add(key)
+            self.peak = max(self.peak, len(self.active))
+            self.turns.append((key, text))
+            try:
+                await asyncio.sleep(self.delay)
+            finally:
+                self.active.discard(key)
+            return f"answer to {text}"
+
+        return handle
+
+
+def texts(recorder: Recorder, key: str) -> list[str]:
+    return [text for k, text in recorder.turns if k == key]
+
+
+async def test_users_run_concurrently_each_in_order():
+    dispatcher = Dispatcher(DispatchConfig(debounce=0.0))
+    recorder = Recorder(delay=0.02)
+    for i in range(3):
+        for key in ("a", "b", "c"):
+            dispatcher.submit(key, f"{key}{i}", recorder.handler(key))
+    await dispatcher.drain()
+
+    assert recorder.overlaps == 0
+    assert recorder.peak == 3
+    for key in ("a", "b", "c"):
+        # The first message starts a turn; the rest arrive while it runs and merge
+        assert "\n".join(texts(recorder, key)).split("\n") == [f"{key}{i}" for i in range(3)]
+
+
+async def test_burst_within_debounce_is_one_turn():
+    dispatcher = Dispatcher(DispatchConfig(debounce=0.05, max_delay=1.0))
+    recorder = Recorder()
+    futures = []
+    for text in ("hi", "are you", "there?"):
+        futures.append(dispatcher.submit("a", text, recorder.handler("a")))
+        await asyncio.sleep(0.01)
+    await dispatcher.drain()
+
+    assert recorder.turns == [("a", "hi\nare you\nthere?")]
+    # The newest message answers for the merged turn
+    assert [f.result() for f in futures] == [None, None, "answer to hi\nare you\nthere?"]
+
+
+async def test_max_delay_ends_a_long_burst():
+    dispatcher = Dispatcher(DispatchConfig(debounce=0.1, max_delay=0.15))
+    recorder = Recorder()
+    start = time.monotonic()
+    for i in range(8):
+        dispatcher.submit("a", f"m{i}", recorder.handler("a"))
+        await asyncio.sleep(0.05)
+    await dispatcher.drain()
+
+    assert len(recorder.turns) > 1
+    assert "\n".join(texts(recorder, "a")).split("\n") == [f"m{i}" for i in range(8)]
+    assert time.monotonic() - start < 1.0
+
+
+async def test_messages_during_a_turn_merge_into_the_next():
+    dispatcher = Dispatcher(DispatchConfig(debounce=0.0))
+    recorder = Recorder(delay=0.1)
+    dispatcher.submit("a", "first", recorder.handler("a"))
+    await asyncio.sleep(0.02)  # the first turn is running
+    dispatcher.submit("a", "second", recorder.handler("a"))
+    dispatcher.submit("a", "third", recorder.handler("a"))
+    await dispatcher.drain()
+
+    assert recorder.turns == [("a", "first"), ("a", "second\nthird")]
+
+
+async def test_drain_waits_for_queued_turns():
+    dispatcher = Dispatcher(DispatchConfig(debounce=0.0))
+    recorder = Recorder(delay=0.05)
+    futures = [dispatcher.submit(f"u{i}", "hello", recorder.handler(f"u{i}")) for i in range(5)]
+    await dispatcher.drain()
+
+    assert all(f.done() for f in futures)
+    assert len(recorder.turns) == 5
+    assert len(dispatcher) == 0
+
+
+async def test_failed_turn_reaches_the_future_and_is_not_left_unretrieved():
+    loop = asyncio.get_running_loop()
+    errors = []
+    loop.set_exception_handler(lambda loop, context: errors.append(context))
+    dispatcher = Dispatcher(DispatchConfig(debounce=0.0))
+
+    async def fail(text: str) -> None:
+        raise RuntimeError("reply failed")
+
+    awaited = dispatcher.submit("a", "hi", fail)
+    dispatcher.submit("b", "hi", fail)  # fire and forget, like Telegram and Discord
+    await dispatcher.drain()
+    with pytest.raises(RuntimeError, match="reply failed"):
+        await awaited
+    gc.collect()
+    await asyncio.sleep(0)
+
+    loop.set_exception_handler(None)
+    assert errors == []
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from kipbot.core.config import ToolsConfig
+from kipbot.tools.base import SyncTool, ToolResult
+from kipbot.tools.executor import ToolExecutor
+
+
+class PidTool(SyncTool):
+    """Reports its worker's PID, after sleeping for ``delay`` seconds."""
+
+    name = "pid"
+    execution = "process"
+    max_workers = 1
+
+    def run(self, delay: float = 0.0) -> ToolResult:
+        time.sleep(delay)
+        return ToolResult(success=True, output=str(os.getpid()))
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.fixture
+async def executor():
+    executor = ToolExecutor(ToolsConfig())
+    yield executor
+    await executor.close()
+
+
+async def test_timed_out_worker_is_stopped(executor):
+    tool = PidTool()
+    pid = int((await executor.run(tool, {})).output)
+
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(executor.run(tool, {"delay": 30}), timeout=0.5)
+
+    for _ in range(50):
+        if not alive(pid):
+            break
+        await asyncio.sleep(0.1)
+    assert not alive(pid)
+    assert executor.stats["process:pid"].restarts == 1
+
+    # The next call gets a fresh worker
+    result = await executor.run(tool, {})
+    assert result.success and int(result.output) != pid
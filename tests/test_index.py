@@ -0,0 +1,108 @@
+import asyncio
+
+from kipbot.core.config import MemoryConfig, RetrievalConfig
+from kipbot.memory.index import MemoryIndex, UserIndex, tokenize
+from kipbot.memory.store import MemoryStore
+
+
+def turn(user: str, assistant: str = "ok", ts: float = 0.0) -> dict:
+    return {"user": user, "assistant": assistant, "ts": ts}
+
+
+def test_best_match_ranks_first():
+    index = UserIndex()
+    index.add(0, turn("I like hiking in the Alps"))
+    index.add(1, turn("What is the weather today?", "Sunny and warm"))
+    index.add(2, turn("Book a table for dinner"))
+    index.add(3, turn("More hiking trails in the Alps near Zermatt", "Try the Gornergrat trail"))
+
+    assert index.search("alps hiking zermatt", 2) == [3, 0]
+    assert index.search("weather", 5) == [1]
+    assert index.search("nothing matches", 5) == []
+
+
+def test_newer_turn_wins_a_tie_and_old_refs_are_ignored():
+    index = UserIndex()
+    index.add(5, turn("coffee"))
+    index.add(9, turn("coffee"))
+    index.add(7, turn("tea"))  # older than the last ref: already indexed
+
+    assert index.search("coffee", 1) == [9]
+    assert index.search("tea", 1) == []
+    assert len(index) == 2
+
+
+def test_korean_words_match_across_endings():
+    assert "날씨" in tokenize("날씨가 좋네요")
+    index = UserIndex()
+    index.add(0, turn("오늘 날씨가 어때?"))
+    index.add(1, turn("점심 메뉴 추천해줘"))
+    assert index.search("날씨는", 1) == [0]
+
+
+def test_least_recently_used_index_is_dropped():
+    indexes = MemoryIndex(RetrievalConfig(max_users=2))
+    for user_id in ("a", "b"):
+        indexes.install(user_id, UserIndex())
+    indexes.get("a")  # now b is the least recently used
+    indexes.install("c", UserIndex())
+
+    assert indexes.get("b") is None
+    assert indexes.get("a") is not None and indexes.get("c") is not None
+    assert len(indexes) == 2
+
+
+async def test_slow_build_starts_without_the_index():
+    indexes = MemoryIndex(RetrievalConfig(build_timeout=0.05))
+    built = asyncio.Event()
+
+    async def build(user_id: str) -> None:
+        await asyncio.sleep(0.2)
+        indexes.install(user_id, UserIndex())
+        built.set()
+
+    assert await indexes.load("u1", build) is None
+    # The build carries on in the background and serves later calls
+    await asyncio.wait_for(built.wait(), 1.0)
+    assert await indexes.load("u1", build) is not None
+    await indexes.close()
+
+
+async def test_writer_keeps_a_built_index_current(tmp_path):
+    store = MemoryStore(MemoryConfig(path=str(tmp_path)))
+    try:
+        await store.save("u1", "I like hiking in the Alps", "Noted")
+        await store.save("u1", "What is the weather today?", "Sunny")
+        await store.flush()
+        assert [e["user"] for e in await store.search("u1", "alps", 5)] == [
+            "I like hiking in the Alps"
+        ]
+        index = store.index.get("u1")
+
+        await store.save("u1", "Any restaurants in Zermatt?", "Try the fondue place")
+        await store.flush()
+        results = await store.search("u1", "zermatt fondue", 5)
+
+        assert store.index.get("u1") is index  # updated in place, not rebuilt
+        assert [e["user"] for e in results] == ["Any restaurants in Zermatt?"]
+    finally:
+        await store.close()
+
+
+async def test_store_search_is_empty_until_a_slow_build_finishes(tmp_path):
+    config = MemoryConfig(path=str(tmp_path))
+    config.retrieval.build_timeout = 0.0
+    store = MemoryStore(config)
+    try:
+        await store.save("u1", "I like hiking in the Alps", "Noted")
+        await store.flush()
+        assert await store.search("u1", "alps", 5) == []
+        for _ in range(100):
+            if store.index.get("u1") is not None:
+                break
+            await asyncio.sleep(0.01)
+        assert [e["user"] for e in await store.search("u1", "alps", 5)] == [
+            "I like hiking in the Alps"
+        ]
+    finally:
+        await store.close()
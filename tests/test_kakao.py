@@ -0,0 +1,70 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+from kipbot.core.config import Config, KakaoConfig
+from kipbot.platforms.kakao import CALLBACK_WAIT_TEXT, KakaoPlatform
+
+
+def _agent(delay: float):
+    async def chat(context, text, on_delta=None):
+        await asyncio.sleep(delay)
+        return f"echo: {text}"
+
+    return SimpleNamespace(
+        config=Config(),
+        sessions=SimpleNamespace(get=lambda user_id, platform: user_id),
+        chat=chat,
+    )
+
+
+def _request(text: str, callback_url: str | None = None) -> dict:
+    user_request = {"user": {"id": "u1"}, "utterance": text}
+    if callback_url:
+        user_request["callbackUrl"] = callback_url
+    return {"userRequest": user_request}
+
+
+async def _post(platform: KakaoPlatform, body) -> httpx.Response:
+    transport = httpx.ASGITransport(app=platform)
+    async with httpx.AsyncClient(transport=transport, base_url="http://kakao") as client:
+        content = body if isinstance(body, bytes) else json.dumps(body)
+        return await client.post("/kakao/chat", content=content)
+
+
+async def test_fast_answer_is_returned_inline():
+    platform = KakaoPlatform(_agent(0.0), KakaoConfig(callback_after=1.0))
+    resp = await _post(platform, _request("hi", "http://unused.invalid/cb"))
+    assert resp.status_code == 200
+    assert resp.json()["template"]["outputs"][0]["simpleText"]["text"] == "echo: hi"
+
+
+async def test_slow_answer_goes_to_the_callback(serve):
+    received = asyncio.Queue()
+
+    async def receiver(scope, receive, send):
+        message = await receive()
+        await received.put((scope["path"], json.loads(message["body"])))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    base_url = await serve(receiver)
+    platform = KakaoPlatform(_agent(0.3), KakaoConfig(callback_after=0.05))
+    resp = await _post(platform, _request("slow", f"{base_url}/callback"))
+    assert resp.json()["useCallback"] is True
+    assert resp.json()["data"]["text"] == CALLBACK_WAIT_TEXT
+
+    path, payload = await asyncio.wait_for(received.get(), timeout=5)
+    assert path == "/callback"
+    assert payload["template"]["outputs"][0]["simpleText"]["text"] == "echo: slow"
+    await platform.stop()
+
+
+async def test_invalid_bodies_are_rejected():
+    platform = KakaoPlatform(_agent(0.0), KakaoConfig())
+    assert (await _post(platform, b"not json")).status_code == 400
+    assert (await _post(platform, [1, 2])).status_code == 400
+    resp = await _post(platform, {"userRequest": [1], "utterance": "x"})
+    assert resp.status_code == 200
@@ -0,0 +1,102 @@
+import math
+import time
+
+import pytest
+
+from kipbot.tools import mathexpr
+from kipbot.tools.mathexpr import MAX_ITEMS, MathError, evaluate
+
+
+@pytest.mark.parametrize("expression", [
+    "(1).__class__",
+    "pi.real",
+    "__import__('os').system('true')",
+    "open('/etc/passwd')",
+    "lambda: 1",
+    "[x for x in range(3)]",
+    "{x: x for x in range(3)}",
+    "sum(x for x in range(3))",
+    "(y := 2)",
+    "'abc'",
+    "[1, 2][0]",
+    "1 if 1 else 2",
+    "range(stop=3)",
+    "sqrt(*[4])",
+    "globals()",
+])
+def test_disallowed_syntax_and_names(expression):
+    with pytest.raises(MathError):
+        evaluate(expression)
+
+
+@pytest.mark.parametrize("expression", [
+    "9**9**9",
+    "max(range(10**10))",
+    "factorial(10**6)",
+    f"range({MAX_ITEMS + 1})",
+    f"linspace(0, 1, {MAX_ITEMS + 1})",
+    "2**5000",
+    "10**1000 * 10**1000",
+    "pow(7, 10**6)",
+])
+def test_limits_fail_fast(expression):
+    start = time.perf_counter()
+    with pytest.raises(MathError):
+        evaluate(expression)
+    assert time.perf_counter() - start < 0.5
+
+
+def test_cpu_budget_stops_long_evaluations():
+    expression = " + ".join(["sum(sqrt(range(1, 100000)))"] * 20)
+    with pytest.raises(MathError, match="CPU time"):
+        evaluate(expression, cpu_budget=0.01)
+
+
+def test_long_expressions_are_rejected():
+    with pytest.raises(MathError):
+        evaluate("1 + " * 1000 + "1")
+
+
+def test_scalar_results():
+    assert evaluate("2 + 3 * 4") == 14
+    assert evaluate("factorial(10)") == 3628800
+    assert evaluate("mean(range(1, 101))") == 50.5
+    assert evaluate("sqrt(16)") == 4.0
+    assert evaluate("-(2 ** 3)") == -8
+
+
+VECTOR_CASES = {
+    "range(1, 6) ** 2": [x ** 2 for x in range(1, 6)],
+    "[1, 2, 3] + [4, 5, 6]": [5, 7, 9],
+    "range(10) * 0.5 - 1": [x * 0.5 - 1 for x in range(10)],
+    "2 / [1, 2, 4]": [2.0, 1.0, 0.5],
+    "[7, 8, 9] % 4": [3, 0, 1],
+    "[7, 8, 9] // 2": [3, 4, 4],
+    "-[1, 2]": [-1, -2],
+    "sqrt([4, 9, 16])": [2.0, 3.0, 4.0],
+    "round([1.234, 5.678], 1)": [1.2, 5.7],
+    "sum(range(1, 101) ** 2)": sum(x ** 2 for x in range(1, 101)),
+}
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.parametrize("expression", VECTOR_CASES)
+def test_vector_results_match_with_and_without_numpy(expression, backend, monkeypatch):
+    if backend == "numpy" and mathexpr.np is None:
+        pytest.skip("NumPy is not installed")
+    if backend == "python":
+        monkeypatch.setattr(mathexpr, "np", None)
+    result = evaluate(expression)
+    expected = VECTOR_CASES[expression]
+
+    if isinstance(expected, list):
+        assert isinstance(result, list) and len(result) == len(expected)
+        assert all(math.isclose(a, b) for a, b in zip(result, expected))
+    else:
+        assert math.isclose(result, expected)
+
+
+def test_vectors_of_different_lengths_are_rejected(monkeypatch):
+    monkeypatch.setattr(mathexpr, "np", None)
+    with pytest.raises(MathError):
+        evaluate("[1, 2] + [1, 2, 3]")
@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+import time
+
+import pytest
+
+from kipbot.core.config import MemoryConfig
+from kipbot.memory import segments
+from kipbot.memory.segments import list_segments, read_footer, segment_name
+from kipbot.memory.store import MemoryStore
+
+SEGMENT_BYTES = 1000
+
+
+@pytest.fixture(autouse=True)
+def no_background_compaction(monkeypatch):
+    """Compact only when a test calls compact(), not whenever the first save starts it."""
+    monkeypatch.setattr(MemoryStore, "_ensure_compactor", lambda self: None)
+
+
+def make_store(tmp_path, **settings) -> MemoryStore:
+    settings = {"segment_bytes": SEGMENT_BYTES, "fsync": "batch", **settings}
+    return MemoryStore(MemoryConfig(path=str(tmp_path), **settings))
+
+
+async def save_turns(store: MemoryStore, user_id: str, count: int) -> None:
+    for i in range(count):
+        await store.save(user_id, f"question {i} " * 5, f"answer {i} " * 5)
+    await store.flush()
+
+
+def longest_line(directory) -> int:
+    return max(
+        len(line) + 1
+        for path in directory.glob("*.jsonl")
+        for line in path.read_bytes().splitlines()
+    )
+
+
+async def test_large_batch_rotates_at_segment_bytes(tmp_path):
+    store = make_store(tmp_path)
+    try:
+        # One flush writes the whole batch
+        await save_turns(store, "u1", 50)
+
+        found = list_segments(tmp_path / "u1")
+        assert len(found) > 1
+        limit = SEGMENT_BYTES + longest_line(tmp_path / "u1")
+        for segment in found:
+            # Rotation happens at the first line that reaches segment_bytes
+            assert segment.path.stat().st_size < limit
+
+        loaded = await store.load("u1", limit=50)
+        assert [e["user"] for e in loaded] == [f"question {i} " * 5 for i in range(50)]
+    finally:
+        await store.close()
+
+
+async def test_sealed_segments_are_compressed_and_readable(tmp_path, monkeypatch):
+    # Several compressed blocks per sealed segment
+    monkeypatch.setattr(segments, "BLOCK_BYTES", 200)
+    store = make_store(tmp_path, compression="gzip")
+    try:
+        await save_turns(store, "u1", 50)
+        stats = store.compact(full=True)
+
+        sealed = [s for s in list_segments(tmp_path / "u1") if s.sealed]
+        assert stats["sealed"] == len(sealed) > 1
+        footer = read_footer(sealed[0].path)
+        assert footer.codec == "gzip" and len(footer.blocks) > 1
+        offset, length, turns = footer.blocks[1]
+        with open(sealed[0].path, "rb") as f:
+            f.seek(offset)
+            block = gzip.decompress(f.read(length))
+        assert len(block.splitlines()) == turns
+
+        loaded = await store.load("u1", limit=50)
+        assert [e["user"] for e in loaded] == [f"question {i} " * 5 for i in range(50)]
+        found = await store.search("u1", "question 3", limit=1)
+        assert found[0]["user"] == "question 3 " * 5
+    finally:
+        await store.close()
+
+
+async def test_max_turns_drops_the_oldest_sealed_segments(tmp_path):
+    store = make_store(tmp_path, max_turns=20)
+    try:
+        await save_turns(store, "u1", 50)
+        stats = store.compact()
+
+        loaded = await store.load("u1", limit=100)
+        assert stats["dropped"] >= 1
+        assert 20 <= len(loaded) < 50
+        assert loaded[-1]["user"] == "question 49 " * 5
+    finally:
+        await store.close()
+
+
+async def test_max_age_days_drops_old_turns(tmp_path):
+    old = time.time() - 10 * 86400
+    with open(tmp_path / "u1.jsonl", "w", encoding="utf-8") as f:
+        for i in range(5):
+            f.write(json.dumps({"user": f"old {i}", "assistant": "a", "ts": old}) + "\n")
+    os.utime(tmp_path / "u1.jsonl", (old, old))
+    store = make_store(tmp_path, max_age_days=1)
+    try:
+        stats = store.compact()
+
+        assert stats["dropped"] == 1
+        assert await store.load("u1") == []
+    finally:
+        await store.close()
+
+
+async def test_legacy_file_becomes_segment_zero(tmp_path):
+    with open(tmp_path / "u1.jsonl", "w", encoding="utf-8") as f:
+        for i in range(3):
+            f.write(json.dumps({"user": f"q{i}", "assistant": f"a{i}", "ts": float(i)}) + "\n")
+    store = make_store(tmp_path)
+    try:
+        assert [e["user"] for e in await store.load("u1")] == ["q0", "q1", "q2"]
+        await store.save("u1", "q3", "a3")
+        await store.flush()
+
+        assert not (tmp_path / "u1.jsonl").exists()
+        assert [s.path.name for s in list_segments(tmp_path / "u1")] == [segment_name(0)]
+        assert [e["user"] for e in await store.load("u1")] == ["q0", "q1", "q2", "q3"]
+    finally:
+        await store.close()
+
+
+def test_unknown_fsync_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        make_store(tmp_path, fsync="off")
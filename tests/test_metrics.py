@@ -0,0 +1,94 @@
+import asyncio
+
+from kipbot.bench.fake import FakeLLMConfig
+from kipbot.bench.runner import bench_config, create_bench_agent
+from kipbot.core.metrics import REGISTRY, Registry, platform_scope
+
+
+def test_render_counter_and_gauge():
+    registry = Registry()
+    sent = registry.counter("sent_total", "Messages sent.", ("platform",))
+    depth = registry.gauge("depth", "Queue depth.")
+    sent.inc(platform="kakao")
+    sent.inc(2, platform="kakao")
+    sent.inc(platform='say "hi"\n')
+    depth.set(1.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP sent_total Messages sent.",
+        "# TYPE sent_total counter",
+        'sent_total{platform="kakao"} 3',
+        'sent_total{platform="say \\"hi\\"\\n"} 1',
+        "# HELP depth Queue depth.",
+        "# TYPE depth gauge",
+        "depth 1.5",
+    ]
+
+
+def test_render_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency", "Latency.", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 2.0):
+        latency.observe(value, op="load")
+
+    assert registry.render().splitlines() == [
+        "# HELP latency Latency.",
+        "# TYPE latency histogram",
+        'latency_bucket{op="load",le="0.1"} 1',
+        'latency_bucket{op="load",le="1"} 3',
+        'latency_bucket{op="load",le="+Inf"} 4',
+        'latency_sum{op="load"} 3.05',
+        'latency_count{op="load"} 4',
+    ]
+
+
+def test_collectors_run_before_render():
+    registry = Registry()
+    gauge = registry.gauge("sessions", "Active sessions.")
+    registry.collector("sessions", lambda: gauge.set(7))
+    registry.collector("broken", lambda: 1 / 0)
+    assert "sessions 7" in registry.render().splitlines()
+    # Registering under the same name replaces the collector, and metrics are shared by name
+    registry.collector("sessions", lambda: gauge.set(8))
+    assert registry.gauge("sessions", "Active sessions.") is gauge
+    assert "sessions 8" in registry.render().splitlines()
+
+
+async def test_platform_label_comes_from_the_scope():
+    registry = Registry()
+    calls = registry.counter("calls_total", "Calls.", ("platform", "tool"))
+
+    async def call(platform: str) -> None:
+        with platform_scope(platform):
+            await asyncio.sleep(0.01)
+            calls.inc(tool="web")
+
+    calls.inc(tool="web")
+    await asyncio.gather(call("kakao"), call("discord"), call("kakao"))
+    with platform_scope("telegram"):
+        calls.inc(platform="cli", tool="web")  # an explicit label wins
+
+    lines = registry.render().splitlines()
+    assert 'calls_total{platform="none",tool="web"} 1' in lines
+    assert 'calls_total{platform="kakao",tool="web"} 2' in lines
+    assert 'calls_total{platform="discord",tool="web"} 1' in lines
+    assert 'calls_total{platform="cli",tool="web"} 1' in lines
+    assert not any('platform="telegram"' in line for line in lines)
+
+
+async def test_chat_metrics_are_labelled_by_platform(tmp_path):
+    agent = create_bench_agent(bench_config(tmp_path), FakeLLMConfig(latency=0.0, tool_rate=0.0))
+    await agent.warm_up()
+    try:
+        context = agent.sessions.get("u1", "metrics-test")
+        await agent.chat(context, "hello")
+    finally:
+        await agent.close()
+
+    lines = REGISTRY.render().splitlines()
+    assert 'kipbot_chat_seconds_count{platform="metrics-test"} 1' in lines
+    assert 'kipbot_memory_seconds_count{platform="metrics-test",op="load"} 1' in lines
+    # Saving only queues the turn; the write is timed as a flush of a mixed batch
+    assert not any('op="save"' in line for line in lines)
+    assert any(line.startswith('kipbot_memory_seconds_count{platform="all",op="flush"}')
+               for line in lines)
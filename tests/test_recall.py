@@ -0,0 +1,83 @@
+import json
+from types import SimpleNamespace
+
+from kipbot.bench.fake import FakeLLMConfig
+from kipbot.bench.runner import bench_config, create_bench_agent
+
+LEGACY_TURNS = [
+    ("What is my dog's name?", "You told me it is Biscuit."),
+    ("I like hiking in the Alps.", "Noted, the Alps it is."),
+    ("Remind me about the dentist.", "I will remind you about the dentist."),
+]
+
+
+async def test_legacy_turns_without_ts_are_replayed_in_order(tmp_path):
+    config = bench_config(tmp_path)
+    memory = tmp_path / "memory"
+    memory.mkdir(parents=True, exist_ok=True)
+    # Written before turns carried a timestamp
+    with open(memory / "u1.jsonl", "w", encoding="utf-8") as f:
+        for user, assistant in LEGACY_TURNS:
+            f.write(json.dumps({"user": user, "assistant": assistant}) + "\n")
+
+    agent = create_bench_agent(config, FakeLLMConfig(latency=0.0, tool_rate=0.0))
+    await agent.warm_up()
+    try:
+        context = agent.sessions.get("u1", "test")
+        await agent.chat(context, "What was my dog called again?")
+    finally:
+        await agent.close()
+
+    history = context.history
+    assert [(m.content, n.content) for m, n in zip(history[:6:2], history[1:6:2])] == LEGACY_TURNS
+    assert context.history[6].content == "What was my dog called again?"
+
+    # The adopted segment has the file's mtime as the timestamp of every turn
+    segment = next((memory / "u1").iterdir())
+    lines = [json.loads(line) for line in segment.read_text(encoding="utf-8").splitlines()]
+    assert all(isinstance(entry["ts"], float) for entry in lines[:3])
+
+
+async def test_recall_orders_turns_without_ts(tmp_path):
+    turns = [{"user": user, "assistant": assistant} for user, assistant in LEGACY_TURNS]
+    extra = {"user": "Older question", "assistant": "Older answer"}
+
+    async def load(user_id, limit):
+        return turns[-limit:]
+
+    async def search(user_id, query, limit):
+        return [turns[0], extra]  # best first; turns[0] is also recent
+
+    agent = create_bench_agent(bench_config(tmp_path), FakeLLMConfig())
+    agent.config.memory.retrieval.recent = 3
+    agent.memory = SimpleNamespace(load=load, search=search, close=agent.memory.close)
+    agent.llm.count_tokens = lambda messages, tools=None: 10
+    try:
+        chosen = await agent._recall("u1", "dog")
+    finally:
+        await agent.close()
+
+    assert chosen == [extra, *turns]
+
+
+async def test_recall_stays_within_the_token_budget(tmp_path):
+    turns = [{"user": f"q{i}", "assistant": f"a{i}", "ts": float(i)} for i in range(6)]
+
+    async def load(user_id, limit):
+        return turns[-limit:]
+
+    async def search(user_id, query, limit):
+        return [turns[0], turns[1]]
+
+    agent = create_bench_agent(bench_config(tmp_path), FakeLLMConfig())
+    retrieval = agent.config.memory.retrieval
+    retrieval.recent, retrieval.max_tokens = 3, 45
+    agent.memory = SimpleNamespace(load=load, search=search, close=agent.memory.close)
+    agent.llm.count_tokens = lambda messages, tools=None: 10
+    try:
+        chosen = await agent._recall("u1", "q0")
+    finally:
+        await agent.close()
+
+    # The three latest turns come first, then the best match while budget is left
+    assert chosen == [turns[0], turns[3], turns[4], turns[5]]
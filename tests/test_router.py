@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from kipbot.core.config import RoutingConfig
+from kipbot.llm.router import Router
+
+
+class FakeBackend:
+    """Streams ``chunks`` after ``first_chunk`` seconds, then fails or answers."""
+
+    def __init__(self, name, first_chunk, chunks=("a", "b"), error=None):
+        self.name = name
+        self.first_chunk = first_chunk
+        self.chunks = chunks
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def complete(self, request, on_delta=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.first_chunk)
+            if self.error and not self.chunks:
+                raise self.error
+            for chunk in self.chunks:
+                if on_delta:
+                    await on_delta(f"{self.name}:{chunk}")
+                await asyncio.sleep(0.01)
+            if self.error:
+                raise self.error
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.name
+
+
+def make_router(*backends):
+    return Router(list(backends), RoutingConfig(hedge_min_delay=0.05))
+
+
+async def test_stream_hedges_on_slow_first_chunk():
+    slow, fast = FakeBackend("slow", 1.0), FakeBackend("fast", 0.01)
+    deltas = []
+
+    async def on_delta(delta):
+        deltas.append(delta)
+
+    result = await make_router(slow, fast).complete({}, on_delta)
+
+    assert result == "fast"
+    assert deltas == ["fast:a", "fast:b"]
+    assert slow.cancelled
+
+
+async def test_stream_commits_to_first_backend_to_emit():
+    # The primary emits before the hedge delay, so no second request is sent
+    primary = FakeBackend("primary", 0.01, chunks=("a",) * 10)
+    backup = FakeBackend("backup", 0.01)
+    deltas = []
+
+    async def on_delta(delta):
+        deltas.append(delta)
+
+    result = await make_router(primary, backup).complete({}, on_delta)
+
+    assert result == "primary"
+    assert backup.calls == 0
+    assert set(deltas) == {"primary:a"}
+
+
+async def test_stream_failure_after_first_chunk_is_not_retried():
+    broken = FakeBackend("broken", 0.01, error=RuntimeError("mid-stream"))
+    backup = FakeBackend("backup", 0.01)
+
+    async def on_delta(delta):
+        pass
+
+    with pytest.raises(RuntimeError, match="mid-stream"):
+        await make_router(broken, backup).complete({}, on_delta)
+    assert backup.calls == 0
+
+
+async def test_stream_fails_over_before_first_chunk():
+    broken = FakeBackend("broken", 0.01, chunks=(), error=RuntimeError("down"))
+    backup = FakeBackend("backup", 0.01)
+    deltas = []
+
+    async def on_delta(delta):
+        deltas.append(delta)
+
+    assert await make_router(broken, backup).complete({}, on_delta) == "backup"
+    assert deltas == ["backup:a", "backup:b"]
+
+
+async def test_first_chunk_latency_sets_the_stream_hedge_delay():
+    backend = FakeBackend("only", 0.01)
+    router = make_router(backend, FakeBackend("other", 0.01))
+    router.config.min_samples = 1
+
+    async def on_delta(delta):
+        pass
+
+    await router.complete({}, on_delta)
+
+    stats = router.stats[0]
+    assert stats.first_chunks[0] < stats.latencies[0]
+    assert router.hedge_delay(0, streaming=True) == 0.05
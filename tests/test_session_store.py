@@ -0,0 +1,50 @@
+import pytest
+
+from kipbot.core.config import SessionConfig
+from kipbot.core.session import Message, SessionManager
+from kipbot.core.session_store import SessionStore
+
+
+@pytest.fixture
+async def workers(tmp_path):
+    """Two workers' session managers sharing one SQLite store."""
+    config = SessionConfig(store="sqlite", store_path=str(tmp_path / "sessions.db"))
+    managers = [SessionManager(config), SessionManager(config)]
+    yield managers
+    for manager in managers:
+        await manager.close()
+
+
+def test_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+async def test_stale_cached_session_is_replaced(workers):
+    a, b = workers
+    # Worker A serves the user and keeps the session cached
+    context = a.get("u1", "telegram")
+    await a.restore(context)
+    context.history.append(Message(role="user", content="first"))
+    await a.persist(context)
+
+    # The user moves to worker B, which continues the conversation
+    moved = b.get("u1", "telegram")
+    assert await b.restore(moved)
+    moved.history.append(Message(role="user", content="second"))
+    await b.persist(moved)
+
+    # Back on A, the cached copy is behind the store and gets replaced
+    assert await a.restore(context)
+    assert [m.content for m in context.history] == ["first", "second"]
+    assert context.version == moved.version
+
+
+async def test_current_cached_session_is_kept(workers):
+    a, _ = workers
+    context = a.get("u1", "telegram")
+    context.history.append(Message(role="user", content="first"))
+    await a.persist(context)
+
+    assert not await a.restore(context)
+    assert [m.content for m in context.history] == ["first"]
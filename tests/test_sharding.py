@@ -0,0 +1,136 @@
+import json
+import socket
+from collections import Counter
+
+import httpx
+import pytest
+
+from kipbot.cli.commands import _check_worker_memory
+from kipbot.core.config import ClusterConfig, Config
+from kipbot.core.sharding import HashRing
+from kipbot.platforms.router import ShardRouter
+
+KEYS = [f"kakao:user-{i}" for i in range(10_000)]
+NODES = ["http://w1", "http://w2", "http://w3", "http://w4"]
+
+
+def _owners(ring: HashRing) -> dict[str, str]:
+    return {key: ring.node_for(key) for key in KEYS}
+
+
+def test_keys_spread_evenly():
+    counts = Counter(_owners(HashRing(NODES)).values())
+    assert set(counts) == set(NODES)
+    for count in counts.values():
+        assert abs(count - len(KEYS) / len(NODES)) < 0.15 * len(KEYS) / len(NODES)
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    ring = HashRing(NODES)
+    before = _owners(ring)
+    ring.add("http://w5")
+    after = _owners(ring)
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == "http://w5" for key in moved)
+    assert 0.15 < len(moved) / len(KEYS) < 0.25
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(NODES)
+    before = _owners(ring)
+    ring.remove("http://w2")
+    after = _owners(ring)
+
+    for key in KEYS:
+        if before[key] != "http://w2":
+            assert after[key] == before[key]
+        else:
+            assert after[key] != "http://w2"
+
+
+def test_preference_starts_at_the_owner_and_covers_all_nodes():
+    ring = HashRing(NODES)
+    for key in KEYS[:100]:
+        order = ring.preference(key)
+        assert order[0] == ring.node_for(key)
+        assert sorted(order) == sorted(NODES)
+
+    # Without its owner a key moves to the next node in its preference list
+    key = KEYS[0]
+    order = ring.preference(key)
+    ring.remove(order[0])
+    assert ring.node_for(key) == order[1]
+
+
+def test_empty_ring():
+    ring = HashRing()
+    assert ring.preference("kakao:u1") == []
+    with pytest.raises(LookupError):
+        ring.node_for("kakao:u1")
+
+
+def _closed_port_url() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+def _worker(name: str):
+    async def app(scope, receive, send):
+        await receive()
+        body = json.dumps({"worker": name, "path": scope["path"]}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+async def _post(router: ShardRouter, user_id: str) -> httpx.Response:
+    body = {"userRequest": {"user": {"id": user_id}, "utterance": "hi"}}
+    transport = httpx.ASGITransport(app=router)
+    async with httpx.AsyncClient(transport=transport, base_url="http://router") as client:
+        return await client.post("/kakao/chat", content=json.dumps(body))
+
+
+async def test_router_fails_over_along_the_ring(serve):
+    live = {await serve(_worker("a")): "a", await serve(_worker("b")): "b"}
+    dead = _closed_port_url()
+    router = ShardRouter(ClusterConfig(workers=[*live, dead], timeout=5.0))
+
+    # A user owned by the dead worker goes to the next live worker on its ring
+    user_id = next(
+        f"u{i}" for i in range(1000) if router.ring.node_for(f"kakao:u{i}") == dead
+    )
+    order = router.route("/kakao/chat", {"userRequest": {"user": {"id": user_id}}})
+    resp = await _post(router, user_id)
+    assert resp.status_code == 200
+    assert resp.json() == {"worker": live[order[1]], "path": "/kakao/chat"}
+
+    # A user owned by a live worker stays there
+    user_id = next(
+        f"u{i}" for i in range(1000) if router.ring.node_for(f"kakao:u{i}") != dead
+    )
+    resp = await _post(router, user_id)
+    assert resp.json()["worker"] == live[router.ring.node_for(f"kakao:{user_id}")]
+    await router.stop()
+
+
+async def test_router_answers_502_when_no_worker_is_up():
+    router = ShardRouter(ClusterConfig(workers=[_closed_port_url(), _closed_port_url()]))
+    resp = await _post(router, "u1")
+    assert resp.status_code == 502
+    await router.stop()
+
+
+def test_workers_need_a_shared_memory_backend():
+    with pytest.raises(ValueError, match="sqlite"):
+        _check_worker_memory(Config())
+    _check_worker_memory(Config(memory={"backend": "sqlite"}))
+    _check_worker_memory(Config(memory={"enabled": False}))
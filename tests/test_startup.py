@@ -0,0 +1,50 @@
+"""Startup time, RSS and event-loop regressions from heavy imports."""
+
+import json
+import subprocess
+import sys
+
+from kipbot.bench.runner import bench_startup
+from tests.conftest import BENCH_BASELINE
+
+# Fresh interpreter: litellm must not be loaded before warm_up()
+WARM_UP_SCRIPT = """
+import asyncio, json, time
+from kipbot.bench.runner import LoopLagMonitor
+from kipbot.core.config import LLMConfig
+from kipbot.llm.provider import LLMProvider
+
+async def main():
+    llm = LLMProvider(LLMConfig())
+    async with LoopLagMonitor(interval=0.01) as lag:
+        await llm.warm_up()
+    start = time.perf_counter()
+    llm.count_tokens([{"role": "user", "content": "hello"}])
+    print(json.dumps({
+        "lag_max_ms": max(lag.lags, default=0.0) * 1000,
+        "count_ms": (time.perf_counter() - start) * 1000,
+    }))
+
+asyncio.run(main())
+"""
+
+
+def test_startup_stays_light():
+    results, _ = bench_startup()
+    baseline = json.loads(BENCH_BASELINE.read_text(encoding="utf-8"))["startup"]
+
+    assert results["litellm_loaded"] == 0
+    # Loose bounds: they catch a heavy import creeping back, not machine noise
+    assert results["startup_ms"] < baseline["startup_ms"] * 3
+    assert results["rss_mb"] < baseline["rss_mb"] * 1.5
+
+
+def test_warm_up_keeps_the_loop_responsive():
+    proc = subprocess.run(
+        [sys.executable, "-c", WARM_UP_SCRIPT], capture_output=True, text=True, check=True
+    )
+    results = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # Importing litellm on the loop stalls it for seconds
+    assert results["lag_max_ms"] < 1000
+    assert results["count_ms"] < 100
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import socket
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+
+from kipbot.core.config import Config, TelegramConfig
+from kipbot.platforms.telegram import TelegramPlatform, derive_secret
+
+TOKEN = "123:abc"
+
+
+class FakeBotAPI:
+    """Just enough of the Bot API: getMe, getUpdates, sendMessage and setWebhook."""
+
+    def __init__(self) -> None:
+        self.updates: list[dict] = []
+        self.calls: list[tuple[str, dict]] = []
+        self.next_id = 0
+
+    def push(self, user_id: int, text: str) -> None:
+        self.next_id += 1
+        self.updates.append({
+            "update_id": self.next_id,
+            "message": {
+                "message_id": self.next_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+                "text": text,
+            },
+        })
+
+    def sent(self, method: str = "sendMessage") -> list[dict]:
+        return [params for name, params in self.calls if name == method]
+
+    async def __call__(self, scope, receive, send) -> None:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        method = scope["path"].rsplit("/", 1)[-1]
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            params = dict(parse_qsl(body.decode()))
+        self.calls.append((method, params))
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}
+        elif method == "getUpdates":
+            offset = int(params.get("offset") or 0)
+            result = [u for u in self.updates if u["update_id"] >= offset]
+            if not result:
+                await asyncio.sleep(0.05)
+        elif method == "sendMessage":
+            self.next_id += 1
+            result = {
+                "message_id": self.next_id,
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        body = json.dumps({"ok": True, "result": result}).encode()
+        await send({"type": "http.response.body", "body": body})
+
+
+class RecordingAgent:
+    """Stub agent that answers after ``delay`` and records what ran when."""
+
+    def __init__(self, delay: float) -> None:
+        self.config = Config(dispatch={"debounce": 0.0})
+        self.sessions = SimpleNamespace(
+            get=lambda user_id, platform: SimpleNamespace(user_id=user_id)
+        )
+        self.delay = delay
+        self.texts: dict[str, list[str]] = {}
+        self.active: set[str] = set()
+        self.overlaps = 0
+        self.peak = 0
+        self.finished = 0
+
+    async def chat(self, context, text, on_delta=None) -> str:
+        user_id = context.user_id
+        if user_id in self.active:
+            self.overlaps += 1
+        self.active.add(user_id)
+        self.peak = max(self.peak, len(self.active))
+        self.texts.setdefault(user_id, []).extend(text.split("\n"))
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active.discard(user_id)
+        self.finished += 1
+        return f"echo: {text}"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+async def bot_api(serve):
+    api = FakeBotAPI()
+    return api, await serve(api)
+
+
+async def wait_for(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+async def stop(task: asyncio.Task) -> None:
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def test_polling_runs_users_concurrently_in_order(bot_api):
+    api, base_url = bot_api
+    agent = RecordingAgent(delay=0.1)
+    platform = TelegramPlatform(agent, TelegramConfig(token=TOKEN, api_url=base_url))
+    for i in range(5):
+        for user in range(20):
+            api.push(1000 + user, f"message {i}")
+
+    task = asyncio.create_task(platform.start())
+    await wait_for(lambda: sum(len(t) for t in agent.texts.values()) == 100 and not agent.active)
+    await stop(task)
+
+    assert agent.peak > 1
+    assert agent.overlaps == 0
+    assert all(texts == [f"message {i}" for i in range(5)] for texts in agent.texts.values())
+    assert len(agent.texts) == 20
+
+
+async def test_shutdown_drains_turns_in_flight(bot_api):
+    api, base_url = bot_api
+    agent = RecordingAgent(delay=0.5)
+    platform = TelegramPlatform(agent, TelegramConfig(token=TOKEN, api_url=base_url))
+    for user in range(10):
+        api.push(1000 + user, "hello")
+
+    task = asyncio.create_task(platform.start())
+    await wait_for(lambda: len(agent.active) == 10)
+    await stop(task)
+
+    # Every turn finished and its answer was sent before the bot shut down
+    assert agent.finished == 10
+    assert len(api.sent()) == 10
+
+
+async def test_webhook_rejects_bad_or_missing_secret(bot_api):
+    _, base_url = bot_api
+    config = TelegramConfig(token=TOKEN, api_url=base_url, webhook_url="https://bot.example")
+    platform = TelegramPlatform(RecordingAgent(delay=0.0), config)
+    update = {"update_id": 1}
+    transport = httpx.ASGITransport(app=platform)
+    async with httpx.AsyncClient(transport=transport, base_url="http://telegram") as client:
+        missing = await client.post(config.webhook_path, json=update)
+        bad = await client.post(
+            config.webhook_path, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": "bad"}
+        )
+        good = await client.post(
+            config.webhook_path,
+            json=update,
+            headers={"X-Telegram-Bot-Api-Secret-Token": derive_secret(TOKEN)},
+        )
+
+    assert missing.status_code == 403
+    assert bad.status_code == 403
+    assert good.status_code == 200
+    assert platform.app.update_queue.qsize() == 1
+
+
+async def test_webhook_secret_is_shared_and_registered_once(bot_api):
+    api, base_url = bot_api
+    config = TelegramConfig(
+        token=TOKEN,
+        api_url=base_url,
+        webhook_url="https://bot.example",
+        webhook_host="127.0.0.1",
+        webhook_port=free_port(),
+    )
+    worker = config.model_copy(update={"webhook_port": free_port(), "webhook_register": False})
+    platforms = [
+        TelegramPlatform(RecordingAgent(delay=0.0), config),
+        TelegramPlatform(RecordingAgent(delay=0.0), worker),
+    ]
+    assert platforms[0].secret == platforms[1].secret
+
+    tasks = [asyncio.create_task(platform.start()) for platform in platforms]
+    await wait_for(lambda: all(p.app.running for p in platforms))
+    for task in tasks:
+        await stop(task)
+
+    registered = api.sent("setWebhook")
+    assert len(registered) == 1
+    assert registered[0]["secret_token"] == derive_secret(TOKEN)
+    assert registered[0]["url"] == "https://bot.example/telegram/webhook"
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from kipbot.tools.web_search import WebSearchTool
+
+RESULTS = {
+    "python": [
+        {"title": "Python", "url": "https://python.org", "content": "The language"},
+        {"title": "Docs", "url": "https://docs.python.org", "content": "Reference"},
+    ],
+    "snake": [
+        {"title": "Python", "url": "https://python.org", "content": "Also a snake"},
+        {"title": "No link", "content": "A result without a URL"},
+    ],
+}
+DELAY = 0.2
+
+
+@pytest.fixture
+async def search_api(serve):
+    """Stand-in for the Tavily search API; returns the base URL and the queries it got."""
+    received = []
+
+    async def app(scope, receive, send):
+        body = json.loads((await receive())["body"])
+        received.append(body)
+        await asyncio.sleep(DELAY)
+        if body["query"] == "broken":
+            status, payload = 500, {"error": "boom"}
+        else:
+            status, payload = 200, {"results": RESULTS.get(body["query"], [])}
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+    return await serve(app), received
+
+
+async def test_queries_fan_out_concurrently(search_api):
+    base_url, received = search_api
+    tool = WebSearchTool(api_key="key", base_url=base_url)
+    start = time.monotonic()
+    result = await tool.execute(queries=["python", "snake", "python"])
+    elapsed = time.monotonic() - start
+    await tool.close()
+
+    assert result.success
+    assert sorted(body["query"] for body in received) == ["python", "snake"]
+    assert all(body["api_key"] == "key" for body in received)
+    assert elapsed < 2 * DELAY
+    assert "### python" in result.output and "### snake" in result.output
+
+
+async def test_urls_are_deduplicated_across_queries(search_api):
+    base_url, _ = search_api
+    tool = WebSearchTool(api_key="key", base_url=base_url)
+    result = await tool.execute(query="python", queries=["snake"])
+    await tool.close()
+
+    assert result.output.count("https://python.org") == 1
+    assert "https://docs.python.org" in result.output
+    assert "A result without a URL" in result.output
+
+
+async def test_string_queries_are_one_query(search_api):
+    base_url, received = search_api
+    tool = WebSearchTool(api_key="key", base_url=base_url)
+    result = await tool.execute(queries="python")
+    await tool.close()
+
+    assert [body["query"] for body in received] == ["python"]
+    assert "https://python.org" in result.output
+
+
+async def test_failed_queries_are_reported(search_api):
+    base_url, _ = search_api
+    tool = WebSearchTool(api_key="key", base_url=base_url)
+    partial = await tool.execute(queries=["python", "broken"])
+    failed = await tool.execute(query="broken")
+    await tool.close()
+
+    assert partial.success
+    assert "Search failed" in partial.output and "https://python.org" in partial.output
+    assert not failed.success
+    assert "Search failed" in failed.output
+
+
+async def test_missing_key_or_query():
+    assert not (await WebSearchTool().execute(query="python")).success
+    assert not (await WebSearchTool(api_key="key").execute()).success
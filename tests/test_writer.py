@@ -0,0 +1,73 @@
+from kipbot.core.config import MemoryConfig
+from kipbot.memory.writer import MAX_WRITE_ATTEMPTS, MemoryWriter, PartialWriteError
+
+
+class FlakySink:
+    def __init__(self, failures: int, partial: bool = False) -> None:
+        self.failures = failures
+        self.partial = partial
+        self.written: dict[str, list[dict]] = {}
+
+    async def __call__(self, batch: dict[str, list[dict]], fsync: str) -> None:
+        if self.failures:
+            self.failures -= 1
+            if self.partial:
+                users = sorted(batch)
+                for user_id in users[:1]:
+                    self.written.setdefault(user_id, []).extend(batch[user_id])
+                raise PartialWriteError({u: batch[u] for u in users[1:]}, OSError("disk full"))
+            raise OSError("disk full")
+        for user_id, entries in batch.items():
+            self.written.setdefault(user_id, []).extend(entries)
+
+
+def _config() -> MemoryConfig:
+    return MemoryConfig(flush_interval=0.01, flush_batch_size=1000)
+
+
+def _turn(ts: float) -> dict:
+    return {"user": "hi", "assistant": "hello", "ts": ts}
+
+
+async def test_failed_batch_is_retried_in_order():
+    sink = FlakySink(failures=2)
+    writer = MemoryWriter(sink, _config())
+    await writer.submit("a", _turn(1))
+    await writer.flush()
+    await writer.submit("a", _turn(2))
+    await writer.flush()
+    assert writer.queue_depth == 2
+    await writer.close()
+    assert [e["ts"] for e in sink.written["a"]] == [1, 2]
+    assert writer.queue_depth == 0
+
+
+async def test_partial_write_only_retries_the_rest():
+    sink = FlakySink(failures=1, partial=True)
+    writer = MemoryWriter(sink, _config())
+    await writer.submit("a", _turn(1))
+    await writer.submit("b", _turn(2))
+    await writer.close()
+    assert sink.written == {"a": [_turn(1)], "b": [_turn(2)]}
+
+
+async def test_turns_are_dropped_after_max_attempts():
+    sink = FlakySink(failures=MAX_WRITE_ATTEMPTS)
+    writer = MemoryWriter(sink, _config())
+    await writer.submit("a", _turn(1))
+    await writer.close()
+    assert sink.written == {}
+    assert writer.queue_depth == 0
+
+
+async def test_merge_pending_keeps_turns_written_during_a_read_once():
+    writer = MemoryWriter(FlakySink(failures=0), _config())
+    await writer.submit("a", _turn(1))
+    queued = writer.pending("a")
+    await writer.flush()  # written while the store was being read
+    await writer.submit("a", _turn(2))
+    merged = writer.merge_pending("a", [_turn(1)], queued)
+    assert [e["ts"] for e in merged] == [1, 2]
+    missed = writer.merge_pending("a", [], queued)
+    assert [e["ts"] for e in missed] == [1, 2]
+    await writer.close()